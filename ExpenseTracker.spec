@@ -10,7 +10,9 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # numpy es opcional (sin él la GUI usa el índice de totales) y pesa decenas de MB
+    # que el ejecutable onefile desempaqueta en cada arranque; lo mismo las herramientas de desarrollo
+    excludes=['numpy', 'unittest', 'pydoc', 'doctest', 'tkinter.test'],
     noarchive=False,
     optimize=0,
 )
@@ -26,7 +28,8 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    # Descomprimir UPX en cada arranque cuesta más de lo que ahorra en tamaño
+    upx=False,
     upx_exclude=[],
     runtime_tmpdir=None,
     console=False,
@@ -1,23 +1,88 @@
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+import argparse
 import json
-import csv
-import os
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox
 from datetime import datetime
 from typing import List, Dict, Any
 
-DATA_FILE = "expenses.json"
+# Exportación, importación, diálogos de archivo y numpy se importan al usarlos por
+# primera vez: no retrasan la aparición de la ventana
+from budgets import BudgetMonitor, describe_alert
+from instrumentation import Timings, profiled
+from ledger import ID_BLOCK, Ledger
+from money import format_amount, parse_amount
+from persistence import PersistenceWorker
+from recurring import RuleStore, materialize_due
+from reports import DEFAULT_WINDOW
+from search import SearchQuery
+from storage import BACKENDS, DEFAULT_BACKEND, get_storage
+from validation import validate_date, validate_expense
+from virtual_tree import VirtualTreeview
+
+# Espera tras la última tecla antes de volver a filtrar
+SEARCH_DELAY_MS = 150
+
+REPORT_PERIODS = {"Semanal": 'week', "Mensual": 'month', "Anual": 'year'}
+
+# Cada cuánto se revisa si terminó la carga en segundo plano
+LOAD_POLL_MS = 50
 
 
 class ExpenseTrackerGUI:
-    def __init__(self, root):
+    def __init__(self, root, backend: str = DEFAULT_BACKEND, startup_log: str = None):
         self.root = root
         self.root.title("Seguimiento de Gastos")
         self.root.geometry("1000x600")
         self.root.configure(bg='#2c3e50')
 
+        # Costo de la última carga, guardado y refresco (panel de depuración, F12)
+        self.timings = Timings(enabled=True)
+        self.debug_panel = None
+
+        # Búsqueda activa (None muestra todo) y filtrado pendiente de la barra
+        self.query = None
+        self.search_job = None
+
+        # Reporte a la vista en la pestaña de reportes (si no cambió, no se vuelve a dibujar)
+        self.report_job = None
+        self.shown_report = None
+
+        # Hitos del arranque (--startup-log, los mide benchmarks/startup.py)
+        self.startup_log = startup_log
+        self.startup_times = {}
+        self.mark_startup('init')
+
+        # La ventana se muestra con un registro vacío mientras el real se lee en segundo plano
+        self.backend = backend
+        self.storage = None
+        self.persistence = None
+        self.ledger = Ledger([])
+        self.expenses = self.ledger.expenses
+        self.columnar = None
+
+        # Gastos recurrentes agregados al abrir y presupuestos a vigilar en cada cambio
+        self.rules = RuleStore()
+        self.recurring_added = []
+        self.budgets = BudgetMonitor({})
+
         self.setup_ui()
-        self.load_data()
+        self.load_data_async()
+
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.bind('<F12>', lambda event: self.show_debug_panel())
+        if startup_log:
+            self.root.bind('<Map>', self.on_map)
+
+    def start_persistence(self, version):
+        # El hilo de escritura también avisa de lo que escriben otros procesos
+        worker = PersistenceWorker(self.root, self.storage, on_saved=self.on_saved, on_error=self.on_save_error,
+                                   timings=self.timings, version=version, on_external=self.on_external_changes,
+                                   on_reload=self.on_external_reload, id_block=ID_BLOCK)
+        # y reserva los ids por adelantado: agregar no espera al candado ni al disco
+        self.ledger.reserve = worker.reserve_ids
+        return worker
 
     def setup_ui(self):
         # Frame principal
@@ -55,14 +120,25 @@ class ExpenseTrackerGUI:
         button_frame = ttk.Frame(input_frame)
         button_frame.grid(row=0, column=6, padx=(10, 0))
 
-        ttk.Button(button_frame, text="Agregar", command=self.add_expense).pack(side=tk.LEFT, padx=(0, 5))
+        # Botones que cambian o leen el registro: deshabilitados mientras carga
+        self.ledger_buttons = []
+
+        add_button = ttk.Button(button_frame, text="Agregar", command=self.add_expense)
+        add_button.pack(side=tk.LEFT, padx=(0, 5))
+        self.ledger_buttons.append(add_button)
         ttk.Button(button_frame, text="Limpiar", command=self.clear_fields).pack(side=tk.LEFT)
 
+        # Pestañas: la tabla de gastos y los reportes
+        self.notebook = ttk.Notebook(main_frame)
+        self.notebook.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
+
         # Treeview para mostrar gastos
-        tree_frame = ttk.LabelFrame(main_frame, text="Gastos Registrados", padding="10")
-        tree_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
+        tree_frame = ttk.Frame(self.notebook, padding="10")
+        self.notebook.add(tree_frame, text="Gastos Registrados")
         tree_frame.columnconfigure(0, weight=1)
-        tree_frame.rowconfigure(0, weight=1)
+        tree_frame.rowconfigure(1, weight=1)
+
+        self.setup_search_bar(tree_frame)
 
         columns = ('id', 'date', 'description', 'amount', 'category')
         self.tree = ttk.Treeview(tree_frame, columns=columns, show='headings', height=15)
@@ -80,22 +156,31 @@ class ExpenseTrackerGUI:
         self.tree.column('amount', width=100)
         self.tree.column('category', width=100)
 
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        # Scrollbar: la tabla virtual solo inserta las filas visibles
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+        self.table = VirtualTreeview(self.tree, scrollbar, self.format_row)
+
+        self.tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
 
-        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.reports_frame = ttk.Frame(self.notebook, padding="10")
+        self.notebook.add(self.reports_frame, text="Reportes")
+        self.setup_reports_tab(self.reports_frame)
+        self.notebook.bind('<<NotebookTabChanged>>', lambda event: self.refresh_report())
 
         # Frame de controles
         control_frame = ttk.Frame(main_frame)
         control_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E))
 
         # Botones de control
-        ttk.Button(control_frame, text="Eliminar Seleccionado", command=self.delete_selected).pack(side=tk.LEFT,
-                                                                                                   padx=(0, 5))
-        ttk.Button(control_frame, text="Editar Seleccionado", command=self.edit_selected).pack(side=tk.LEFT,
-                                                                                               padx=(0, 5))
+        for text, command in (("Eliminar Seleccionado", self.delete_selected),
+                              ("Editar Seleccionado", self.edit_selected), ("Importar...", self.import_file)):
+            button = ttk.Button(control_frame, text=text, command=command)
+            button.pack(side=tk.LEFT, padx=(0, 5))
+            self.ledger_buttons.append(button)
+
+        self.status_label = ttk.Label(control_frame, text="")
+        self.status_label.pack(side=tk.RIGHT)
 
         # Frame de resumen y exportación
         summary_frame = ttk.LabelFrame(main_frame, text="Resumen y Exportación", padding="10")
@@ -108,52 +193,395 @@ class ExpenseTrackerGUI:
             "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
         ])
         self.month_combo.set("Todos")
-        self.month_combo.grid(row=0, column=1, padx=(5, 10))
+        self.month_combo.grid(row=0, column=1, padx=(5, 5))
+
+        # Años disponibles según el índice de totales
+        self.year_combo = ttk.Combobox(summary_frame, width=8, postcommand=self.refresh_years)
+        self.year_combo.set(str(datetime.now().year))
+        self.year_combo.grid(row=0, column=2, padx=(0, 10))
 
-        ttk.Button(summary_frame, text="Mostrar Resumen", command=self.show_summary).grid(row=0, column=2, padx=(0, 10))
+        ttk.Button(summary_frame, text="Mostrar Resumen", command=self.show_summary).grid(row=0, column=3, padx=(0, 5))
+        ttk.Button(summary_frame, text="Desglose", command=self.show_breakdown).grid(row=0, column=4, padx=(0, 10))
 
         self.summary_label = ttk.Label(summary_frame, text="Total: $0.00", font=('Arial', 12, 'bold'))
-        self.summary_label.grid(row=0, column=3, padx=(0, 20))
+        self.summary_label.grid(row=0, column=5, padx=(0, 20))
 
         # Botones de exportación
-        ttk.Button(summary_frame, text="Exportar a CSV", command=self.export_to_csv).grid(row=0, column=4)
-        ttk.Button(summary_frame, text="Exportar a JSON", command=self.export_to_json).grid(row=0, column=5,
-                                                                                            padx=(5, 0))
+        export_csv = ttk.Button(summary_frame, text="Exportar a CSV", command=self.export_to_csv)
+        export_csv.grid(row=0, column=6)
+        export_json = ttk.Button(summary_frame, text="Exportar a JSON", command=self.export_to_json)
+        export_json.grid(row=0, column=7, padx=(5, 0))
+        self.ledger_buttons += [export_csv, export_json]
 
         # Bind double click para editar
         self.tree.bind('<Double-1>', self.on_double_click)
 
+    def setup_search_bar(self, parent):
+        """Barra de búsqueda: filtra la tabla mientras se escribe"""
+        search_frame = ttk.Frame(parent)
+        search_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 5))
+
+        self.search_vars = {name: tk.StringVar() for name in ('text', 'category', 'from', 'to', 'min', 'max')}
+        self.search_vars['category'].set("Todas")
+
+        ttk.Label(search_frame, text="Buscar:").pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Entry(search_frame, width=25, textvariable=self.search_vars['text']).pack(side=tk.LEFT, padx=(0, 10))
+        self.search_category_combo = ttk.Combobox(search_frame, width=15, state='readonly',
+                                                  textvariable=self.search_vars['category'],
+                                                  postcommand=self.refresh_search_categories)
+        self.search_category_combo.pack(side=tk.LEFT, padx=(0, 10))
+        for label, name, width in (("Desde:", 'from', 11), ("Hasta:", 'to', 11), ("Monto:", 'min', 8), ("a", 'max', 8)):
+            ttk.Label(search_frame, text=label).pack(side=tk.LEFT, padx=(0, 5))
+            ttk.Entry(search_frame, width=width, textvariable=self.search_vars[name]).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(search_frame, text="Limpiar", command=self.clear_search).pack(side=tk.LEFT, padx=(5, 0))
+
+        self.search_status = ttk.Label(search_frame, text="")
+        self.search_status.pack(side=tk.RIGHT)
+
+        for var in self.search_vars.values():
+            var.trace_add('write', lambda *args: self.schedule_search())
+
+    def refresh_search_categories(self):
+        """Actualizar las categorías del filtro con las del índice de totales"""
+        self.search_category_combo.config(values=["Todas"] + sorted(self.ledger.rollup.categories))
+
+    def clear_search(self):
+        """Quitar todos los filtros"""
+        for name, var in self.search_vars.items():
+            var.set("Todas" if name == 'category' else "")
+
+    def schedule_search(self):
+        """Filtrar cuando se deje de escribir (una vez por ráfaga de teclas)"""
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DELAY_MS, self.apply_search)
+
+    def search_query(self):
+        """Criterios de la barra de búsqueda; ValueError si alguno está incompleto"""
+        values = {name: var.get().strip() for name, var in self.search_vars.items()}
+        amounts = []
+        for name in ('min', 'max'):
+            try:
+                amounts.append(parse_amount(values[name]) if values[name] else None)
+            except ValueError:
+                raise ValueError(f"Monto inválido: {values[name]}")
+        category = values['category'] if values['category'] != "Todas" else None
+        return SearchQuery(values['text'], category, values['from'], values['to'], *amounts)
+
+    def apply_search(self):
+        """Filtrar la tabla con los criterios de la barra de búsqueda"""
+        self.search_job = None
+        try:
+            query = self.search_query()
+        except ValueError as e:
+            # Fecha o monto a medio escribir: se filtra cuando estén completos
+            self.search_status.config(text=str(e))
+            return
+        self.query = None if query.is_empty() else query
+        if self.query is not None and not self.ledger.search_ready:
+            self.search_status.config(text="Indexando...")
+            self.root.update_idletasks()
+        self.table.offset = 0
+        self.update_treeview()
+
+    def setup_reports_tab(self, parent):
+        """Pestaña de reportes: serie por periodo con promedio móvil y comparación interanual"""
+        parent.columnconfigure(0, weight=1)
+        parent.rowconfigure(1, weight=1)
+
+        controls = ttk.Frame(parent)
+        controls.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 5))
+
+        self.report_vars = {name: tk.StringVar() for name in ('period', 'from', 'to', 'category', 'window')}
+        self.report_vars['period'].set("Mensual")
+        self.report_vars['category'].set("Todas")
+        self.report_vars['window'].set(str(DEFAULT_WINDOW))
+        self.report_by_category = tk.BooleanVar(value=False)
+
+        ttk.Label(controls, text="Periodo:").pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Combobox(controls, width=10, state='readonly', values=list(REPORT_PERIODS),
+                     textvariable=self.report_vars['period']).pack(side=tk.LEFT, padx=(0, 10))
+        for label, name in (("Desde:", 'from'), ("Hasta:", 'to')):
+            ttk.Label(controls, text=label).pack(side=tk.LEFT, padx=(0, 5))
+            ttk.Entry(controls, width=11, textvariable=self.report_vars[name]).pack(side=tk.LEFT, padx=(0, 5))
+        self.report_category_combo = ttk.Combobox(controls, width=15, state='readonly',
+                                                  textvariable=self.report_vars['category'],
+                                                  postcommand=self.refresh_report_categories)
+        self.report_category_combo.pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Label(controls, text="Promedio de:").pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Spinbox(controls, from_=1, to=24, width=4,
+                    textvariable=self.report_vars['window']).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Checkbutton(controls, text="Por categoría", variable=self.report_by_category,
+                        command=self.refresh_report).pack(side=tk.LEFT)
+
+        self.report_status = ttk.Label(controls, text="")
+        self.report_status.pack(side=tk.RIGHT)
+
+        self.report_tree = ttk.Treeview(parent, show='headings', height=15)
+        report_scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.report_tree.yview)
+        self.report_tree.configure(yscrollcommand=report_scrollbar.set)
+        self.report_tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        report_scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
+
+        for var in self.report_vars.values():
+            var.trace_add('write', lambda *args: self.schedule_report())
+
+    def refresh_report_categories(self):
+        """Actualizar las categorías del reporte con las del índice de totales"""
+        self.report_category_combo.config(values=["Todas"] + sorted(self.ledger.rollup.categories))
+
+    def schedule_report(self):
+        """Recalcular cuando se deje de escribir en los filtros del reporte"""
+        if self.report_job is not None:
+            self.root.after_cancel(self.report_job)
+        self.report_job = self.root.after(SEARCH_DELAY_MS, self.refresh_report)
+
+    def refresh_report(self):
+        """Mostrar el reporte si la pestaña está a la vista; sin cambios en el registro sale de la caché"""
+        self.report_job = None
+        if self.notebook.select() != str(self.reports_frame):
+            return
+        values = {name: var.get().strip() for name, var in self.report_vars.items()}
+        category = values['category'] if values['category'] != "Todas" else None
+        try:
+            date_from = validate_date(values['from']) if values['from'] else None
+            date_to = validate_date(values['to']) if values['to'] else None
+            window = int(values['window']) if values['window'].isdigit() else 0
+            with self.timings.phase('aggregate'):
+                report = self.ledger.reports.report(REPORT_PERIODS[values['period']], date_from, date_to,
+                                                    category, window)
+        except ValueError as e:
+            # Fecha a medio escribir: se recalcula cuando esté completa
+            self.report_status.config(text=str(e))
+            return
+
+        by_category = self.report_by_category.get()
+        if (report, by_category) != self.shown_report:
+            with self.timings.phase('render'):
+                self.render_report(report, by_category)
+            self.shown_report = (report, by_category)
+        self.report_status.config(text=f"Total ${format_amount(report.total)} en {report.count} gastos")
+
+    def render_report(self, report, by_category):
+        """Volcar el reporte en la tabla de la pestaña"""
+        names = [name for name, _, _ in report.categories]
+        if by_category:
+            columns = ['period'] + [f"category{i}" for i in range(len(names))] + ['total']
+            headings = ["Periodo"] + names + ["Total"]
+        else:
+            columns = ['period', 'total', 'count', 'average', 'previous', 'change']
+            headings = ["Periodo", "Total", "Gastos", f"Promedio {report.window}", "Año anterior", "Variación"]
+
+        self.report_tree.delete(*self.report_tree.get_children())
+        self.report_tree.configure(columns=columns)
+        for column, heading in zip(columns, headings):
+            self.report_tree.heading(column, text=heading)
+            self.report_tree.column(column, width=100, anchor=tk.W if column == 'period' else tk.E)
+
+        for row in report.rows:
+            if by_category:
+                values = [row.label] + [f"${format_amount(row.categories.get(name, 0))}" for name in names]
+                values.append(f"${format_amount(row.total)}")
+            else:
+                values = (
+                    row.label,
+                    f"${format_amount(row.total)}",
+                    row.count,
+                    f"${format_amount(row.average)}",
+                    f"${format_amount(row.previous)}" if row.previous is not None else "-",
+                    f"{row.change:+.1f}%" if row.change is not None else "-"
+                )
+            self.report_tree.insert('', tk.END, values=values)
+
     def load_data(self):
         """Cargar datos y actualizar treeview"""
-        self.expenses = self.load_expenses()
+        self.show_ledger(*self.read_ledger())
         self.update_treeview()
 
-    def load_expenses(self) -> List[Dict[str, Any]]:
-        if not os.path.exists(DATA_FILE):
-            return []
+    def read_ledger(self):
+        """(versión, Ledger) leídos del almacenamiento; no toca Tk, así que puede correr en otro hilo"""
+        with self.timings.phase('load'):
+            # La versión se toma antes de leer: lo que llegue en medio se verá como cambio
+            version = self.storage.version()
+            ledger = Ledger(self.load_expenses(), reserve=self.storage.reserve_ids)
+        return version, ledger
+
+    def show_ledger(self, version, ledger):
+        """Pasar a usar el registro recién leído"""
+        self.loaded_version = version
+        self.ledger = ledger
+        self.expenses = ledger.expenses
+        self.columnar = None
+
+    def load_data_async(self):
+        """Leer el registro en un hilo de fondo; la ventana ya está visible y lo indica"""
+        self.set_loading(True)
+        self.load_outcome = None
+        threading.Thread(target=self.load_in_background, daemon=True).start()
+        self.root.after(LOAD_POLL_MS, self.poll_load)
+
+    def load_in_background(self):
+        # Solo escribe atributos; poll_load los recoge desde el hilo de Tk
         try:
-            with open(DATA_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return []
+            if self.storage is None:
+                # Abrir puede migrar el formato o la base: también fuera del hilo de Tk
+                self.storage = get_storage(self.backend)
+            # Las ocurrencias vencidas se guardan en un solo lote antes de leer el registro
+            self.recurring_added = materialize_due(self.storage, self.rules)
+            # Sin repetir los avisos que el CLI ya dio; los de esta sesión quedan en memoria
+            self.budgets = BudgetMonitor(self.rules.budgets(), self.rules.exceeded())
+            self.load_outcome = ('ok', self.read_ledger())
+        except Exception as e:
+            self.load_outcome = ('error', e)
+
+    def poll_load(self):
+        """Mostrar el registro cuando termine de cargarse"""
+        if self.load_outcome is None:
+            self.root.after(LOAD_POLL_MS, self.poll_load)
+            return
+
+        status, result = self.load_outcome
+        if status == 'error':
+            self.root.config(cursor='')
+            self.status_label.config(text="No se pudo cargar el registro")
+            messagebox.showerror("Error", f"No se pudo cargar el registro: {str(result)}")
+            return
+
+        self.show_ledger(*result)
+        # Las escrituras van a un hilo de fondo; al cerrar se vuelca lo pendiente
+        self.persistence = self.start_persistence(self.loaded_version)
+        self.set_loading(False)
+        # Lo que se haya escrito en la búsqueda o el reporte mientras cargaba se aplica ahora
+        self.apply_search()
+        self.refresh_report()
+        status = f"{len(self.expenses)} gastos cargados"
+        if self.recurring_added:
+            status += f" ({len(self.recurring_added)} recurrentes agregados)"
+        self.status_label.config(text=status)
+        self.mark_startup('loaded')
+
+    def set_loading(self, loading):
+        """Sin acciones sobre el registro hasta tenerlo en memoria"""
+        for button in self.ledger_buttons:
+            button.state(['disabled'] if loading else ['!disabled'])
+        self.root.config(cursor='watch' if loading else '')
+        if loading:
+            self.status_label.config(text="Cargando gastos...")
+
+    def on_map(self, event):
+        """La ventana principal ya está en pantalla"""
+        if event.widget is self.root:
+            self.mark_startup('window')
+
+    def mark_startup(self, name):
+        """Anotar un hito del arranque; con --startup-log se guardan y se cierra al tener ventana y datos"""
+        if self.startup_log is None or name in self.startup_times:
+            return
+        self.startup_times[name] = time.time()
+        if 'window' in self.startup_times and 'loaded' in self.startup_times:
+            with open(self.startup_log, 'w') as f:
+                json.dump(self.startup_times, f)
+            self.root.after_idle(self.on_close)
+
+    def load_expenses(self) -> List[Dict[str, Any]]:
+        return self.storage.load()
 
     def save_expenses(self, expenses: List[Dict[str, Any]]) -> None:
-        with open(DATA_FILE, 'w') as f:
-            json.dump(expenses, f, indent=2)
+        self.storage.save_all(expenses)
+
+    def record_change(self, *ops):
+        """Encolar el guardado en segundo plano (el Ledger ya actualizó sus índices)"""
+        if not ops:
+            return
+        self.columnar = None
+        self.persistence.submit(*ops)
+        self.status_label.config(text="Guardando...")
+        self.refresh_report()
+        # Los totales del Ledger ya incluyen el cambio: solo se revisan las celdas que tocó
+        alerts = self.budgets.check(self.ledger.rollup, ops)
+        if alerts:
+            messagebox.showwarning("Presupuesto", "\n".join(describe_alert(alert) for alert in alerts))
+
+    def on_saved(self, count):
+        if not self.persistence.pending():
+            self.status_label.config(text="Cambios guardados")
+
+    def on_save_error(self, error):
+        self.status_label.config(text="Error al guardar")
+        messagebox.showerror("Error", f"No se pudieron guardar los cambios (se reintentará): {str(error)}")
+
+    def on_close(self):
+        """Cerrar la ventana tras volcar los cambios pendientes"""
+        if self.persistence is None:
+            # Aún cargando: no hay nada que guardar
+            self.root.destroy()
+            return
+        self.status_label.config(text="Guardando...")
+        self.root.update_idletasks()
+        if not self.persistence.close():
+            if not messagebox.askyesno("Error", "Hay cambios sin guardar. ¿Cerrar de todos modos?"):
+                # Reiniciar el hilo para seguir reintentando
+                failed = self.persistence.failed
+                self.persistence = self.start_persistence(self.persistence.version)
+                self.persistence.submit(*failed)
+                return
+        self.root.destroy()
+
+    def on_external_changes(self, ops):
+        """Aplicar lo que guardó otro proceso sin pisar los cambios locales pendientes"""
+        with self.timings.phase('load'):
+            self.ledger.apply(ops, skip=self.persistence.unsaved_ids())
+        self.columnar = None
+        if self.query is not None:
+            self.update_treeview()
+        else:
+            with self.timings.phase('refresh'):
+                self.table.render()
+        self.refresh_report()
+        self.status_label.config(text=f"{len(ops)} cambios de otro proceso cargados")
+
+    def on_external_reload(self, expenses):
+        """Reemplazar el registro (otro proceso lo compactó o reescribió) conservando lo local pendiente"""
+        with self.timings.phase('load'):
+            previous = self.ledger
+            ledger = Ledger(expenses, reserve=self.persistence.reserve_ids)
+            ledger.next_id = max(ledger.next_id, previous.next_id)
+            ledger.reserved_until = previous.reserved_until
+            for expense_id in self.persistence.unsaved_ids():
+                local = previous.get(expense_id)
+                if local is not None:
+                    ledger.apply([{'op': 'update', 'expense': dict(local)}])
+                else:
+                    ledger.apply([{'op': 'delete', 'id': expense_id}])
+            self.ledger = ledger
+            self.expenses = ledger.expenses
+        self.columnar = None
+        self.update_treeview()
+        self.refresh_report()
+        self.status_label.config(text="Registro recargado (cambios de otro proceso)")
 
     def update_treeview(self):
-        """Actualizar el treeview con los datos actuales"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
-        for expense in self.expenses:
-            self.tree.insert('', 'end', values=(
-                expense['id'],
-                expense['date'],
-                expense['description'],
-                f"${expense['amount']:.2f}",
-                expense['category']
-            ))
+        """Actualizar el treeview con los datos actuales (filtrados si hay una búsqueda)"""
+        with self.timings.phase('refresh'):
+            if self.query is None:
+                self.table.set_rows(self.expenses)
+                self.search_status.config(text="")
+                return
+            # La primera búsqueda construye el índice; las siguientes solo lo consultan
+            with self.timings.phase('filter'):
+                rows = self.ledger.search(self.query)
+            self.table.set_rows(rows)
+        self.search_status.config(text=f"{len(rows)} de {len(self.expenses)} gastos")
+
+    @staticmethod
+    def format_row(expense):
+        return (
+            expense['id'],
+            expense['date'],
+            expense['description'],
+            f"${format_amount(expense['cents'])}",
+            expense['category']
+        )
 
     def clear_fields(self):
         """Limpiar campos de entrada"""
@@ -163,59 +591,111 @@ class ExpenseTrackerGUI:
 
     def add_expense(self):
         """Agregar nuevo gasto"""
-        description = self.desc_entry.get().strip()
-        amount_str = self.amount_entry.get().strip()
         category = self.category_combo.get()
 
-        if not description:
-            messagebox.showerror("Error", "La descripción es obligatoria")
-            return
-
         try:
-            amount = float(amount_str)
-            if amount <= 0:
-                messagebox.showerror("Error", "El monto debe ser positivo")
-                return
-        except ValueError:
-            messagebox.showerror("Error", "El monto debe ser un número válido")
+            description, cents = validate_expense(self.desc_entry.get(), self.amount_entry.get().strip())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return
 
-        # Crear nuevo gasto
-        new_id = max([expense['id'] for expense in self.expenses], default=0) + 1
-        new_expense = {
-            'id': new_id,
-            'date': datetime.now().strftime("%Y-%m-%d"),
-            'description': description,
-            'amount': amount,
-            'category': category
-        }
-
-        self.expenses.append(new_expense)
-        self.save_expenses(self.expenses)
-        self.update_treeview()
+        # Crear nuevo gasto con el siguiente id de la secuencia
+        op = self.ledger.add(description, cents, category)
+        self.record_change(op)
+        if self.query is not None:
+            self.update_treeview()
+        else:
+            with self.timings.phase('refresh'):
+                self.table.row_inserted(len(self.expenses) - 1)
+                self.table.see(len(self.expenses) - 1)
         self.clear_fields()
 
-        messagebox.showinfo("Éxito", f"Gasto agregado exitosamente (ID: {new_id})")
+        messagebox.showinfo("Éxito", f"Gasto agregado exitosamente (ID: {op['expense']['id']})")
 
     def delete_selected(self):
         """Eliminar gasto seleccionado"""
-        selected = self.tree.selection()
+        # La selección de la tabla incluye la fila aunque se haya desplazado fuera de la vista
+        selected = self.table.selection()
         if not selected:
             messagebox.showwarning("Advertencia", "Seleccione un gasto para eliminar")
             return
 
-        item = selected[0]
-        expense_id = self.tree.item(item)['values'][0]
+        expense_id = int(selected[0])
 
         if messagebox.askyesno("Confirmar", "¿Está seguro de eliminar este gasto?"):
-            self.expenses = [exp for exp in self.expenses if exp['id'] != expense_id]
-            self.save_expenses(self.expenses)
-            self.update_treeview()
+            if self.ledger.get(expense_id) is None:
+                # Otro proceso lo eliminó mientras tanto
+                self.update_treeview()
+                return
+            self.record_change(self.ledger.delete(expense_id))
+            if self.query is not None:
+                self.update_treeview()
+            else:
+                with self.timings.phase('refresh'):
+                    self.table.row_deleted(expense_id)
             messagebox.showinfo("Éxito", "Gasto eliminado exitosamente")
 
+    def import_file(self):
+        """Importar gastos desde un CSV, JSON o JSON Lines en una sola escritura"""
+        from tkinter import filedialog
+
+        filename = filedialog.askopenfilename(
+            filetypes=[("Extractos", "*.csv *.json *.jsonl *.expcol *.gz"), ("All files", "*.*")],
+            title="Importar gastos"
+        )
+        if not filename:
+            return
+
+        # Leer y validar el archivo puede tardar: se hace en un hilo de fondo, como la exportación
+        self.status_label.config(text="Importando...")
+        self.import_outcome = None
+        threading.Thread(target=self.import_in_background, args=(filename,), daemon=True).start()
+        self.root.after(LOAD_POLL_MS, self.poll_import)
+
+    def import_in_background(self, filename):
+        # Solo escribe atributos; poll_import los recoge desde el hilo de Tk
+        from importer import import_expenses
+
+        try:
+            # La numeración provisional no importa: los ids se reservan aquí y el hilo de Tk solo inserta
+            result = import_expenses(self.storage, filename, dry_run=True, next_id=1)
+            start = self.storage.reserve_ids(len(result.expenses)) if result.expenses else None
+            self.import_outcome = ('ok', (result, start))
+        except Exception as e:
+            self.import_outcome = ('error', e)
+
+    def poll_import(self):
+        """Agregar lo importado cuando el hilo de fondo termine"""
+        if self.import_outcome is None:
+            self.root.after(LOAD_POLL_MS, self.poll_import)
+            return
+
+        status, outcome = self.import_outcome
+        if status == 'error':
+            self.status_label.config(text="No se pudo importar")
+            messagebox.showerror("Error", f"No se pudo importar: {str(outcome)}")
+            return
+
+        result, start = outcome
+        if result.expenses:
+            self.record_change(*self.ledger.extend(result.expenses, start))
+        if self.query is not None:
+            self.update_treeview()
+        else:
+            with self.timings.phase('refresh'):
+                self.table.row_inserted(len(self.expenses) - len(result.expenses))
+        self.status_label.config(text=f"{len(result.expenses)} gastos importados")
+
+        message = (f"{len(result.expenses)} gastos importados en {result.elapsed:.2f}s "
+                   f"({result.rows_per_second:,.0f} filas/s)")
+        if result.rejected:
+            message += f"\n{len(result.rejected)} filas rechazadas:"
+            message += "".join(f"\n  fila {line}: {reason}" for line, reason in result.rejected[:10])
+        messagebox.showinfo("Importación", message)
+
     def edit_selected(self):
         """Editar gasto seleccionado"""
-        selected = self.tree.selection()
+        selected = self.table.selection()
         if not selected:
             messagebox.showwarning("Advertencia", "Seleccione un gasto para editar")
             return
@@ -224,16 +704,15 @@ class ExpenseTrackerGUI:
 
     def on_double_click(self, event):
         """Manejar doble clic para editar"""
-        selected = self.tree.selection()
+        selected = self.table.selection()
         if not selected:
             return
 
-        item = selected[0]
-        values = self.tree.item(item)['values']
-        expense_id = values[0]
+        # El iid de cada fila es el id del gasto
+        expense_id = int(selected[0])
 
-        # Encontrar el gasto
-        expense = next((exp for exp in self.expenses if exp['id'] == expense_id), None)
+        # Encontrar el gasto en el índice por id
+        expense = self.ledger.get(expense_id)
         if not expense:
             return
 
@@ -255,7 +734,7 @@ class ExpenseTrackerGUI:
 
         ttk.Label(window, text="Monto:").grid(row=1, column=0, sticky=tk.W, padx=10, pady=5)
         amount_entry = ttk.Entry(window, width=15)
-        amount_entry.insert(0, str(expense['amount']))
+        amount_entry.insert(0, format_amount(expense['cents']))
         amount_entry.grid(row=1, column=1, padx=10, pady=5, sticky=tk.W)
 
         ttk.Label(window, text="Categoría:").grid(row=2, column=0, sticky=tk.W, padx=10, pady=5)
@@ -267,30 +746,27 @@ class ExpenseTrackerGUI:
         category_combo.grid(row=2, column=1, padx=10, pady=5, sticky=tk.W)
 
         def save_changes():
-            description = desc_entry.get().strip()
-            amount_str = amount_entry.get().strip()
             category = category_combo.get()
 
-            if not description:
-                messagebox.showerror("Error", "La descripción es obligatoria")
+            try:
+                description, cents = validate_expense(desc_entry.get(), amount_entry.get().strip())
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
                 return
 
-            try:
-                amount = float(amount_str)
-                if amount <= 0:
-                    messagebox.showerror("Error", "El monto debe ser positivo")
-                    return
-            except ValueError:
-                messagebox.showerror("Error", "El monto debe ser un número válido")
+            if self.ledger.get(expense['id']) is None:
+                messagebox.showerror("Error", "Otro proceso eliminó este gasto")
+                window.destroy()
                 return
 
             # Actualizar gasto
-            expense['description'] = description
-            expense['amount'] = amount
-            expense['category'] = category
-
-            self.save_expenses(self.expenses)
-            self.update_treeview()
+            self.record_change(self.ledger.update(expense['id'], description=description, cents=cents,
+                                                  category=category))
+            if self.query is not None:
+                # El gasto editado puede dejar de coincidir con la búsqueda
+                self.update_treeview()
+            else:
+                self.table.row_updated(self.ledger.get(expense['id']))
             window.destroy()
             messagebox.showinfo("Éxito", "Gasto actualizado exitosamente")
 
@@ -300,72 +776,219 @@ class ExpenseTrackerGUI:
         ttk.Button(button_frame, text="Guardar", command=save_changes).pack(side=tk.LEFT, padx=10)
         ttk.Button(button_frame, text="Cancelar", command=window.destroy).pack(side=tk.LEFT)
 
+    def refresh_years(self):
+        """Actualizar los años del combo con los del índice de totales"""
+        years = sorted(self.ledger.rollup.years, reverse=True)
+        self.year_combo.config(values=["Todos"] + [str(year) for year in years])
+
+    def selected_period(self):
+        """(año, mes) elegidos en los combos; None significa todos"""
+        month_num = self.month_combo.current() if self.month_combo.get() != "Todos" else None
+        selected_year = self.year_combo.get()
+        year = int(selected_year) if selected_year.isdigit() else None
+        return year, month_num
+
+    def analytics(self):
+        """Tabla columnar de los gastos en memoria (si numpy está disponible)"""
+        from table import ExpenseTable, np
+
+        if np is None:
+            return self.ledger.rollup
+        if self.columnar is None:
+            self.columnar = ExpenseTable.from_expenses(self.expenses)
+        return self.columnar
+
+    def show_breakdown(self):
+        """Mostrar el total del periodo desglosado por categoría"""
+        year, month_num = self.selected_period()
+        with self.timings.phase('aggregate'):
+            rows = self.analytics().breakdown('category', year, month_num)
+        if not rows:
+            messagebox.showinfo("Desglose", "No hay gastos en el periodo seleccionado")
+            return
+        lines = [f"{category}: ${format_amount(total)} ({count} gastos)" for category, total, count in rows]
+        messagebox.showinfo("Desglose por categoría", "\n".join(lines))
+
     def show_summary(self):
         """Mostrar resumen de gastos"""
         selected_month = self.month_combo.get()
-
-        if selected_month == "Todos":
-            filtered_expenses = self.expenses
-            total = sum(exp['amount'] for exp in filtered_expenses)
-            self.summary_label.config(text=f"Total: ${total:.2f}")
-        else:
-            month_num = self.month_combo.current()
-            filtered_expenses = [
-                exp for exp in self.expenses
-                if datetime.strptime(exp['date'], "%Y-%m-%d").month == month_num
-            ]
-            total = sum(exp['amount'] for exp in filtered_expenses)
-            self.summary_label.config(text=f"Total {selected_month}: ${total:.2f}")
+        year, month_num = self.selected_period()
+        with self.timings.phase('aggregate'):
+            total = self.ledger.rollup.total(year, month_num)
+
+        label = " ".join(part for part in (
+            selected_month if month_num else "",
+            str(year) if year else ""
+        ) if part)
+        self.summary_label.config(text=f"Total {label}: ${format_amount(total)}" if label else f"Total: ${format_amount(total)}")
+
+    def show_debug_panel(self):
+        """Abrir (o traer al frente) el panel con el costo de cada fase"""
+        if self.debug_panel is not None and self.debug_panel.window.winfo_exists():
+            self.debug_panel.window.lift()
+            return
+        self.debug_panel = DebugPanel(self.root, self.timings)
 
     def export_to_csv(self):
         """Exportar gastos a CSV"""
-        if not self.expenses:
-            messagebox.showwarning("Advertencia", "No hay gastos para exportar")
-            return
-
-        filename = filedialog.asksaveasfilename(
+        self.start_export(
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            filetypes=[("CSV files", "*.csv"), ("CSV gzip", "*.csv.gz"), ("All files", "*.*")],
             title="Guardar como CSV"
         )
 
-        if filename:
-            try:
-                with open(filename, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=['id', 'date', 'description', 'amount', 'category'])
-                    writer.writeheader()
-                    writer.writerows(self.expenses)
-
-                messagebox.showinfo("Éxito", f"Gastos exportados a {filename}")
-            except Exception as e:
-                messagebox.showerror("Error", f"No se pudo exportar: {str(e)}")
-
     def export_to_json(self):
-        """Exportar gastos a JSON"""
+        """Exportar gastos a JSON, JSON Lines o columnar"""
+        self.start_export(
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("JSON Lines", "*.jsonl"), ("JSON Lines gzip", "*.jsonl.gz"),
+                       ("Columnar", "*.expcol"), ("All files", "*.*")],
+            title="Guardar como JSON"
+        )
+
+    def start_export(self, **dialog_options):
+        """Pedir el archivo y exportar en un hilo de fondo con barra de progreso"""
         if not self.expenses:
             messagebox.showwarning("Advertencia", "No hay gastos para exportar")
             return
 
-        filename = filedialog.asksaveasfilename(
-            defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
-            title="Guardar como JSON"
+        from tkinter import filedialog
+        from exporters import format_for_path
+
+        filename = filedialog.asksaveasfilename(**dialog_options)
+        if not filename:
+            return
+
+        try:
+            fmt, compress = format_for_path(filename)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+
+        # Copia de la lista: la GUI puede seguir agregando o borrando mientras tanto
+        ExportDialog(self.root, list(self.expenses), filename, fmt, compress)
+
+
+class DebugPanel:
+    """Ventana de depuración: última duración, total y llamadas de cada fase"""
+
+    REFRESH_MS = 500
+
+    def __init__(self, root, timings: Timings):
+        self.timings = timings
+        self.window = tk.Toplevel(root)
+        self.window.title("Depuración - Tiempos")
+        self.window.geometry("420x220")
+
+        columns = ('phase', 'last', 'total', 'calls')
+        self.tree = ttk.Treeview(self.window, columns=columns, show='headings', height=7)
+        for column, text, width in (('phase', 'Fase', 100), ('last', 'Última (ms)', 100),
+                                    ('total', 'Total (ms)', 100), ('calls', 'Llamadas', 80)):
+            self.tree.heading(column, text=text)
+            self.tree.column(column, width=width, anchor=tk.E if column != 'phase' else tk.W)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+
+        ttk.Button(self.window, text="Reiniciar", command=self.reset).pack(pady=(0, 10))
+        self.refresh()
+
+    def reset(self):
+        self.timings.reset()
+        self.refresh()
+
+    def refresh(self):
+        if not self.window.winfo_exists():
+            return
+        self.tree.delete(*self.tree.get_children())
+        for name, total, calls, last in self.timings.rows():
+            self.tree.insert('', tk.END, values=(name, f"{last * 1000:.2f}", f"{total * 1000:.2f}", calls))
+        self.window.after(self.REFRESH_MS, self.refresh)
+
+
+class ExportDialog:
+    """Ventana de progreso de una exportación que corre en un hilo de fondo"""
+
+    POLL_MS = 100
+
+    def __init__(self, root, expenses: List[Dict[str, Any]], filename: str, fmt: str, compress: bool):
+        self.root = root
+        self.filename = filename
+        self.total = len(expenses)
+        self.written = 0
+        self.outcome = None
+        self.cancel_event = threading.Event()
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Exportando")
+        self.window.geometry("400x120")
+        self.window.transient(root)
+        self.window.protocol("WM_DELETE_WINDOW", self.cancel)
+
+        self.label = ttk.Label(self.window, text=f"Exportando 0 de {self.total} gastos...")
+        self.label.pack(padx=10, pady=(15, 5))
+        self.progress = ttk.Progressbar(self.window, length=360, maximum=max(self.total, 1))
+        self.progress.pack(padx=10, pady=5)
+        ttk.Button(self.window, text="Cancelar", command=self.cancel).pack(pady=5)
+
+        self.thread = threading.Thread(
+            target=self.run, args=(expenses, filename, fmt, compress), daemon=True
         )
+        self.thread.start()
+        self.window.after(self.POLL_MS, self.poll)
 
-        if filename:
-            try:
-                with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(self.expenses, f, indent=2, ensure_ascii=False)
+    def run(self, expenses, filename, fmt, compress):
+        # Solo escribe atributos; la ventana los lee desde el hilo de Tk en poll()
+        from exporters import ExportCancelled, export_expenses
 
-                messagebox.showinfo("Éxito", f"Gastos exportados a {filename}")
-            except Exception as e:
-                messagebox.showerror("Error", f"No se pudo exportar: {str(e)}")
+        try:
+            export_expenses(expenses, filename, fmt, compress, progress=self.on_progress,
+                            cancel=self.cancel_event)
+            self.outcome = ('ok', None)
+        except ExportCancelled:
+            self.outcome = ('cancelled', None)
+        except Exception as e:
+            self.outcome = ('error', e)
+
+    def on_progress(self, written: int) -> None:
+        self.written = written
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def poll(self):
+        self.progress['value'] = self.written
+        self.label.config(text=f"Exportando {self.written} de {self.total} gastos...")
+        if self.outcome is None:
+            self.window.after(self.POLL_MS, self.poll)
+            return
+
+        self.window.destroy()
+        status, error = self.outcome
+        if status == 'ok':
+            messagebox.showinfo("Éxito", f"Gastos exportados a {self.filename}")
+        elif status == 'cancelled':
+            messagebox.showinfo("Exportación", "Exportación cancelada")
+        else:
+            messagebox.showerror("Error", f"No se pudo exportar: {str(error)}")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Expense Tracker GUI")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help='Formato de almacenamiento de los gastos')
+    parser.add_argument('--profile', nargs='?', const='expenses_gui.prof', metavar='ARCHIVO',
+                        help='Perfilar la sesión con cProfile y guardar el resultado al cerrar')
+    parser.add_argument('--startup-log', metavar='ARCHIVO',
+                        help='Guardar los tiempos de arranque en ARCHIVO (JSON) y cerrar al terminar de cargar')
+    args = parser.parse_args()
+
     root = tk.Tk()
-    app = ExpenseTrackerGUI(root)
-    root.mainloop()
+    if args.profile:
+        with profiled(args.profile):
+            app = ExpenseTrackerGUI(root, args.backend, args.startup_log)
+            root.mainloop()
+    else:
+        app = ExpenseTrackerGUI(root, args.backend, args.startup_log)
+        root.mainloop()
 
 
 if __name__ == "__main__":
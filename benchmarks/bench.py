@@ -0,0 +1,404 @@
+"""Benchmarks de los comandos del CLI y de la tabla de la GUI.
+
+Genera registros sintéticos de 1k/100k/1M gastos en un directorio temporal,
+mide cada operación (latencia, filas por segundo y pico de memoria con
+tracemalloc) y guarda los resultados en JSON para comparar entre commits:
+
+    python benchmarks/bench.py --sizes 1000 100000 --output resultados.json
+    python benchmarks/bench.py --compare resultados.json
+
+La GUI se mide con un Treeview simulado; ``--gui tk`` usa Tk de verdad
+(necesita una pantalla, por ejemplo ``xvfb-run python benchmarks/bench.py --gui tk``).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Callable, Iterator, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main as cli  # noqa: E402
+from exporters import export_expenses  # noqa: E402
+from instrumentation import Timings  # noqa: E402
+from recurring import EVERY, RuleStore, Scheduler, materialize_due  # noqa: E402
+from search import SearchQuery  # noqa: E402
+from storage import BACKENDS, DEFAULT_BACKEND, get_storage  # noqa: E402
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+RECURRING_RULES = 5000
+CATEGORIES = ["General", "Comida", "Transporte", "Entretenimiento", "Hogar", "Salud", "Educación", "Otros"]
+WORDS = ["Supermercado", "Gasolina", "Cine", "Alquiler", "Farmacia", "Libros", "Café", "Taxi", "Luz", "Agua"]
+
+
+def synthetic_expenses(size: int, seed: int = 42) -> Iterator[Dict[str, Any]]:
+    """Gastos reproducibles repartidos en los últimos tres años"""
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=3 * 365)
+    for expense_id in range(1, size + 1):
+        yield {
+            'id': expense_id,
+            'date': (start + timedelta(days=rng.randrange(3 * 365))).isoformat(),
+            'description': f"{rng.choice(WORDS)} {rng.randrange(1000)}",
+            'cents': rng.randrange(100, 50001),
+            'category': rng.choice(CATEGORIES),
+        }
+
+
+class StubTree:
+    """Treeview en memoria con las operaciones que usa VirtualTreeview"""
+
+    def __init__(self, height: int = 15):
+        self.height = height
+        self.items: Dict[str, Any] = {}
+        self.order: List[str] = []
+        self.selected: List[str] = []
+        self.focused = ''
+
+    def cget(self, option):
+        return self.height
+
+    def configure(self, **options):
+        pass
+
+    def bind(self, sequence, callback):
+        pass
+
+    def get_children(self):
+        return tuple(self.order)
+
+    def insert(self, parent, index, iid, values):
+        self.items[iid] = values
+        self.order.insert(index, iid)
+
+    def move(self, iid, parent, index):
+        self.order.remove(iid)
+        self.order.insert(index, iid)
+
+    def delete(self, iid):
+        del self.items[iid]
+        self.order.remove(iid)
+        if iid in self.selected:
+            self.selected.remove(iid)
+        if iid == self.focused:
+            self.focused = ''
+
+    def selection(self):
+        return tuple(self.selected)
+
+    def selection_set(self, items):
+        self.selected = list(items)
+
+    def focus(self, iid=None):
+        if iid is None:
+            return self.focused
+        self.focused = iid
+
+    def exists(self, iid):
+        return iid in self.items
+
+    def item(self, iid, values=None):
+        if values is not None:
+            self.items[iid] = values
+        return {'values': self.items[iid]}
+
+    def bbox(self, iid):
+        return (0, 0, 100, 20)
+
+    def yview_moveto(self, fraction):
+        pass
+
+
+class StubScrollbar:
+    def configure(self, **options):
+        pass
+
+    def set(self, first, last):
+        pass
+
+
+class StubLabel:
+    def config(self, **options):
+        pass
+
+
+def synthetic_rules(count: int, start: str, seed: int = 42) -> List[Dict[str, Any]]:
+    """Reglas recurrentes reproducibles que empiezan en ``start``"""
+    rng = random.Random(seed)
+    return [{
+        'id': rule_id,
+        'description': f"{rng.choice(WORDS)} {rule_id}",
+        'cents': rng.randrange(100, 50001),
+        'category': rng.choice(CATEGORIES),
+        'every': rng.choice(EVERY),
+        'start': start,
+        'until': None,
+        'done': 0,
+        'next': start,
+    } for rule_id in range(1, count + 1)]
+
+
+def make_gui(kind: str, storage):
+    """Instancia de ExpenseTrackerGUI con solo la tabla, sin ventana principal"""
+    from Prueba_GUI import ExpenseTrackerGUI
+    from virtual_tree import VirtualTreeview
+
+    gui = ExpenseTrackerGUI.__new__(ExpenseTrackerGUI)
+    gui.storage = storage
+    gui.timings = Timings()
+    gui.query = None
+    if kind == 'tk':
+        import tkinter as tk
+        from tkinter import ttk
+        gui.root = tk.Tk()
+        gui.root.withdraw()
+        tree = ttk.Treeview(gui.root, columns=('id', 'date', 'description', 'amount', 'category'),
+                            show='headings', height=15)
+        scrollbar = ttk.Scrollbar(gui.root, orient=tk.VERTICAL)
+        gui.search_status = ttk.Label(gui.root)
+    else:
+        gui.root = None
+        tree, scrollbar = StubTree(), StubScrollbar()
+        gui.search_status = StubLabel()
+    gui.tree = tree
+    gui.table = VirtualTreeview(tree, scrollbar, gui.format_row)
+    return gui
+
+
+def measure(operation: Callable[[], Any], repeat: int, rows: int) -> Dict[str, Any]:
+    """Mediana de ``repeat`` ejecuciones más una ejecución extra con tracemalloc"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+
+    # tracemalloc ralentiza mucho: el pico de memoria se mide aparte
+    tracemalloc.start()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latency = statistics.median(timings)
+    return {
+        'latency_s': latency,
+        'min_s': min(timings),
+        'rows_per_s': rows / latency if latency > 0 else None,
+        'peak_memory_bytes': peak,
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def benchmarks(backend: str, path: str, workdir: str, gui_kind: str) -> Dict[str, Callable[[], Any]]:
+    """Operaciones a medir; cada una abre el almacenamiento como un proceso nuevo del CLI"""
+
+    def fresh() -> None:
+        cli.storage = get_storage(backend, path)
+
+    def add():
+        fresh()
+        with quiet():
+            cli.add_expense("Benchmark", "12.50", "General")
+
+    def list_all():
+        fresh()
+        with quiet():
+            cli.list_expenses()
+
+    def list_top():
+        fresh()
+        with quiet():
+            cli.list_expenses(sort='amount', desc=True, limit=20)
+
+    def list_month():
+        # Con el backend sharded solo se abre el archivo del mes
+        fresh()
+        with quiet():
+            cli.list_expenses(SearchQuery(date_from=date.today().replace(day=1).isoformat()))
+
+    def summary_month():
+        fresh()
+        with quiet():
+            cli.show_summary(month=datetime.now().month)
+
+    def summary_by_category():
+        fresh()
+        with quiet():
+            cli.show_summary(by='category')
+
+    def report_week():
+        fresh()
+        with quiet():
+            cli.show_report('week', pager=False)
+
+    def export_csv():
+        fresh()
+        with quiet():
+            cli.export_data('csv', output=os.path.join(workdir, 'export.csv'))
+
+    # Reglas recurrentes ya al día: el arranque solo lee el archivo y mira next_due
+    rules = RuleStore(path)
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    rules.save({'next_id': RECURRING_RULES + 1, 'next_due': tomorrow, 'budgets': {}, 'pending': [],
+                'rules': synthetic_rules(RECURRING_RULES, tomorrow)})
+
+    def recurring_idle():
+        fresh()
+        materialize_due(cli.storage, rules)
+
+    def recurring_catch_up():
+        # Un año sin abrir la aplicación: todas las ocurrencias vencidas, sin escribirlas
+        year_ago = (date.today() - timedelta(days=365)).isoformat()
+        Scheduler(synthetic_rules(RECURRING_RULES, year_ago)).due(date.today().isoformat())
+
+    gui = make_gui(gui_kind, get_storage(backend, path))
+
+    def gui_load_data():
+        gui.storage = get_storage(backend, path)
+        gui.load_data()
+
+    def gui_update_treeview():
+        gui.update_treeview()
+
+    def gui_scroll():
+        # Recorrer el registro de punta a punta en 50 saltos de la barra
+        for step in range(50):
+            gui.table.yview('moveto', step / 50)
+
+    def gui_search():
+        # Teclear "super" en la barra de búsqueda; la primera pasada construye el índice
+        for prefix in range(1, 6):
+            gui.query = SearchQuery("super"[:prefix])
+            gui.update_treeview()
+        gui.query = None
+
+    def gui_report():
+        # Tras la primera vez el reporte sale de la caché (misma versión del registro)
+        gui.ledger.reports.report('week')
+
+    def gui_report_after_change():
+        # Un cambio actualiza los totales diarios en su lugar; solo se rearma la serie
+        expense = gui.ledger.expenses[0]
+        gui.ledger.update(expense['id'], cents=expense['cents'] + 1)
+        gui.ledger.reports.report('week')
+
+    return {
+        'cli.add_expense': add,
+        'cli.list_expenses': list_all,
+        'cli.list_expenses --sort amount --limit 20': list_top,
+        'cli.list_expenses --from (mes actual)': list_month,
+        'cli.show_summary --month': summary_month,
+        'cli.show_summary --by category': summary_by_category,
+        'cli.show_report --period week': report_week,
+        'cli.export_data csv': export_csv,
+        f'recurring: arranque sin vencimientos ({RECURRING_RULES} reglas)': recurring_idle,
+        f'recurring: un año atrasado ({RECURRING_RULES} reglas)': recurring_catch_up,
+        'gui.load_data': gui_load_data,
+        'gui.update_treeview': gui_update_treeview,
+        'gui.scroll': gui_scroll,
+        'gui.search': gui_search,
+        'gui.report (en caché)': gui_report,
+        'gui.report tras un cambio': gui_report_after_change,
+    }
+
+
+def run(sizes: List[int], backend: str, repeat: int, gui_kind: str, only: Optional[List[str]]) -> List[Dict[str, Any]]:
+    results = []
+    for size in sizes:
+        workdir = tempfile.mkdtemp(prefix='expense_bench_')
+        try:
+            path = os.path.join(workdir, 'expenses.json')
+            start = time.perf_counter()
+            export_expenses(synthetic_expenses(size), path, 'json')
+            # La primera apertura (paso a centavos del JSON exportado, migración a SQLite, índices) no se mide
+            get_storage(backend, path).rollup()
+            print(f"\n{size:,} gastos ({backend}), generados en {time.perf_counter() - start:.1f}s")
+
+            operations = benchmarks(backend, path, workdir, gui_kind)
+            # load_data deja la GUI lista para medir la tabla
+            operations['gui.load_data']()
+            for name, operation in operations.items():
+                if only and not any(fragment in name for fragment in only):
+                    continue
+                result = measure(operation, repeat, size)
+                result.update({'name': name, 'size': size, 'backend': backend})
+                results.append(result)
+                print(f"  {name:<44} {result['latency_s'] * 1000:>10.2f} ms  "
+                      f"{result['peak_memory_bytes'] / 2 ** 20:>8.1f} MiB")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous_path: str, results: List[Dict[str, Any]]) -> None:
+    """Mostrar cuánto cambió cada latencia respecto de un archivo anterior"""
+    with open(previous_path, 'r') as f:
+        previous = json.load(f)
+    baseline = {(r['name'], r['size'], r['backend']): r for r in previous['results']}
+    print(f"\nComparación con {previous_path} (commit {previous.get('commit')}):")
+    for result in results:
+        old = baseline.get((result['name'], result['size'], result['backend']))
+        if old is None or not old['latency_s']:
+            continue
+        ratio = result['latency_s'] / old['latency_s']
+        flag = "  <-- más lento" if ratio > 1.2 else ""
+        print(f"  {result['name']:<44} {result['size']:>9,}  x{ratio:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del Expense Tracker")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Tamaños de registro')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=DEFAULT_BACKEND)
+    parser.add_argument('--repeat', type=int, default=5, help='Ejecuciones por operación')
+    parser.add_argument('--gui', choices=['stub', 'tk'], default='stub',
+                        help='Treeview simulado o Tk real (requiere pantalla o Xvfb)')
+    parser.add_argument('--only', nargs='+', help='Medir solo las operaciones que contengan estos textos')
+    parser.add_argument('--output', help='Archivo JSON de resultados')
+    parser.add_argument('--compare', help='Resultados anteriores con los que comparar')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.backend, args.repeat, args.gui, args.only)
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'gui': args.gui,
+        'results': results,
+    }
+    output = args.output or f"bench_{report['commit'] or 'local'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados guardados en {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
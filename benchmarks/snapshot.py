@@ -0,0 +1,141 @@
+"""Snapshot JSON frente a snapshot binario: tamaño, escritura y lectura.
+
+Para cada tamaño escribe el mismo registro sintético como ``expenses.json``
+(con sangría, como lo guarda el almacenamiento) y como ``expenses.snap``,
+comprueba que el binario vuelve a dar exactamente el mismo JSON y mide:
+
+- escribir el snapshot completo
+- cargarlo entero (lo que hace la GUI al arrancar)
+- leer los primeros 20 gastos (``list --limit 20``)
+- buscar el último id (``update``/``delete`` sin servidor)
+
+    python benchmarks/snapshot.py --sizes 1000 100000 1000000 --output antes.json
+    python benchmarks/snapshot.py --compare antes.json
+
+Las lecturas van con el archivo ya en la caché de páginas del sistema.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import tempfile
+from datetime import datetime
+from typing import List, Dict, Any, Callable
+
+from bench import DEFAULT_SIZES, compare, git_commit, measure, synthetic_expenses
+from snapshot import Snapshot, write_snapshot
+from storage import atomic_write, atomic_write_json, iter_json_array
+
+FIRST_ROWS = 20
+
+
+def json_operations(path: str, expenses: List[Dict[str, Any]]) -> Dict[str, Callable[[], Any]]:
+    last_id = expenses[-1]['id']
+
+    def load():
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    return {
+        'write': lambda: atomic_write_json(path, expenses),
+        'load': load,
+        f'first {FIRST_ROWS}': lambda: list(itertools.islice(iter_json_array(path), FIRST_ROWS)),
+        'get last id': lambda: next(expense for expense in iter_json_array(path) if expense['id'] == last_id),
+    }
+
+
+def binary_operations(path: str, expenses: List[Dict[str, Any]]) -> Dict[str, Callable[[], Any]]:
+    last_id = expenses[-1]['id']
+
+    def load():
+        with Snapshot(path) as snapshot:
+            return list(snapshot)
+
+    def first():
+        with Snapshot(path) as snapshot:
+            return list(itertools.islice(snapshot, FIRST_ROWS))
+
+    def get_last():
+        with Snapshot(path) as snapshot:
+            return snapshot.find(last_id)
+
+    return {
+        'write': lambda: atomic_write(path, lambda f: write_snapshot(f, expenses), 'wb'),
+        'load': load,
+        f'first {FIRST_ROWS}': first,
+        'get last id': get_last,
+    }
+
+
+def check_round_trip(json_path: str, binary_path: str, workdir: str) -> None:
+    """JSON -> binario -> JSON debe dar el mismo archivo byte a byte"""
+    with Snapshot(binary_path) as snapshot:
+        expenses = list(snapshot)
+    back_path = os.path.join(workdir, 'back.json')
+    atomic_write_json(back_path, expenses)
+    with open(json_path, 'rb') as original, open(back_path, 'rb') as back:
+        if original.read() != back.read():
+            raise RuntimeError("El snapshot binario no reproduce el JSON original")
+
+
+def run(sizes: List[int], repeat: int) -> List[Dict[str, Any]]:
+    results = []
+    for size in sizes:
+        workdir = tempfile.mkdtemp(prefix='expense_snapshot_')
+        try:
+            expenses = list(synthetic_expenses(size))
+            paths = {'json': os.path.join(workdir, 'expenses.json'),
+                     'binary': os.path.join(workdir, 'expenses.snap')}
+            operations = {'json': json_operations(paths['json'], expenses),
+                          'binary': binary_operations(paths['binary'], expenses)}
+            for fmt in operations:
+                operations[fmt]['write']()
+            check_round_trip(paths['json'], paths['binary'], workdir)
+
+            sizes_on_disk = {fmt: os.path.getsize(path) for fmt, path in paths.items()}
+            print(f"\n{size:,} gastos: JSON {sizes_on_disk['json'] / 2 ** 20:.1f} MiB, "
+                  f"binario {sizes_on_disk['binary'] / 2 ** 20:.1f} MiB "
+                  f"({sizes_on_disk['binary'] / sizes_on_disk['json']:.0%})")
+
+            for name in operations['json']:
+                for fmt in operations:
+                    result = measure(operations[fmt][name], repeat, size)
+                    result.update({'name': f"{fmt}: {name}", 'size': size, 'backend': fmt,
+                                   'file_bytes': sizes_on_disk[fmt]})
+                    results.append(result)
+                    print(f"  {result['name']:<44} {result['latency_s'] * 1000:>10.2f} ms  "
+                          f"{result['peak_memory_bytes'] / 2 ** 20:>8.1f} MiB")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot JSON frente a binario")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Tamaños de registro')
+    parser.add_argument('--repeat', type=int, default=5, help='Ejecuciones por operación')
+    parser.add_argument('--output', help='Archivo JSON de resultados')
+    parser.add_argument('--compare', help='Resultados anteriores con los que comparar')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    output = args.output or f"bench_snapshot_{report['commit'] or 'local'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados guardados en {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Tiempo de arranque de la GUI, del script y del ejecutable empaquetado.
+
+Lanza la GUI con ``--startup-log`` sobre registros sintéticos y mide, desde
+que se crea el proceso:
+
+- ``init``: intérprete e imports (en el ejecutable onefile, también el
+  desempaquetado al directorio temporal)
+- ``window``: la ventana principal ya está en pantalla
+- ``loaded``: el registro terminó de cargarse en segundo plano
+
+    python benchmarks/startup.py --sizes 1000 100000
+    python benchmarks/startup.py --exe dist/ExpenseTracker.exe --runs 5 --compare antes.json
+
+Necesita una pantalla (por ejemplo ``xvfb-run python benchmarks/startup.py``).
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import List, Dict, Any
+
+from bench import ROOT, compare, git_commit, synthetic_expenses
+from exporters import export_expenses
+from storage import BACKENDS, DEFAULT_BACKEND, get_storage
+
+DEFAULT_SIZES = [1000, 100000]
+MILESTONES = ('init', 'window', 'loaded')
+
+# Un arranque que tarda más que esto se da por colgado
+LAUNCH_TIMEOUT = 120
+
+
+def launch(command: List[str], workdir: str) -> Dict[str, float]:
+    """Segundos desde el lanzamiento hasta cada hito de un arranque"""
+    log = os.path.join(workdir, 'startup.json')
+    if os.path.exists(log):
+        os.remove(log)
+    # Reloj de pared: el hijo anota sus hitos con time.time()
+    start = time.time()
+    subprocess.run(command + ['--startup-log', log], cwd=workdir, timeout=LAUNCH_TIMEOUT,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if not os.path.exists(log):
+        raise RuntimeError("La GUI terminó sin registrar el arranque (¿hay pantalla? pruebe con xvfb-run)")
+    with open(log, 'r') as f:
+        marks = json.load(f)
+    return {name: marks[name] - start for name in MILESTONES if name in marks}
+
+
+def run(targets: Dict[str, List[str]], sizes: List[int], backend: str, runs: int) -> List[Dict[str, Any]]:
+    results = []
+    for size in sizes:
+        workdir = tempfile.mkdtemp(prefix='expense_startup_')
+        try:
+            path = os.path.join(workdir, 'expenses.json')
+            export_expenses(synthetic_expenses(size), path, 'json')
+            # La conversión y la migración de la primera apertura no son parte del arranque
+            get_storage(backend, path).rollup()
+            print(f"\n{size:,} gastos ({backend})")
+
+            for target, command in targets.items():
+                samples = [launch(command + ['--backend', backend], workdir) for _ in range(runs)]
+                for milestone in MILESTONES:
+                    values = [sample[milestone] for sample in samples if milestone in sample]
+                    if not values:
+                        continue
+                    result = {
+                        'name': f"{target}: {milestone}",
+                        'size': size,
+                        'backend': backend,
+                        'latency_s': statistics.median(values),
+                        'min_s': min(values),
+                    }
+                    results.append(result)
+                    print(f"  {result['name']:<44} {result['latency_s'] * 1000:>10.1f} ms  "
+                          f"(mín. {result['min_s'] * 1000:.1f} ms)")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque de la GUI")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Tamaños de registro')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=DEFAULT_BACKEND)
+    parser.add_argument('--runs', type=int, default=5, help='Arranques por tamaño')
+    parser.add_argument('--exe', help='Ejecutable de PyInstaller a medir además del script')
+    parser.add_argument('--no-script', action='store_true', help='Medir solo el ejecutable')
+    parser.add_argument('--output', help='Archivo JSON de resultados')
+    parser.add_argument('--compare', help='Resultados anteriores con los que comparar')
+    args = parser.parse_args()
+
+    targets = {}
+    if not args.no_script:
+        targets['script'] = [sys.executable, os.path.join(ROOT, 'Prueba_GUI.py')]
+    if args.exe:
+        targets['exe'] = [os.path.abspath(args.exe)]
+    if not targets:
+        parser.error("no hay nada que medir: indique --exe o quite --no-script")
+
+    try:
+        results = run(targets, args.sizes, args.backend, args.runs)
+    except (RuntimeError, subprocess.TimeoutExpired) as e:
+        sys.exit(f"Error: {e}")
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    output = args.output or f"bench_startup_{report['commit'] or 'local'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados guardados en {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
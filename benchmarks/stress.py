@@ -0,0 +1,246 @@
+"""Prueba de estrés de acceso concurrente de varios procesos al mismo registro.
+
+Lanza procesos que escriben como el CLI (``main.add_expense`` y compañía,
+cada uno con su candado) y procesos que escriben como la GUI (``Ledger`` con
+ids reservados y ``PersistenceWorker``), todos a la vez sobre el mismo
+registro. Al mismo tiempo, procesos de solo lectura piden totales como
+``summary`` (sin candado, regenerando el índice cuando quedó viejo). Al
+final comprueba que no se perdió ni se duplicó ninguna escritura, que los
+índices cuadran, que ninguna lectura falló y que cada "GUI" terminó viendo
+exactamente lo mismo que hay en disco:
+
+    python benchmarks/stress.py --backend journal --cli 4 --gui 2 --readers 4 --ops 200
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from typing import List, Dict, Any, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main as cli  # noqa: E402
+import persistence  # noqa: E402
+import storage as storage_module  # noqa: E402
+from ledger import ID_BLOCK, Ledger  # noqa: E402
+from storage import BACKENDS, DEFAULT_BACKEND, get_storage  # noqa: E402
+
+# Compactar muy seguido para ejercitar también la recarga completa
+COMPACT_BYTES = 4096
+
+Expected = Dict[str, Any]
+
+
+def init_worker(compact_bytes: int) -> None:
+    storage_module.COMPACT_MIN_BYTES = compact_bytes
+
+
+def cli_writer(name: str, backend: str, path: str, ops: int) -> Expected:
+    """Escribir con las funciones del CLI; devuelve descripción -> centavos finales (None si se borró)"""
+    cli.storage = get_storage(backend, path)
+    expected: Expected = {}
+    ids: Dict[str, int] = {}
+    for i in range(ops):
+        description = f"{name}-{i}"
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            cli.add_expense(description, "1", name)
+        ids[description] = int(re.search(r"ID: (\d+)", output.getvalue()).group(1))
+        expected[description] = 100
+        if i % 5 == 4:
+            target = f"{name}-{i - 2}"
+            if expected[target] is not None:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    cli.update_expense(ids[target], amount="2")
+                expected[target] = 200
+        if i % 7 == 6:
+            target = f"{name}-{i - 1}"
+            with contextlib.redirect_stdout(io.StringIO()):
+                cli.delete_expense(ids[target])
+            expected[target] = None
+    return expected
+
+
+class StubRoot:
+    """Sustituto de Tk: los avisos del hilo de escritura se despachan a mano"""
+
+    def after(self, ms, callback):
+        pass
+
+
+class GuiSimulator:
+    """Lo mismo que hace ExpenseTrackerGUI con el registro, sin ventana"""
+
+    def __init__(self, backend: str, path: str):
+        self.storage = get_storage(backend, path)
+        version = self.storage.version()
+        self.ledger = Ledger(self.storage.load())
+        self.worker = persistence.PersistenceWorker(StubRoot(), self.storage, delay=0.01, version=version,
+                                                    on_external=self.on_external, on_reload=self.on_reload,
+                                                    on_error=self.on_error, id_block=ID_BLOCK)
+        self.ledger.reserve = self.worker.reserve_ids
+        self.errors: List[str] = []
+
+    def on_external(self, ops):
+        self.ledger.apply(ops, skip=self.worker.unsaved_ids())
+
+    def on_reload(self, expenses):
+        previous = self.ledger
+        ledger = Ledger(expenses, reserve=self.worker.reserve_ids)
+        ledger.next_id = max(ledger.next_id, previous.next_id)
+        ledger.reserved_until = previous.reserved_until
+        for expense_id in self.worker.unsaved_ids():
+            local = previous.get(expense_id)
+            if local is not None:
+                ledger.apply([{'op': 'update', 'expense': dict(local)}])
+            else:
+                ledger.apply([{'op': 'delete', 'id': expense_id}])
+        self.ledger = ledger
+
+    def on_error(self, error):
+        self.errors.append(str(error))
+
+
+def gui_writer(name: str, backend: str, path: str, ops: int, done) -> Tuple[Expected, bool, List[str]]:
+    gui = GuiSimulator(backend, path)
+    expected: Expected = {}
+    ids: Dict[str, int] = {}
+    for i in range(ops):
+        description = f"{name}-{i}"
+        op = gui.ledger.add(description, 100, name)
+        gui.worker.submit(op)
+        ids[description] = op['expense']['id']
+        expected[description] = 100
+        if i % 5 == 4:
+            target = f"{name}-{i - 2}"
+            if expected[target] is not None:
+                gui.worker.submit(gui.ledger.update(ids[target], cents=200))
+                expected[target] = 200
+        if i % 7 == 6:
+            target = f"{name}-{i - 1}"
+            gui.worker.submit(gui.ledger.delete(ids[target]))
+            expected[target] = None
+        gui.worker.dispatch()
+        time.sleep(0.002)
+
+    # Guardar lo pendiente pero seguir vigilando hasta que terminen los demás
+    while gui.worker.pending() or gui.worker.unsaved_ids():
+        gui.worker.dispatch()
+        time.sleep(0.05)
+    done.wait()
+    time.sleep(persistence.WATCH_INTERVAL * 2)
+    gui.worker.close()
+
+    on_disk = {expense['id']: expense for expense in gui.storage.load()}
+    in_memory = {expense['id']: expense for expense in gui.ledger.expenses}
+    return expected, on_disk == in_memory, gui.errors
+
+
+def reader(name: str, backend: str, path: str, done) -> Tuple[int, List[str]]:
+    """Leer totales y secuencia de ids como un comando de solo lectura hasta que terminen los escritores"""
+    reads, errors = 0, []
+    while not done.is_set():
+        try:
+            storage = get_storage(backend, path)
+            storage.rollup()
+            storage.next_id()
+            reads += 1
+        except Exception as error:
+            errors.append(f"{name}: {error}")
+    return reads, errors
+
+
+def verify(backend: str, path: str, expected: Expected) -> List[str]:
+    problems = []
+    storage = get_storage(backend, path)
+    expenses = storage.load()
+    by_description: Dict[str, Dict[str, Any]] = {}
+    for expense in expenses:
+        if expense['description'] in by_description:
+            problems.append(f"duplicado: {expense['description']}")
+        by_description[expense['description']] = expense
+    if len({expense['id'] for expense in expenses}) != len(expenses):
+        problems.append("ids repetidos")
+
+    for description, cents in expected.items():
+        expense = by_description.get(description)
+        if cents is None and expense is not None:
+            problems.append(f"{description}: debía estar borrado")
+        elif cents is not None and expense is None:
+            problems.append(f"{description}: escritura perdida")
+        elif cents is not None and expense['cents'] != cents:
+            problems.append(f"{description}: {expense['cents']} centavos en lugar de {cents}")
+    extra = set(by_description) - set(expected)
+    if extra:
+        problems.append(f"{len(extra)} gastos inesperados")
+
+    index = storage.rollup()
+    # Centavos enteros: los totales deben coincidir exactamente
+    total = sum(expense['cents'] for expense in expenses)
+    if index.count() != len(expenses) or index.total() != total:
+        problems.append(f"índice descuadrado: {index.count()} / {index.total()} frente a {len(expenses)} / {total}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estrés de acceso concurrente al registro")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=DEFAULT_BACKEND)
+    parser.add_argument('--cli', type=int, default=4, help='Procesos que escriben como el CLI')
+    parser.add_argument('--gui', type=int, default=2, help='Procesos que escriben como la GUI')
+    parser.add_argument('--readers', type=int, default=2, help='Procesos que solo leen totales')
+    parser.add_argument('--ops', type=int, default=200, help='Gastos que agrega cada proceso')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='expense_stress_')
+    path = os.path.join(workdir, 'expenses.json')
+    start = time.perf_counter()
+    try:
+        with multiprocessing.Manager() as manager, multiprocessing.Pool(args.cli + args.gui + args.readers, init_worker, (COMPACT_BYTES,)) as pool:
+            done = manager.Event()
+            cli_jobs = [pool.apply_async(cli_writer, (f"cli{n}", args.backend, path, args.ops))
+                        for n in range(args.cli)]
+            gui_jobs = [pool.apply_async(gui_writer, (f"gui{n}", args.backend, path, args.ops, done))
+                        for n in range(args.gui)]
+            reader_jobs = [pool.apply_async(reader, (f"reader{n}", args.backend, path, done))
+                           for n in range(args.readers)]
+
+            expected: Expected = {}
+            for job in cli_jobs:
+                expected.update(job.get())
+            done.set()
+            problems = []
+            for n, job in enumerate(gui_jobs):
+                gui_expected, consistent, errors = job.get()
+                expected.update(gui_expected)
+                if not consistent:
+                    problems.append(f"gui{n}: la memoria no coincide con el disco")
+                problems += [f"gui{n}: {error}" for error in errors]
+            reads = 0
+            for job in reader_jobs:
+                count, errors = job.get()
+                reads += count
+                problems += errors
+
+        problems += verify(args.backend, path, expected)
+        elapsed = time.perf_counter() - start
+        print(f"{args.backend}: {args.cli} procesos CLI + {args.gui} GUI x {args.ops} gastos "
+              f"y {args.readers} lectores ({reads} lecturas) en {elapsed:.1f}s")
+        if problems:
+            print(f"{len(problems)} problemas:")
+            for problem in problems[:20]:
+                print(f"  {problem}")
+            sys.exit(1)
+        print(f"OK: {sum(cents is not None for cents in expected.values())} gastos, ninguna escritura perdida")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
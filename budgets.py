@@ -0,0 +1,52 @@
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple
+
+from money import format_amount
+from rollup import expense_cell
+
+# (año, mes, categoría, gastado, límite), montos en centavos
+Alert = Tuple[int, int, str, int, int]
+
+
+class BudgetMonitor:
+    """Presupuestos mensuales por categoría contrastados con un ``RollupIndex``.
+
+    El índice ya se mantiene al día con cada cambio, así que revisar un cambio
+    es consultar las pocas celdas (año, mes, categoría) que toca, sin volver a
+    recorrer el registro. Cada celda avisa una vez al pasar su límite y
+    vuelve a avisar solo si bajó y lo supera de nuevo; ``exceeded`` (las
+    celdas que ya avisaron) puede venir de una sesión anterior.
+    """
+
+    def __init__(self, budgets: Dict[str, int], exceeded: Optional[Set[Tuple[int, int, str]]] = None):
+        self.budgets = budgets
+        self.exceeded: Set[Tuple[int, int, str]] = set() if exceeded is None else exceeded
+
+    def status(self, rollup, year: int, month: int) -> List[Alert]:
+        """Gastado frente al límite de cada categoría con presupuesto en ese mes"""
+        return [(year, month, category, rollup.total(year, month, category), limit)
+                for category, limit in sorted(self.budgets.items())]
+
+    def check(self, rollup, ops: Iterable[Dict[str, Any]]) -> List[Alert]:
+        """Celdas que ``ops`` (ya aplicadas a ``rollup``) acaban de llevar por encima de su límite"""
+        cells = set()
+        for op in ops:
+            for expense in (op.get('expense'), op.get('previous')):
+                if expense is not None and expense['category'] in self.budgets:
+                    cells.add(expense_cell(expense))
+
+        alerts = []
+        for cell in sorted(cells):
+            year, month, category = cell
+            spent, limit = rollup.total(year, month, category), self.budgets[category]
+            if spent <= limit:
+                self.exceeded.discard(cell)
+            elif cell not in self.exceeded:
+                self.exceeded.add(cell)
+                alerts.append((year, month, category, spent, limit))
+        return alerts
+
+
+def describe_alert(alert: Alert) -> str:
+    year, month, category, spent, limit = alert
+    return (f"Presupuesto de {category} superado en {year}-{month:02d}: "
+            f"${format_amount(spent)} de ${format_amount(limit)}")
@@ -0,0 +1,99 @@
+import json
+import os
+import signal
+import socket
+import socketserver
+from typing import Any, Callable, Dict, Optional
+
+SOCKET_SUFFIX = ".sock"
+
+# Si el servidor no acepta la conexión en este tiempo, el CLI trabaja solo
+CONNECT_TIMEOUT = 1.0
+
+Handler = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+def socket_path(data_path: str) -> str:
+    # Ruta relativa a propósito: las rutas absolutas pueden superar el límite de AF_UNIX
+    return data_path + SOCKET_SUFFIX
+
+
+def supported() -> bool:
+    return hasattr(socket, 'AF_UNIX')
+
+
+def send_request(path: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Enviar una petición al servidor; None si no hay ninguno escuchando.
+
+    Una vez conectado, un corte no devuelve None sino ConnectionError: la
+    petición pudo haberse aplicado y repetirla localmente la duplicaría.
+    """
+    if not supported() or not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError, socket.timeout):
+            return None
+        sock.settimeout(None)
+        sock.sendall(json.dumps(payload).encode('utf-8') + b'\n')
+        sock.shutdown(socket.SHUT_WR)
+        data = b''.join(iter(lambda: sock.recv(65536), b''))
+    finally:
+        sock.close()
+    if not data:
+        raise ConnectionError("El servidor cerró la conexión sin responder")
+    return json.loads(data)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            response = self.server.dispatch(json.loads(self.rfile.readline()))
+        except Exception as e:
+            response = {'ok': False, 'error': str(e)}
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class LedgerServer(socketserver.UnixStreamServer):
+    """Servidor de un solo hilo: atiende una petición a la vez, así que las
+    mutaciones quedan serializadas sin más sincronización."""
+
+    def __init__(self, path: str, dispatch: Handler):
+        self.dispatch = dispatch
+        super().__init__(path, _RequestHandler)
+        # Solo el dueño del registro puede hablar con el servidor
+        os.chmod(path, 0o600)
+
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(path: str, dispatch: Handler, on_ready: Optional[Callable[[], None]] = None) -> None:
+    """Atender peticiones en ``path`` hasta Ctrl+C o SIGTERM"""
+    if not supported():
+        raise RuntimeError("El modo servidor necesita sockets Unix (no disponibles en este sistema)")
+    if os.path.exists(path):
+        try:
+            if send_request(path, {'ping': True}) is not None:
+                raise RuntimeError(f"Ya hay un servidor escuchando en {path}")
+        except ConnectionError:
+            pass
+        # Socket huérfano de un servidor que terminó sin limpiar
+        os.remove(path)
+
+    server = LedgerServer(path, dispatch)
+    signal.signal(signal.SIGTERM, _stop)
+    if on_ready is not None:
+        on_ready()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
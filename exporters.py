@@ -0,0 +1,260 @@
+import array
+import csv
+import gzip
+import io
+import json
+import os
+import struct
+import sys
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Callable, Tuple
+
+from money import SCALE, format_amount, to_number
+
+# Los formatos de texto llevan el monto en decimal ('amount'), no en centavos
+FIELDNAMES = ['id', 'date', 'description', 'amount', 'category']
+
+# Filas que se acumulan en memoria antes de cada escritura
+EXPORT_CHUNK_SIZE = 10000
+
+FORMATS = {
+    'csv': '.csv',
+    'json': '.json',
+    'jsonl': '.jsonl',
+    'columnar': '.expcol',
+}
+
+# La versión 1 guardaba los montos como float64; la 2, centavos en int64
+COLUMNAR_MAGIC = b'EXPCOL2\n'
+COLUMNAR_MAGIC_V1 = b'EXPCOL1\n'
+EPOCH = date(1970, 1, 1)
+
+
+class ExportCancelled(Exception):
+    """La exportación se canceló antes de terminar"""
+
+
+def format_for_path(path: str) -> Tuple[str, bool]:
+    """Deducir (formato, gzip) a partir de la extensión del archivo"""
+    compress = path.lower().endswith('.gz')
+    extension = os.path.splitext(path[:-3] if compress else path)[1].lower()
+    for fmt, fmt_extension in FORMATS.items():
+        if extension == fmt_extension:
+            return fmt, compress
+    raise ValueError(f"Formato no soportado: {extension or path}")
+
+
+def default_filename(fmt: str, compress: bool = False) -> str:
+    name = f"expenses_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}{FORMATS[fmt]}"
+    return name + '.gz' if compress else name
+
+
+def chunked(expenses: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk = []
+    for expense in expenses:
+        chunk.append(expense)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def external(expense: Dict[str, Any]) -> Dict[str, Any]:
+    """Gasto con el monto en decimal, como lo esperan los demás programas"""
+    return {
+        'id': expense['id'],
+        'date': expense['date'],
+        'description': expense['description'],
+        'amount': to_number(expense['cents']),
+        'category': expense['category'],
+    }
+
+
+def _encode_csv(chunk: List[Dict[str, Any]], header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(FIELDNAMES)
+    # El monto con todos sus decimales ("12.50"), tal como se muestra
+    writer.writerows(
+        (expense['id'], expense['date'], expense['description'], format_amount(expense['cents']),
+         expense['category'])
+        for expense in chunk
+    )
+    return buffer.getvalue()
+
+
+def _encode_jsonl(chunk: List[Dict[str, Any]]) -> str:
+    return ''.join(json.dumps(external(expense), ensure_ascii=False) + '\n' for expense in chunk)
+
+
+def _encode_json(chunk: List[Dict[str, Any]], first: bool) -> str:
+    # Mismo aspecto que json.dump(..., indent=2) pero escrito por bloques
+    items = ('  ' + json.dumps(external(expense), indent=2, ensure_ascii=False).replace('\n', '\n  ')
+             for expense in chunk)
+    return ('' if first else ',\n') + ',\n'.join(items)
+
+
+def _le_bytes(typecode: str, values: Iterable[Any]) -> bytes:
+    column = array.array(typecode, values)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column.tobytes()
+
+
+def _encode_columnar(chunk: List[Dict[str, Any]], categories: Dict[str, int]) -> bytes:
+    """Un bloque columnar: conteo, categorías nuevas y luego una columna tras otra"""
+    new_categories = []
+    codes = []
+    for expense in chunk:
+        code = categories.get(expense['category'])
+        if code is None:
+            code = categories[expense['category']] = len(categories)
+            new_categories.append(expense['category'])
+        codes.append(code)
+
+    descriptions = [expense['description'].encode('utf-8') for expense in chunk]
+    parts = [struct.pack('<II', len(chunk), len(new_categories))]
+    for category in new_categories:
+        encoded = category.encode('utf-8')
+        parts.append(struct.pack('<H', len(encoded)))
+        parts.append(encoded)
+    parts.append(_le_bytes('q', (expense['id'] for expense in chunk)))
+    parts.append(_le_bytes('i', ((date.fromisoformat(expense['date']) - EPOCH).days for expense in chunk)))
+    parts.append(_le_bytes('q', (expense['cents'] for expense in chunk)))
+    parts.append(_le_bytes('I', codes))
+    parts.append(_le_bytes('I', (len(description) for description in descriptions)))
+    parts.append(b''.join(descriptions))
+    return b''.join(parts)
+
+
+def export_expenses(expenses: Iterable[Dict[str, Any]], path: str, fmt: str = 'csv', compress: bool = False,
+                    chunk_size: int = EXPORT_CHUNK_SIZE, progress: Optional[Callable[[int], None]] = None,
+                    cancel=None) -> int:
+    """Escribir los gastos por bloques y devolver cuántos se exportaron.
+
+    Se escribe a ``path + '.part'`` y se renombra al final, de modo que una
+    cancelación (``cancel.is_set()``) o un error no dejan un archivo a medias.
+    ``progress`` recibe el número de filas escritas tras cada bloque.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt}")
+
+    binary = fmt == 'columnar'
+    tmp_path = path + '.part'
+    if binary:
+        f = gzip.open(tmp_path, 'wb') if compress else open(tmp_path, 'wb')
+    elif compress:
+        f = gzip.open(tmp_path, 'wt', encoding='utf-8', newline='')
+    else:
+        f = open(tmp_path, 'w', encoding='utf-8', newline='')
+
+    written = 0
+    categories: Dict[str, int] = {}
+    try:
+        with f:
+            if fmt == 'json':
+                f.write('[\n')
+            elif binary:
+                f.write(COLUMNAR_MAGIC)
+
+            for chunk in chunked(expenses, chunk_size):
+                if cancel is not None and cancel.is_set():
+                    raise ExportCancelled()
+                if fmt == 'csv':
+                    f.write(_encode_csv(chunk, header=written == 0))
+                elif fmt == 'jsonl':
+                    f.write(_encode_jsonl(chunk))
+                elif fmt == 'json':
+                    f.write(_encode_json(chunk, first=written == 0))
+                else:
+                    f.write(_encode_columnar(chunk, categories))
+                written += len(chunk)
+                if progress is not None:
+                    progress(written)
+
+            if fmt == 'json':
+                f.write('\n]' if written else ']')
+            elif binary:
+                # Bloque vacío como marca de fin
+                f.write(struct.pack('<II', 0, 0))
+            elif fmt == 'csv' and written == 0:
+                f.write(_encode_csv([], header=True))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
+
+
+def _read_exact(f, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Archivo columnar truncado")
+    return data
+
+
+def _le_array(typecode: str, data: bytes) -> array.array:
+    column = array.array(typecode)
+    column.frombytes(data)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+def iter_columnar_blocks(path: str) -> Iterator[Tuple[List[str], Dict[str, Any]]]:
+    """Leer un archivo columnar bloque a bloque: (categorías, columnas en bruto).
+
+    Los montos siempre salen como centavos int64 (``cents``), también de
+    archivos de la versión 1.
+    """
+    opener = gzip.open if path.lower().endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        magic = f.read(len(COLUMNAR_MAGIC))
+        if magic not in (COLUMNAR_MAGIC, COLUMNAR_MAGIC_V1):
+            raise ValueError("No es un archivo columnar de gastos")
+        categories: List[str] = []
+        while True:
+            count, new_categories = struct.unpack('<II', _read_exact(f, 8))
+            if count == 0:
+                return
+            for _ in range(new_categories):
+                length, = struct.unpack('<H', _read_exact(f, 2))
+                categories.append(_read_exact(f, length).decode('utf-8'))
+            columns = {
+                'ids': _read_exact(f, 8 * count),
+                'days': _read_exact(f, 4 * count),
+                'cents': _read_exact(f, 8 * count),
+                'codes': _read_exact(f, 4 * count),
+                'lengths': _read_exact(f, 4 * count),
+            }
+            if magic == COLUMNAR_MAGIC_V1:
+                columns['cents'] = _le_bytes('q', (round(amount * SCALE)
+                                                   for amount in _le_array('d', columns['cents'])))
+            lengths = _le_array('I', columns['lengths'])
+            columns['descriptions'] = _read_exact(f, sum(lengths))
+            yield categories, columns
+
+
+def iter_columnar(path: str) -> Iterator[Dict[str, Any]]:
+    """Reconstruir los gastos (dicts) desde un archivo columnar"""
+    for categories, columns in iter_columnar_blocks(path):
+        ids = _le_array('q', columns['ids'])
+        days = _le_array('i', columns['days'])
+        cents = _le_array('q', columns['cents'])
+        codes = _le_array('I', columns['codes'])
+        lengths = _le_array('I', columns['lengths'])
+        blob = columns['descriptions']
+        offset = 0
+        for i in range(len(ids)):
+            end = offset + lengths[i]
+            yield {
+                'id': ids[i],
+                'date': (EPOCH + timedelta(days=days[i])).isoformat(),
+                'description': blob[offset:end].decode('utf-8'),
+                'cents': cents[i],
+                'category': categories[codes[i]],
+            }
+            offset = end
@@ -0,0 +1,130 @@
+import csv
+import gzip
+import json
+import os
+import time
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+from exporters import iter_columnar, FORMATS
+from instrumentation import TIMINGS
+from money import format_amount
+from storage import iter_json_array
+from validation import validate_date, validate_expense
+
+# Encabezados alternativos habituales en extractos bancarios
+FIELD_ALIASES = {
+    'descripcion': 'description',
+    'descripción': 'description',
+    'concepto': 'description',
+    'monto': 'amount',
+    'importe': 'amount',
+    'categoria': 'category',
+    'categoría': 'category',
+    'fecha': 'date',
+}
+
+
+def normalize_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    normalized = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        key = key.strip().lower()
+        normalized[FIELD_ALIASES.get(key, key)] = value
+    return normalized
+
+
+def _open_text(path: str, compress: bool, encoding: str = 'utf-8'):
+    if compress:
+        return gzip.open(path, 'rt', encoding=encoding, newline='')
+    return open(path, 'r', encoding=encoding, newline='')
+
+
+def iter_rows(path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Leer (número de fila, fila) de un CSV, JSON, JSON Lines o columnar (opcionalmente .gz)"""
+    compress = path.lower().endswith('.gz')
+    extension = os.path.splitext(path[:-3] if compress else path)[1].lower()
+
+    if extension == '.csv':
+        with _open_text(path, compress, 'utf-8-sig') as f:
+            # La fila 1 es el encabezado
+            for line_number, row in enumerate(csv.DictReader(f), start=2):
+                yield line_number, normalize_row(row)
+    elif extension in ('.jsonl', '.ndjson'):
+        with _open_text(path, compress) as f:
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_number, normalize_row(json.loads(line))
+    elif extension == '.json' and not compress:
+        for position, row in enumerate(iter_json_array(path), start=1):
+            yield position, normalize_row(row)
+    elif extension == FORMATS['columnar']:
+        for position, row in enumerate(iter_columnar(path), start=1):
+            yield position, row
+    else:
+        raise ValueError(f"Formato no soportado: {extension} (use .csv, .json, .jsonl o .expcol)")
+
+
+def parse_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Convertir una fila importada en un gasto sin id, o ValueError con el motivo"""
+    amount = row.get('amount')
+    if amount is None and 'cents' in row:
+        # Los archivos columnares ya traen el monto en centavos
+        amount = format_amount(row['cents'])
+    description, cents = validate_expense(row.get('description'), amount)
+    return {
+        'date': validate_date(row.get('date')),
+        'description': description,
+        'cents': cents,
+        'category': (row.get('category') or '').strip() or 'General',
+    }
+
+
+class ImportResult:
+    """Resumen de una importación: gastos creados, filas rechazadas y rendimiento"""
+
+    def __init__(self):
+        self.expenses: List[Dict[str, Any]] = []
+        self.rejected: List[Tuple[int, str]] = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        processed = len(self.expenses) + len(self.rejected)
+        return processed / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def import_expenses(storage, path: str, dry_run: bool = False, next_id: Optional[int] = None) -> ImportResult:
+    """Validar las filas de ``path`` y guardarlas en una única escritura por lotes.
+
+    Con ``dry_run`` solo se validan y numeran (a partir de ``next_id`` si se da),
+    para que quien llama decida cómo guardarlas.
+    """
+    result = ImportResult()
+    start = time.perf_counter()
+
+    for line_number, row in TIMINGS.timed('load', iter_rows(path)):
+        try:
+            with TIMINGS.phase('parse'):
+                expense = parse_row(row)
+        except ValueError as e:
+            result.rejected.append((line_number, str(e)))
+            continue
+        result.expenses.append(expense)
+
+    if dry_run:
+        _number(result.expenses, storage.next_id() if next_id is None else next_id)
+    elif result.expenses:
+        # Los ids se toman y se guardan bajo el mismo candado (el parseo queda fuera)
+        with storage.locked():
+            _number(result.expenses, storage.next_id())
+            with TIMINGS.phase('save'):
+                storage.add_many(result.expenses)
+
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def _number(expenses: List[Dict[str, Any]], next_id: int) -> None:
+    for offset, expense in enumerate(expenses):
+        expenses[offset] = {'id': next_id + offset, **expense}
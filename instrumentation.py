@@ -0,0 +1,116 @@
+import contextlib
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+# Funciones que se muestran al volcar un perfil
+PROFILE_TOP = 25
+
+
+class Timings:
+    """Duración acumulada por fase (load, parse, filter, aggregate, render, save...).
+
+    Los tiempos son exclusivos: si una fase corre dentro de otra, su duración
+    se descuenta de la exterior, así que la suma de las fases es el total real.
+    Desactivado, ``phase`` no mide nada.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.totals: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        # Duración (inclusiva) de la última ejecución de cada fase
+        self.last: Dict[str, float] = {}
+        self._local = threading.local()
+
+    def _stack(self) -> List[float]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        stack = self._stack()
+        # Cada nivel acumula el tiempo de sus fases hijas
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.record(name, elapsed - children, elapsed)
+
+    def timed(self, name: str, iterable: Iterable[T]) -> Iterable[T]:
+        """Contar como ``name`` el tiempo dentro del iterador (p. ej. leer y parsear en streaming)"""
+        if not self.enabled:
+            return iterable
+        return self._timed(name, iterable)
+
+    def _timed(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def record(self, name: str, seconds: float, inclusive: Optional[float] = None) -> None:
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.last[name] = seconds if inclusive is None else inclusive
+
+    def reset(self) -> None:
+        self.totals.clear()
+        self.calls.clear()
+        self.last.clear()
+
+    def rows(self) -> List[Tuple[str, float, int, float]]:
+        """(fase, total, llamadas, última) de la más costosa a la menos"""
+        return [
+            (name, total, self.calls[name], self.last[name])
+            for name, total in sorted(self.totals.items(), key=lambda item: item[1], reverse=True)
+        ]
+
+    def report(self) -> str:
+        total = sum(self.totals.values())
+        lines = ["Tiempos por fase:"]
+        for name, seconds, calls, _ in self.rows():
+            share = seconds / total * 100 if total else 0.0
+            lines.append(f"  {name:<10} {seconds * 1000:>10.2f} ms  {share:>5.1f}%  ({calls} llamadas)")
+        lines.append(f"  {'total':<10} {total * 1000:>10.2f} ms")
+        return "\n".join(lines)
+
+
+# Instancia compartida del CLI; main.py la activa con --timings
+TIMINGS = Timings()
+
+
+@contextlib.contextmanager
+def profiled(path: str, top: int = PROFILE_TOP, stream=None):
+    """Ejecutar el bloque bajo cProfile, guardar el perfil y mostrar las funciones más costosas"""
+    # Solo hacen falta con --profile: importarlos siempre retrasa el arranque
+    import cProfile
+    import pstats
+
+    stream = stream or sys.stderr
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(top)
+        print(f"Perfil guardado en {path} (python -m pstats {path})", file=stream)
@@ -0,0 +1,285 @@
+import contextlib
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterator, Callable, Collection
+
+from reports import ReportEngine, daily_totals
+from rollup import RollupIndex
+from search import SearchIndex, SearchQuery
+from storage import Storage
+
+# Ids que se reservan de una vez en el almacenamiento compartido
+ID_BLOCK = 32
+
+
+class Ledger:
+    """Gastos en memoria con índices mantenidos en cada cambio.
+
+    - ``expenses``: lista ordenada por id (la que muestra la tabla)
+    - ``by_id``: id -> gasto, para buscar, editar y borrar en O(1)
+    - ``rollup``: totales por (año, mes, categoría)
+    - ``next_id``: secuencia de ids, que nunca retrocede
+    - ``search_index``: palabras, categorías, fechas y montos; se construye
+      la primera vez que se busca y desde ahí se mantiene en cada cambio
+    - ``reports``: totales por (fecha, categoría) para los reportes; igual
+      que el de búsqueda, se arma al primer uso
+    - ``version``: contador que avanza con cada cambio (clave de las cachés)
+
+    Los métodos de cambio devuelven la operación en el formato de
+    ``Storage.apply``; guardarla es responsabilidad de quien llama. Con
+    ``reserve`` (p. ej. ``Storage.reserve_ids``) los ids se piden por bloques
+    al almacenamiento, así que no chocan con los de otros procesos.
+    """
+
+    def __init__(self, expenses: List[Dict[str, Any]], next_id: int = 1,
+                 reserve: Optional[Callable[[int], int]] = None):
+        # Los ids nuevos siempre son mayores, así que la lista sigue ordenada al agregar
+        if any(expenses[i]['id'] > expenses[i + 1]['id'] for i in range(len(expenses) - 1)):
+            expenses.sort(key=lambda expense: expense['id'])
+        self.expenses = expenses
+        self.by_id = {expense['id']: expense for expense in expenses}
+        self.rollup = RollupIndex.from_expenses(expenses)
+        last_id = expenses[-1]['id'] if expenses else 0
+        self.next_id = max(next_id, last_id + 1)
+        self.reserve = reserve
+        self.reserved_until = 0
+        self._search: Optional[SearchIndex] = None
+        self._reports: Optional[ReportEngine] = None
+        self.version = 0
+
+    @classmethod
+    def from_storage(cls, storage) -> 'Ledger':
+        return cls(storage.load(), storage.next_id())
+
+    def __len__(self) -> int:
+        return len(self.expenses)
+
+    def get(self, expense_id: int) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(expense_id)
+
+    @property
+    def search_ready(self) -> bool:
+        return self._search is not None
+
+    @property
+    def search_index(self) -> SearchIndex:
+        if self._search is None:
+            self._search = SearchIndex.from_expenses(self.expenses)
+        return self._search
+
+    def search(self, query: SearchQuery) -> List[Dict[str, Any]]:
+        """Gastos que cumplen ``query``, ordenados por id"""
+        return self.search_index.search(query, self.expenses, self.by_id)
+
+    @property
+    def reports(self) -> ReportEngine:
+        if self._reports is None:
+            self._reports = ReportEngine(lambda: daily_totals(self.expenses), lambda: self.version)
+        return self._reports
+
+    def position(self, expense_id: int) -> int:
+        """Posición de un id existente en ``expenses``"""
+        index = self.position_for(expense_id)
+        if index == len(self.expenses) or self.expenses[index]['id'] != expense_id:
+            raise KeyError(expense_id)
+        return index
+
+    def position_for(self, expense_id: int) -> int:
+        """Posición donde iría un id, por búsqueda binaria sobre la lista ordenada"""
+        low, high = 0, len(self.expenses)
+        while low < high:
+            middle = (low + high) // 2
+            if self.expenses[middle]['id'] < expense_id:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def allocate_id(self) -> int:
+        return self.allocate_ids(1)
+
+    def allocate_ids(self, count: int) -> int:
+        """Tomar ``count`` ids consecutivos y devolver el primero"""
+        if self.reserve is not None and self.next_id + count > self.reserved_until:
+            size = max(count, ID_BLOCK)
+            start = self.reserve(size)
+            self.next_id, self.reserved_until = start, start + size
+        start = self.next_id
+        self.next_id += count
+        return start
+
+    def add(self, description: str, cents: int, category: str, date: Optional[str] = None) -> Dict[str, Any]:
+        expense = {
+            'id': self.allocate_id(),
+            'date': date or datetime.now().strftime("%Y-%m-%d"),
+            'description': description,
+            'cents': cents,
+            'category': category
+        }
+        return self.insert(expense)
+
+    def extend(self, expenses: List[Dict[str, Any]], start: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Agregar gastos nuevos (p. ej. importados) con ids tomados de la secuencia.
+
+        Con ``start`` los ids ya vienen reservados (p. ej. desde un hilo de fondo).
+        """
+        if start is None:
+            start = self.allocate_ids(len(expenses))
+        for offset, expense in enumerate(expenses):
+            expense['id'] = start + offset
+        return [self.insert(expense) for expense in expenses]
+
+    def insert(self, expense: Dict[str, Any]) -> Dict[str, Any]:
+        if expense['id'] in self.by_id:
+            raise ValueError(f"Ya existe un gasto con ID {expense['id']}")
+        if self.expenses and expense['id'] < self.expenses[-1]['id']:
+            self.expenses.insert(self.position_for(expense['id']), expense)
+        else:
+            self.expenses.append(expense)
+        self.by_id[expense['id']] = expense
+        self.rollup.add(expense)
+        self.version += 1
+        if self._search is not None:
+            self._search.add(expense)
+        if self._reports is not None:
+            self._reports.add(expense)
+        self.next_id = max(self.next_id, expense['id'] + 1)
+        return {'op': 'add', 'expense': dict(expense)}
+
+    def update(self, expense_id: int, **changes: Any) -> Dict[str, Any]:
+        # El dict se modifica en su lugar: la lista y el índice lo comparten
+        expense = self.by_id[expense_id]
+        previous = dict(expense)
+        expense.update(changes)
+        self.rollup.replace(previous, expense)
+        self.version += 1
+        if self._search is not None:
+            self._search.replace(previous, expense)
+        if self._reports is not None:
+            self._reports.replace(previous, expense)
+        return {'op': 'update', 'expense': dict(expense), 'previous': previous}
+
+    def delete(self, expense_id: int) -> Dict[str, Any]:
+        del self.expenses[self.position(expense_id)]
+        expense = self.by_id.pop(expense_id)
+        self.rollup.remove(expense)
+        self.version += 1
+        if self._search is not None:
+            self._search.remove(expense)
+        if self._reports is not None:
+            self._reports.remove(expense)
+        return {'op': 'delete', 'id': expense_id, 'previous': expense}
+
+    def apply(self, ops: List[Dict[str, Any]], skip: Collection[int] = ()) -> None:
+        """Aplicar operaciones ya guardadas; igual que ``apply_ops``, son idempotentes.
+
+        Los ids de ``skip`` (cambios locales aún sin guardar) no se tocan: su
+        versión local se escribirá después y prevalecerá.
+        """
+        for op in ops:
+            expense_id = op['id'] if op['op'] == 'delete' else op['expense']['id']
+            if expense_id in skip:
+                continue
+            if op['op'] == 'delete':
+                if op['id'] in self.by_id:
+                    self.delete(op['id'])
+            elif op['expense']['id'] in self.by_id:
+                self.update(op['expense']['id'], **op['expense'])
+            else:
+                self.insert(dict(op['expense']))
+
+
+class LedgerStorage(Storage):
+    """Almacenamiento con el registro completo en memoria (modo servidor).
+
+    Las lecturas salen del ``Ledger``; cada lote se guarda primero en el
+    almacenamiento real y solo después se aplica en memoria.
+    """
+
+    def __init__(self, storage):
+        super().__init__()
+        self.storage = storage
+        # Versión del almacenamiento que ya refleja el Ledger
+        self._seen_version = storage.version()
+        self.ledger = Ledger.from_storage(storage)
+
+    def refresh(self) -> None:
+        """Incorporar lo que otros procesos escribieron desde la última vez"""
+        changes, self._seen_version = self.storage.changes_since(self._seen_version)
+        if changes is None:
+            self.ledger = Ledger.from_storage(self.storage)
+        elif changes:
+            self.ledger.apply(changes)
+
+    @contextlib.contextmanager
+    def locked(self):
+        with self.storage.locked():
+            self.refresh()
+            yield
+
+    @property
+    def name(self) -> str:
+        return self.storage.name
+
+    @property
+    def path(self) -> str:
+        return self.storage.path
+
+    def load(self) -> List[Dict[str, Any]]:
+        return [dict(expense) for expense in self.ledger.expenses]
+
+    def iter_expenses(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.ledger.expenses)
+
+    def is_empty(self) -> bool:
+        return not self.ledger.expenses
+
+    def get(self, expense_id: int) -> Optional[Dict[str, Any]]:
+        expense = self.ledger.get(expense_id)
+        return dict(expense) if expense else None
+
+    def search(self, query: SearchQuery) -> Iterator[Dict[str, Any]]:
+        # El índice queda construido entre una petición y la siguiente
+        return iter(self.ledger.search(query))
+
+    def next_id(self) -> int:
+        # La secuencia guardada incluye los ids que otros procesos ya reservaron
+        return max(self.ledger.next_id, self.storage.next_id())
+
+    def reserve_ids(self, count: int) -> int:
+        with self.locked():
+            return self.storage.reserve_ids(count)
+
+    def version(self):
+        return self.storage.version()
+
+    def rollup(self) -> RollupIndex:
+        return self.ledger.rollup
+
+    def report_engine(self) -> ReportEngine:
+        # Vive en el Ledger: los reportes quedan en caché entre peticiones
+        return self.ledger.reports
+
+    def apply(self, ops: List[Dict[str, Any]]) -> None:
+        with self.locked():
+            # El registro anterior ya está en memoria: el backend no necesita releerlo.
+            # Solo vale para la primera operación de cada id; las siguientes las resuelve el backend
+            seen = set()
+            for op in ops:
+                expense_id = op['id'] if op['op'] == 'delete' else op['expense']['id']
+                if expense_id not in seen and op.get('previous') is None:
+                    op['previous'] = self.get(expense_id)
+                seen.add(expense_id)
+            self.storage.apply(ops)
+            self.ledger.apply(ops)
+            self._seen_version = self.storage.version()
+
+    def save_all(self, expenses: List[Dict[str, Any]]) -> None:
+        with self.storage.locked():
+            self.storage.save_all(expenses)
+            self._seen_version = self.storage.version()
+            self.ledger = Ledger.from_storage(self.storage)
+
+    def compact(self) -> None:
+        with self.locked():
+            self.storage.compact()
+            self._seen_version = self.storage.version()
@@ -1,160 +1,605 @@
 import argparse
-import json
-import csv
+import collections
+import contextlib
+import heapq
+import io
+import itertools
 import os
+import shutil
+import subprocess
+import sys
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Iterable, Optional
 
-DATA_FILE = "expenses.json"
+import daemon
+from budgets import BudgetMonitor, describe_alert
+from exporters import FORMATS, default_filename, export_expenses
+from importer import import_expenses
+from instrumentation import TIMINGS, profiled
+from ledger import LedgerStorage
+from money import format_amount, parse_amount
+from recurring import EVERY, RuleStore, materialize_due
+from reports import DEFAULT_WINDOW, PERIODS
+from search import SearchQuery
+from storage import BACKENDS, DATA_FILE, DEFAULT_BACKEND, ShardedStorage, get_storage
+from validation import validate_amount, validate_date, validate_expense
 
-def load_expenses() -> List[Dict[str, Any]]:
+# Se abre en main() con el backend elegido: importar este módulo no toca el registro
+storage = None
+rules = RuleStore()
 
-    if not os.path.exists(DATA_FILE):
-        return []
+SUMMARY_GROUPS = {'year': 'año', 'month': 'mes', 'category': 'categoría'}
 
-    try:
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
+PERIOD_NAMES = {'week': 'semanal', 'month': 'mensual', 'year': 'anual'}
+
+# Opción de --sort -> campo del gasto
+SORT_KEYS = {'id': 'id', 'date': 'date', 'amount': 'cents', 'category': 'category'}
+
+# Líneas que se acumulan antes de cada escritura a la salida
+OUTPUT_CHUNK = 1000
+
+
+def load_expenses() -> List[Dict[str, Any]]:
+
+    return storage.load()
 
 
 def save_expenses(expenses: List[Dict[str, Any]]) -> None:
 
-    with open(DATA_FILE, 'w') as f:
-        json.dump(expenses, f, indent=2)
+    storage.save_all(expenses)
 
 
-def add_expense(description: str, amount: float, category: str = "General") -> None:
+def add_expense(description: str, amount: str, category: str = "General") -> None:
 
-    if amount <= 0:
-        print("Error: El monto debe ser positivo")
+    try:
+        with TIMINGS.phase('parse'):
+            description, cents = validate_expense(description, amount)
+    except ValueError as e:
+        print(f"Error: {e}")
         return
 
-    expenses = load_expenses()
+    # Crear nuevo gasto: el id se toma y se usa bajo el mismo candado
+    with storage.locked():
+        with TIMINGS.phase('load'):
+            new_id = storage.next_id()
+        new_expense = {
+            'id': new_id,
+            'date': datetime.now().strftime("%Y-%m-%d"),
+            'description': description,
+            'cents': cents,
+            'category': category
+        }
+
+        with TIMINGS.phase('save'):
+            storage.add(new_expense)
+    print(f"Gasto agregado exitosamente (ID: {new_id})")
+    warn_budgets({'op': 'add', 'expense': new_expense})
 
-    # Crear nuevo gasto
-    new_id = max([expense['id'] for expense in expenses], default=0) + 1
-    new_expense = {
-        'id': new_id,
-        'date': datetime.now().strftime("%Y-%m-%d"),
-        'description': description,
-        'amount': amount,
-        'category': category
-    }
 
-    expenses.append(new_expense)
-    save_expenses(expenses)
-    print(f"Gasto agregado exitosamente (ID: {new_id})")
+def warn_budgets(*ops: Dict[str, Any]) -> None:
 
+    if not rules.budgets():
+        return
+    # Los totales guardados ya incluyen el cambio: solo se consultan las celdas que tocó.
+    # Las que ya avisaron quedan anotadas, así que cada cruce avisa una vez y no en cada comando
+    for alert in rules.check_budgets(storage.rollup(), ops):
+        print(f"Aviso: {describe_alert(alert)}")
 
-def list_expenses() -> None:
 
-    expenses = load_expenses()
+def apply_recurring() -> None:
 
-    if not expenses:
-        print("No hay gastos registrados")
+    with TIMINGS.phase('load'):
+        added = materialize_due(storage, rules)
+    if added:
+        print(f"{len(added)} gastos recurrentes agregados")
+        warn_budgets(*({'op': 'add', 'expense': expense} for expense in added))
+
+
+@contextlib.contextmanager
+def output_pager(enabled: bool = True):
+
+    # Solo si la salida es una terminal; con less -F todo lo que cabe en pantalla sale directo
+    command = os.environ.get('PAGER') or ('less -FRX' if shutil.which('less') else 'more')
+    if not enabled or not sys.stdout.isatty():
+        yield sys.stdout
+        return
+
+    pager = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, text=True,
+                             encoding=sys.stdout.encoding, errors='replace')
+    try:
+        yield pager.stdin
+    except BrokenPipeError:
+        # Se cerró el paginador antes de llegar al final
+        pass
+    finally:
+        try:
+            pager.stdin.close()
+        except BrokenPipeError:
+            pass
+        pager.wait()
+
+
+def select_rows(expenses: Iterable[Dict[str, Any]], sort: Optional[str] = None, desc: bool = False,
+                limit: Optional[int] = None, offset: int = 0) -> Iterator[Dict[str, Any]]:
+
+    end = None if limit is None else offset + limit
+    if sort is None:
+        # Orden del registro: sin --desc basta con cortar el flujo, que se deja de leer al llegar al límite
+        if not desc:
+            return itertools.islice(expenses, offset, end)
+        rows = list(expenses) if end is None else collections.deque(expenses, maxlen=end)
+        return itertools.islice(reversed(rows), offset, None)
+
+    # El id desempata, así que las páginas no se solapan entre ejecuciones
+    column = SORT_KEYS[sort]
+    key = lambda expense: (expense[column], expense['id'])
+    if end is None:
+        rows = sorted(expenses, key=key, reverse=desc)
+    else:
+        # Un heap de offset + limit gastos en lugar de ordenar todo el registro
+        rows = (heapq.nlargest if desc else heapq.nsmallest)(end, expenses, key=key)
+    return iter(rows[offset:])
+
+
+def list_expenses(query: SearchQuery = None, sort: str = None, desc: bool = False, limit: int = None,
+                  offset: int = 0, pager: bool = True) -> None:
+
+    # Lectura y parseo van en streaming: se miden dentro del iterador
+    filtered = query is not None and not query.is_empty()
+    source = storage.search(query) if filtered else storage.iter_expenses()
+    with TIMINGS.phase('sort'):
+        expenses = select_rows(TIMINGS.timed('load', source), sort, desc, limit, offset)
+        first = next(expenses, None)
+
+    if first is None:
+        if filtered:
+            print("Ningún gasto coincide con la búsqueda")
+        else:
+            print(f"No hay gastos a partir de la posición {offset}" if offset else "No hay gastos registrados")
         return
 
-    print("\nID  Fecha       Descripción          Monto     Categoría")
-    print("-" * 60)
-    for expense in expenses:
-        print(
-            f"{expense['id']:<3} {expense['date']} {expense['description']:<20} ${expense['amount']:<8} {expense['category']}")
+    # Con --timings no se pagina: el tiempo de lectura del usuario no es 'render'
+    with TIMINGS.phase('render'), output_pager(pager and not TIMINGS.enabled) as out:
+        lines = ["", "ID  Fecha       Descripción          Monto     Categoría", "-" * 60]
+        for expense in itertools.chain([first], expenses):
+            lines.append(
+                f"{expense['id']:<3} {expense['date']} {expense['description']:<20} ${format_amount(expense['cents']):<8} {expense['category']}")
+            if len(lines) >= OUTPUT_CHUNK:
+                out.write("\n".join(lines) + "\n")
+                lines = []
+        out.write("\n".join(lines) + "\n")
 
 
 def delete_expense(expense_id: int) -> None:
 
-    expenses = load_expenses()
-    original_count = len(expenses)
+    with storage.locked():
+        with TIMINGS.phase('load'):
+            expense = storage.get(expense_id)
 
-    expenses = [expense for expense in expenses if expense['id'] != expense_id]
-
-    if len(expenses) == original_count:
-        print(f"Error: No se encontró gasto con ID {expense_id}")
-        return
+        if expense is None:
+            print(f"Error: No se encontró gasto con ID {expense_id}")
+            return
 
-    save_expenses(expenses)
+        with TIMINGS.phase('save'):
+            storage.delete(expense_id, expense)
     print(f"Gasto eliminado exitosamente")
+    # Bajar del presupuesto rearma el aviso de esa celda
+    warn_budgets({'op': 'delete', 'id': expense_id, 'previous': expense})
 
 
-def update_expense(expense_id: int, description: str = None, amount: float = None, category: str = None) -> None:
-
-    expenses = load_expenses()
+def update_expense(expense_id: int, description: str = None, amount: str = None, category: str = None) -> None:
 
-    for expense in expenses:
-        if expense['id'] == expense_id:
-            if description:
-                expense['description'] = description
-            if amount:
-                if amount <= 0:
-                    print("Error: El monto debe ser positivo")
-                    return
-                expense['amount'] = amount
-            if category:
-                expense['category'] = category
+    # Leer y reescribir bajo el candado para no pisar cambios de otro proceso
+    with storage.locked():
+        with TIMINGS.phase('load'):
+            previous = storage.get(expense_id)
 
-            save_expenses(expenses)
-            print(f"Gasto actualizado exitosamente")
+        if previous is None:
+            print(f"Error: No se encontró gasto con ID {expense_id}")
             return
 
-    print(f"Error: No se encontró gasto con ID {expense_id}")
+        expense = dict(previous)
+        if description:
+            expense['description'] = description
+        if amount:
+            try:
+                expense['cents'] = validate_amount(amount)
+            except ValueError as e:
+                print(f"Error: {e}")
+                return
+        if category:
+            expense['category'] = category
 
+        with TIMINGS.phase('save'):
+            storage.update(expense, previous)
+    print(f"Gasto actualizado exitosamente")
+    warn_budgets({'op': 'update', 'expense': expense, 'previous': previous})
 
-def show_summary(month: int = None) -> None:
 
-    expenses = load_expenses()
+def describe_period(year: int = None, month: int = None, category: str = None) -> str:
 
-    if not expenses:
+    label = ""
+    if month:
+        label += f" para {datetime(2024, month, 1).strftime('%B')} {year}"
+    elif year:
+        label += f" para {year}"
+    if category:
+        label += f" en {category}"
+    return label
+
+
+def show_summary(month: int = None, year: int = None, category: str = None, by: str = None,
+                 engine: str = 'index') -> None:
+
+    # Ambos motores responden a total/count/breakdown con la misma firma
+    with TIMINGS.phase('load'):
+        if engine == 'table':
+            # numpy es lo más lento de importar: solo se carga para este motor
+            from table import ExpenseTable
+            index = ExpenseTable.from_storage(storage)
+        else:
+            index = storage.rollup()
+
+    if index.count() == 0:
         print("No hay gastos registrados")
         return
 
-    if month:
-        # Filtrar por mes
-        filtered_expenses = [
-            expense for expense in expenses
-            if datetime.strptime(expense['date'], "%Y-%m-%d").month == month
-        ]
-        total = sum(expense['amount'] for expense in filtered_expenses)
-        month_name = datetime(2024, month, 1).strftime("%B")
-        print(f"Total de gastos para {month_name}: ${total:.2f}")
-    else:
-        # Resumen general
-        total = sum(expense['amount'] for expense in expenses)
-        print(f"Total de gastos: ${total:.2f}")
+    # Un mes sin año se refiere al año en curso, no a ese mes de todos los años
+    if month and not year:
+        year = datetime.now().year
+
+    label = describe_period(year, month, category)
+
+    with TIMINGS.phase('aggregate'):
+        rows = index.breakdown(by, year, month, category) if by else []
+        total = index.total(year, month, category)
 
+    with TIMINGS.phase('render'):
+        if by:
+            print(f"\nGastos por {SUMMARY_GROUPS[by]}{label}:")
+            for key, group_total, count in rows:
+                name = datetime(2024, key, 1).strftime("%B") if by == 'month' else key
+                print(f"  {name:<20} ${format_amount(group_total):>10}  ({count} gastos)")
+        print(f"Total de gastos{label}: ${format_amount(total)}")
 
-def export_to_csv() -> None:
+        # Los presupuestos son mensuales: solo se muestran para un mes
+        budgets = rules.budgets() if month else {}
+        if category:
+            budgets = {name: limit for name, limit in budgets.items() if name == category}
+        if budgets:
+            print("Presupuestos:")
+            print_budgets(BudgetMonitor(budgets).status(index, year, month))
 
-    expenses = load_expenses()
 
-    if not expenses:
+def print_budgets(rows) -> None:
+
+    for _, _, name, spent, limit in rows:
+        flag = "  ¡excedido!" if spent > limit else ""
+        print(f"  {name:<20} ${format_amount(spent):>10} de ${format_amount(limit):>10}  "
+              f"({spent * 100 / limit:5.1f}%){flag}")
+
+
+def show_report(period: str = 'month', date_from: str = None, date_to: str = None, category: str = None,
+                window: int = DEFAULT_WINDOW, by_category: bool = False, pager: bool = True) -> None:
+
+    date_from = validate_date(date_from) if date_from else None
+    date_to = validate_date(date_to) if date_to else None
+    # Con el servidor el motor vive en memoria: repetir el reporte sin cambios no recalcula nada
+    with TIMINGS.phase('aggregate'):
+        report = storage.report_engine().report(period, date_from, date_to, category, window)
+
+    if not report.rows:
+        print("No hay gastos en el periodo indicado")
+        return
+
+    with TIMINGS.phase('render'), output_pager(pager and not TIMINGS.enabled) as out:
+        scope = f" de {category}" if category else ""
+        lines = [f"\nReporte {PERIOD_NAMES[period]}{scope} ({report.rows[0].label} a {report.rows[-1].label}):"]
+        if by_category:
+            names = [name for name, _, _ in report.categories]
+            widths = [max(12, len(name)) for name in names]
+            lines.append(f"{'Periodo':<9} " + " ".join(f"{name:>{width}}" for name, width in zip(names, widths))
+                         + f" {'Total':>12}")
+            for row in report.rows:
+                cells = (f"${format_amount(row.categories.get(name, 0))}" for name in names)
+                lines.append(f"{row.label:<9} " + " ".join(f"{cell:>{width}}" for cell, width in zip(cells, widths))
+                             + f" {'$' + format_amount(row.total):>12}")
+        else:
+            lines.append(f"{'Periodo':<9} {'Total':>12} {'Gastos':>7} {f'Promedio {window}':>12} "
+                         f"{'Año anterior':>12} {'Var.':>8}")
+            for row in report.rows:
+                previous = f"${format_amount(row.previous)}" if row.previous is not None else "-"
+                change = f"{row.change:+.1f}%" if row.change is not None else "-"
+                lines.append(f"{row.label:<9} {'$' + format_amount(row.total):>12} {row.count:>7} "
+                             f"{'$' + format_amount(row.average):>12} {previous:>12} {change:>8}")
+
+        total = report.total
+        lines.append(f"\nTotal: ${format_amount(total)} ({report.count} gastos)")
+        if not category:
+            lines.append("Por categoría:")
+            for name, category_total, count in report.categories:
+                share = category_total * 100 / total if total else 0
+                lines.append(f"  {name:<20} ${format_amount(category_total):>10}  {share:5.1f}%  ({count} gastos)")
+        out.write("\n".join(lines) + "\n")
+
+
+def export_data(fmt: str = 'csv', compress: bool = False, output: str = None) -> None:
+
+    expenses = iter(TIMINGS.timed('load', storage.iter_expenses()))
+    first = next(expenses, None)
+
+    if first is None:
         print("No hay gastos para exportar")
         return
 
-    filename = f"expenses_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    filename = output or default_filename(fmt, compress)
+    # Codificar y escribir; la lectura del registro se descuenta como 'load'
+    with TIMINGS.phase('save'):
+        count = export_expenses(itertools.chain([first], expenses), filename, fmt, compress)
+
+    print(f"{count} gastos exportados exitosamente a {filename}")
+
+
+def import_file(path: str, dry_run: bool = False) -> None:
+
+    result = import_expenses(storage, path, dry_run)
+
+    action = "validados" if dry_run else "importados"
+    print(f"{len(result.expenses)} gastos {action} en {result.elapsed:.2f}s "
+          f"({result.rows_per_second:,.0f} filas/s)")
+
+    if result.rejected:
+        print(f"{len(result.rejected)} filas rechazadas:")
+        for line_number, reason in result.rejected[:20]:
+            print(f"  fila {line_number}: {reason}")
+        if len(result.rejected) > 20:
+            print(f"  ... y {len(result.rejected) - 20} más")
+
+    if not dry_run:
+        warn_budgets(*({'op': 'add', 'expense': expense} for expense in result.expenses))
+
+
+def compact_ledger() -> None:
+
+    with TIMINGS.phase('save'):
+        storage.compact()
+    print(f"Registro compactado en {storage.path}")
+
+
+def add_rule(description: str, amount: str, category: str = "General", every: str = 'month',
+             start: str = None, until: str = None) -> None:
+
+    try:
+        description, cents = validate_expense(description, amount)
+        rule = rules.add_rule(description, cents, category, every, start, until)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    print(f"Gasto recurrente agregado (ID: {rule['id']}), {PERIOD_NAMES[every]} desde {rule['start']}")
+    # Si empieza hoy o antes, las ocurrencias vencidas se agregan ya
+    apply_recurring()
+
+
+def list_rules() -> None:
+
+    rows = rules.rules()
+    if not rows:
+        print("No hay gastos recurrentes")
+        return
+    print("\nID  Frecuencia  Próxima     Descripción          Monto     Categoría")
+    print("-" * 72)
+    for rule in rows:
+        upcoming = rule['next'] or "terminada"
+        print(f"{rule['id']:<3} {PERIOD_NAMES[rule['every']]:<11} {upcoming:<11} {rule['description']:<20} "
+              f"${format_amount(rule['cents']):<8} {rule['category']}")
+
+
+def delete_rule(rule_id: int) -> None:
+
+    if rules.delete_rule(rule_id) is None:
+        print(f"Error: No se encontró gasto recurrente con ID {rule_id}")
+        return
+    print("Gasto recurrente eliminado (los gastos ya agregados se conservan)")
+
+
+def set_budget(category: str, amount: str) -> None:
+
+    try:
+        cents = validate_amount(amount)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    rules.set_budget(category, cents)
+    print(f"Presupuesto mensual de {category}: ${format_amount(cents)}")
+
+
+def delete_budget(category: str) -> None:
+
+    if not rules.set_budget(category, None):
+        print(f"Error: {category} no tiene presupuesto")
+        return
+    print(f"Presupuesto de {category} eliminado")
+
+
+def show_budgets(month: int = None, year: int = None) -> None:
+
+    budgets = rules.budgets()
+    if not budgets:
+        print("No hay presupuestos definidos")
+        return
+    now = datetime.now()
+    year, month = year or now.year, month or now.month
+    print(f"\nPresupuestos de {datetime(2024, month, 1).strftime('%B')} {year}:")
+    print_budgets(BudgetMonitor(budgets).status(storage.rollup(), year, month))
+
 
-    with open(filename, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=['id', 'date', 'description', 'amount', 'category'])
-        writer.writeheader()
-        writer.writerows(expenses)
+def split_ledger(source: str, force: bool = False) -> None:
 
-    print(f"Gastos exportados exitosamente a {filename}")
+    # Sin migrate(): el origen es el que se indica, no necesariamente expenses.json
+    target = ShardedStorage(DATA_FILE)
+    if not os.path.exists(source):
+        print(f"Error: no existe {source}")
+        return
+    if not target.is_empty() and not force:
+        print(f"Error: {target.path} ya tiene gastos (use --force para reemplazarlos)")
+        return
+    with TIMINGS.phase('save'):
+        count = target.split(source)
+    print(f"{count} gastos repartidos en {len(target.shards())} meses en {target.path}")
+
+
+def serve_ledger(backend: str) -> None:
+
+    # El registro y sus índices quedan en memoria mientras el servidor corre
+    global storage
+    storage = LedgerStorage(storage)
+    path = daemon.socket_path(DATA_FILE)
+
+    def dispatch(request):
+        if request.get('ping'):
+            return {'ok': True}
+        if request.get('backend') != backend:
+            return {'ok': False, 'backend': backend}
+        # Otro proceso (la GUI, un CLI con --no-daemon) pudo escribir mientras tanto
+        storage.refresh()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            run_command(argparse.Namespace(**request['args']))
+        return {'ok': True, 'output': output.getvalue()}
+
+    daemon.serve(path, dispatch, on_ready=lambda: print(
+        f"Servidor ({backend}, {len(storage.ledger)} gastos) escuchando en {path} (Ctrl+C para detener)", flush=True))
+    print("Servidor detenido")
+
+
+def forward_command(args) -> bool:
+
+    # Las rutas se resuelven aquí: el servidor puede correr en otro directorio de trabajo
+    options = {key: value for key, value in vars(args).items()
+               if key not in ('backend', 'timings', 'profile', 'no_daemon')}
+    if args.command == 'import':
+        options['file'] = os.path.abspath(args.file)
+    elif args.command == 'export':
+        options['output'] = os.path.abspath(args.output or default_filename(args.format, args.gzip))
+
+    response = daemon.send_request(daemon.socket_path(DATA_FILE), {'backend': args.backend, 'args': options})
+    if response is None or 'backend' in response:
+        # Sin servidor, o uno que atiende otro backend: se ejecuta localmente
+        return False
+    if not response['ok']:
+        raise RuntimeError(response['error'])
+    # El servidor no tiene terminal: el listado se pagina de este lado
+    with output_pager(args.command in ('list', 'report') and not args.no_pager) as out:
+        out.write(response['output'])
+    return True
+
+
+def run_command(args) -> None:
+
+    try:
+        # Las ocurrencias vencidas se agregan en un solo lote antes de cualquier comando
+        if args.command not in ('serve', 'split'):
+            apply_recurring()
+
+        if args.command == 'add':
+            add_expense(args.description, args.amount, args.category)
+        elif args.command == 'list':
+            list_expenses(SearchQuery(args.search, args.category, args.date_from, args.date_to,
+                                      args.min_amount, args.max_amount),
+                          args.sort, args.desc, args.limit, args.offset, not args.no_pager)
+        elif args.command == 'delete':
+            delete_expense(args.id)
+        elif args.command == 'update':
+            update_expense(args.id, args.description, args.amount, args.category)
+        elif args.command == 'summary':
+            show_summary(args.month, args.year, args.category, args.by, args.engine)
+        elif args.command == 'report':
+            show_report(args.period, args.date_from, args.date_to, args.category, args.window, args.by_category,
+                        not args.no_pager)
+        elif args.command == 'export':
+            export_data(args.format, args.gzip, args.output)
+        elif args.command == 'import':
+            import_file(args.file, args.dry_run)
+        elif args.command == 'compact':
+            compact_ledger()
+        elif args.command == 'recurring':
+            if args.action == 'add':
+                add_rule(args.description, args.amount, args.category, args.every, args.start, args.until)
+            elif args.action == 'list':
+                list_rules()
+            else:
+                delete_rule(args.id)
+        elif args.command == 'budget':
+            if args.action == 'set':
+                set_budget(args.category, args.amount)
+            elif args.action == 'list':
+                show_budgets(args.month, args.year)
+            else:
+                delete_budget(args.category)
+        elif args.command == 'split':
+            split_ledger(args.source, args.force)
+        elif args.command == 'serve':
+            serve_ledger(args.backend)
+    except Exception as e:
+        print(f"Error: {e}")
+
+
+def non_negative(value: str) -> int:
+
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError("debe ser un entero mayor o igual a 0")
+    return number
+
+
+def positive(value: str) -> int:
+
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("debe ser un entero mayor que 0")
+    return number
+
+
+def amount_arg(value: str) -> int:
+
+    try:
+        return parse_amount(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
 
 def main():
 
     parser = argparse.ArgumentParser(description="Expense Tracker CLI")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help='Formato de almacenamiento de los gastos')
+    parser.add_argument('--timings', action='store_true',
+                        help='Mostrar la duración de cada fase (load, parse, aggregate, render, save...)')
+    parser.add_argument('--profile', nargs='?', const='expenses.prof', metavar='ARCHIVO',
+                        help='Perfilar el comando con cProfile y guardar el resultado (por defecto expenses.prof)')
+    parser.add_argument('--no-daemon', action='store_true',
+                        help='No usar el servidor aunque esté corriendo')
     subparsers = parser.add_subparsers(dest='command', required=True)
 
     # Comando add
     add_parser = subparsers.add_parser('add', help='Agregar un nuevo gasto')
     add_parser.add_argument('--description', required=True, help='Descripción del gasto')
-    add_parser.add_argument('--amount', type=float, required=True, help='Monto del gasto')
+    add_parser.add_argument('--amount', required=True, help='Monto del gasto')
     add_parser.add_argument('--category', default='General', help='Categoría del gasto')
 
     # Comando list
-    subparsers.add_parser('list', help='Listar todos los gastos')
+    list_parser = subparsers.add_parser('list', help='Listar todos los gastos')
+    list_parser.add_argument('--search', help='Palabras que deben aparecer en la descripción')
+    list_parser.add_argument('--category', help='Solo esta categoría')
+    list_parser.add_argument('--from', dest='date_from', metavar='AAAA-MM-DD', help='Desde esta fecha (incluida)')
+    list_parser.add_argument('--to', dest='date_to', metavar='AAAA-MM-DD', help='Hasta esta fecha (incluida)')
+    list_parser.add_argument('--min-amount', type=amount_arg, help='Monto mínimo')
+    list_parser.add_argument('--max-amount', type=amount_arg, help='Monto máximo')
+    list_parser.add_argument('--sort', choices=SORT_KEYS, help='Ordenar por esta columna (por defecto, orden del registro)')
+    list_parser.add_argument('--desc', action='store_true', help='Orden descendente')
+    list_parser.add_argument('--limit', type=positive, help='Mostrar como mucho esta cantidad de gastos')
+    list_parser.add_argument('--offset', type=non_negative, default=0, help='Saltar los primeros N gastos')
+    list_parser.add_argument('--no-pager', action='store_true', help='No paginar aunque la salida sea una terminal')
 
     # Comando delete
     delete_parser = subparsers.add_parser('delete', help='Eliminar un gasto')
@@ -164,33 +609,105 @@ def main():
     update_parser = subparsers.add_parser('update', help='Actualizar un gasto')
     update_parser.add_argument('--id', type=int, required=True, help='ID del gasto a actualizar')
     update_parser.add_argument('--description', help='Nueva descripción')
-    update_parser.add_argument('--amount', type=float, help='Nuevo monto')
+    update_parser.add_argument('--amount', help='Nuevo monto')
     update_parser.add_argument('--category', help='Nueva categoría')
 
     # Comando summary
     summary_parser = subparsers.add_parser('summary', help='Mostrar resumen de gastos')
-    summary_parser.add_argument('--month', type=int, help='Mes específico (1-12)')
+    summary_parser.add_argument('--month', type=int, choices=range(1, 13), metavar='{1-12}',
+                                help='Mes específico (1-12, del año actual si no se indica --year)')
+    summary_parser.add_argument('--year', type=int, help='Año específico')
+    summary_parser.add_argument('--category', help='Categoría específica')
+    summary_parser.add_argument('--by', choices=sorted(SUMMARY_GROUPS), help='Desglosar el total')
+    summary_parser.add_argument('--engine', choices=['index', 'table'], default='index',
+                                help='index: totales precalculados; table: columnas numpy vectorizadas')
+
+    # Comando report
+    report_parser = subparsers.add_parser('report', help='Serie por semana, mes o año con promedio móvil '
+                                                         'y comparación con el año anterior')
+    report_parser.add_argument('--period', choices=PERIODS, default='month', help='Agrupación de la serie')
+    report_parser.add_argument('--from', dest='date_from', metavar='AAAA-MM-DD', help='Desde esta fecha (incluida)')
+    report_parser.add_argument('--to', dest='date_to', metavar='AAAA-MM-DD', help='Hasta esta fecha (incluida)')
+    report_parser.add_argument('--category', help='Solo esta categoría')
+    report_parser.add_argument('--window', type=non_negative, default=DEFAULT_WINDOW,
+                               help='Periodos del promedio móvil')
+    report_parser.add_argument('--by-category', action='store_true', help='Una columna por categoría')
+    report_parser.add_argument('--no-pager', action='store_true', help='No paginar aunque la salida sea una terminal')
 
     # Comando export
-    subparsers.add_parser('export', help='Exportar gastos a CSV')
+    export_parser = subparsers.add_parser('export', help='Exportar gastos a CSV, JSON, JSON Lines o columnar')
+    export_parser.add_argument('--format', choices=sorted(FORMATS), default='csv', help='Formato de salida')
+    export_parser.add_argument('--gzip', action='store_true', help='Comprimir la salida con gzip')
+    export_parser.add_argument('--output', help='Archivo de salida (por defecto uno con fecha y hora)')
+
+    # Comando import
+    import_parser = subparsers.add_parser('import', help='Importar gastos desde CSV, JSON o JSON Lines')
+    import_parser.add_argument('file', help='Archivo a importar (.csv, .json, .jsonl, .expcol; admite .gz)')
+    import_parser.add_argument('--dry-run', action='store_true', help='Solo validar, sin guardar')
+
+    # Comando compact
+    subparsers.add_parser('compact', help='Volcar el diario de cambios al archivo principal')
+
+    # Comando recurring
+    recurring_parser = subparsers.add_parser('recurring', help='Gastos que se agregan solos cada semana, mes o año')
+    recurring_actions = recurring_parser.add_subparsers(dest='action', required=True)
+    rule_add_parser = recurring_actions.add_parser('add', help='Nuevo gasto recurrente')
+    rule_add_parser.add_argument('--description', required=True, help='Descripción del gasto')
+    rule_add_parser.add_argument('--amount', required=True, help='Monto de cada ocurrencia')
+    rule_add_parser.add_argument('--category', default='General', help='Categoría del gasto')
+    rule_add_parser.add_argument('--every', choices=EVERY, default='month', help='Frecuencia')
+    rule_add_parser.add_argument('--start', metavar='AAAA-MM-DD', help='Primera ocurrencia (por defecto hoy)')
+    rule_add_parser.add_argument('--until', metavar='AAAA-MM-DD', help='Última fecha posible (incluida)')
+    recurring_actions.add_parser('list', help='Listar los gastos recurrentes')
+    rule_delete_parser = recurring_actions.add_parser('delete', help='Eliminar un gasto recurrente')
+    rule_delete_parser.add_argument('--id', type=int, required=True, help='ID de la regla')
+
+    # Comando budget
+    budget_parser = subparsers.add_parser('budget', help='Presupuestos mensuales por categoría')
+    budget_actions = budget_parser.add_subparsers(dest='action', required=True)
+    budget_set_parser = budget_actions.add_parser('set', help='Fijar el límite mensual de una categoría')
+    budget_set_parser.add_argument('--category', required=True, help='Categoría')
+    budget_set_parser.add_argument('--amount', required=True, help='Límite por mes')
+    budget_list_parser = budget_actions.add_parser('list', help='Gastado frente al límite en un mes')
+    budget_list_parser.add_argument('--month', type=int, choices=range(1, 13), metavar='{1-12}',
+                                    help='Mes (por defecto el actual)')
+    budget_list_parser.add_argument('--year', type=int, help='Año (por defecto el actual)')
+    budget_delete_parser = budget_actions.add_parser('delete', help='Quitar el límite de una categoría')
+    budget_delete_parser.add_argument('--category', required=True, help='Categoría')
+
+    # Comando split
+    split_parser = subparsers.add_parser('split', help='Repartir un registro JSON en un archivo por mes '
+                                                       f'(backend {ShardedStorage.name})')
+    split_parser.add_argument('--source', default=DATA_FILE, help=f'Registro a repartir (por defecto {DATA_FILE})')
+    split_parser.add_argument('--force', action='store_true', help='Reemplazar los meses que ya existan')
+
+    # Comando serve
+    subparsers.add_parser('serve', help='Mantener el registro en memoria y atender los comandos por un socket')
 
     args = parser.parse_args()
 
-    try:
-        if args.command == 'add':
-            add_expense(args.description, args.amount, args.category)
-        elif args.command == 'list':
-            list_expenses()
-        elif args.command == 'delete':
-            delete_expense(args.id)
-        elif args.command == 'update':
-            update_expense(args.id, args.description, args.amount, args.category)
-        elif args.command == 'summary':
-            show_summary(args.month)
-        elif args.command == 'export':
-            export_to_csv()
-    except Exception as e:
-        print(f"Error: {e}")
+    # Con --timings/--profile se mide este proceso, así que no se delega
+    if args.command not in ('serve', 'split') and not (args.no_daemon or args.timings or args.profile):
+        try:
+            if forward_command(args):
+                return
+        except Exception as e:
+            print(f"Error: {e}")
+            return
+
+    TIMINGS.enabled = args.timings
+    profiler = profiled(args.profile) if args.profile else contextlib.nullcontext()
+
+    global storage
+    with profiler:
+        # split abre su destino sin importar expenses.json: el backend elegido no interviene
+        if args.command != 'split':
+            with TIMINGS.phase('load'):
+                storage = get_storage(args.backend)
+        run_command(args)
+
+    if args.timings:
+        print(TIMINGS.report(), file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,64 @@
+import math
+import re
+from typing import Any
+
+# Decimales de la unidad menor (2 = centavos). Los montos se guardan y se suman
+# como enteros en esa unidad; cambiarlo exige convertir los datos guardados.
+MINOR_DIGITS = 2
+SCALE = 10 ** MINOR_DIGITS
+
+# Signo, parte entera y decimales; se acepta punto o coma como separador decimal
+_AMOUNT_RE = re.compile(r'\s*([+-]?)(\d*)(?:[.,](\d*))?\s*$')
+
+
+def parse_amount(value: Any) -> int:
+    """Monto escrito por el usuario o importado -> entero en la unidad menor.
+
+    Sin pasar por float: "0.1" son exactamente 10 centavos. Más decimales de
+    los que admite la unidad menor son un error (salvo ceros a la derecha).
+    """
+    if isinstance(value, bool):
+        raise ValueError("El monto debe ser un número válido")
+    if isinstance(value, int):
+        return value * SCALE
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise ValueError("El monto debe ser un número válido")
+        # repr da el decimal más corto que representa al float (12.5 -> '12.5')
+        value = repr(value)
+
+    match = _AMOUNT_RE.match(str(value)) if value is not None else None
+    if match is None or not (match.group(2) or match.group(3)):
+        raise ValueError("El monto debe ser un número válido")
+    sign, whole, fraction = match.groups()
+    fraction = fraction or ''
+    if len(fraction) > MINOR_DIGITS:
+        if fraction[MINOR_DIGITS:].strip('0'):
+            raise ValueError(f"El monto admite como mucho {MINOR_DIGITS} decimales")
+        fraction = fraction[:MINOR_DIGITS]
+
+    minor = int(whole or '0') * SCALE + int(fraction.ljust(MINOR_DIGITS, '0') or '0')
+    return -minor if sign == '-' else minor
+
+
+def format_amount(minor: int) -> str:
+    """Entero en la unidad menor -> texto con todos sus decimales (1250 -> '12.50')"""
+    sign = '-' if minor < 0 else ''
+    whole, fraction = divmod(abs(minor), SCALE)
+    return f"{sign}{whole}.{fraction:0{MINOR_DIGITS}d}" if MINOR_DIGITS else f"{sign}{whole}"
+
+
+def to_number(minor: int) -> float:
+    """Monto como número para formatos externos (JSON); exacto hasta 2**53 unidades"""
+    return minor / SCALE
+
+
+def from_legacy(expense: dict) -> dict:
+    """Gasto con el formato anterior (``amount`` en float) -> ``cents`` entero"""
+    if 'cents' in expense or 'amount' not in expense:
+        return expense
+    # Mismo orden de campos; el float se redondea a la unidad menor más cercana
+    return {
+        ('cents' if key == 'amount' else key): (round(value * SCALE) if key == 'amount' else value)
+        for key, value in expense.items()
+    }
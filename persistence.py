@@ -0,0 +1,237 @@
+import queue
+import threading
+import time
+from typing import List, Dict, Any, Callable, Optional
+
+from instrumentation import Timings
+
+# Espera tras el primer cambio para agrupar los que lleguen seguidos
+COALESCE_DELAY = 0.25
+
+# Cada cuánto el hilo de Tk recoge los avisos del hilo de escritura
+POLL_MS = 100
+
+# Cada cuánto, sin cambios propios, se revisa si otro proceso escribió
+WATCH_INTERVAL = 1.0
+
+_STOP = object()
+
+# Aviso al hilo de escritura: se tomó un bloque de ids y hay que reservar otro
+_REFILL = object()
+
+
+def op_id(op: Dict[str, Any]) -> Any:
+    return op['id'] if op['op'] == 'delete' else op['expense']['id']
+
+
+def coalesce_ops(ops: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Reducir un lote a una operación por id conservando el estado final.
+
+    add + update -> add final; update + update -> update final con el
+    ``previous`` original; add + delete -> nada; update + delete -> delete
+    con el ``previous`` original.
+    """
+    merged: Dict[Any, Dict[str, Any]] = {}
+    for op in ops:
+        expense_id = op_id(op)
+        pending = merged.get(expense_id)
+        if pending is None:
+            merged[expense_id] = dict(op)
+        elif op['op'] == 'delete':
+            if pending['op'] == 'add':
+                del merged[expense_id]
+            else:
+                merged[expense_id] = {'op': 'delete', 'id': expense_id, 'previous': pending.get('previous')}
+        elif pending['op'] == 'delete':
+            # Reaparece un id borrado en el mismo lote: se guarda tal cual
+            merged[expense_id] = {'op': 'update', 'expense': op['expense'], 'previous': pending.get('previous')}
+        else:
+            pending['expense'] = op['expense']
+    return list(merged.values())
+
+
+class PersistenceWorker:
+    """Hilo de escritura diferida para que la GUI nunca espere al disco.
+
+    La GUI encola operaciones (formato de ``Storage.apply``) y sigue; el hilo
+    agrupa las que llegan dentro de ``COALESCE_DELAY`` y las guarda en una sola
+    escritura. El hilo nunca llama a Tk: deja los avisos de guardado o error en
+    una cola que el hilo de Tk vacía con ``root.after``. ``close`` garantiza el
+    volcado final al cerrar la ventana.
+
+    También vigila a los demás procesos: antes de cada escritura (bajo el
+    candado del almacenamiento) y cada ``WATCH_INTERVAL`` sin actividad pide
+    los cambios desde ``version``. ``on_external`` recibe las operaciones
+    ajenas y ``on_reload`` el registro completo cuando no se pueden leer
+    solo los cambios.
+
+    Con ``id_block`` mantiene además un bloque de ids ya reservado para
+    ``reserve_ids``, de modo que agregar gastos no toca el candado ni el disco.
+    """
+
+    def __init__(self, root, storage, on_saved: Optional[Callable[[int], None]] = None,
+                 on_error: Optional[Callable[[Exception], None]] = None, delay: float = COALESCE_DELAY,
+                 timings: Optional[Timings] = None, version: Any = None,
+                 on_external: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                 on_reload: Optional[Callable[[List[Dict[str, Any]]], None]] = None, id_block: int = 0):
+        self.root = root
+        self.storage = storage
+        self.on_saved = on_saved
+        self.on_error = on_error
+        self.on_external = on_external
+        self.on_reload = on_reload
+        self.delay = delay
+        self.timings = timings or Timings()
+        self.version = storage.version() if version is None else version
+        self.queue: "queue.Queue" = queue.Queue()
+        self.events: "queue.Queue" = queue.Queue()
+        self.failed: List[Dict[str, Any]] = []
+        # Cambios encolados o en escritura por id, para no pisarlos con los ajenos
+        self.unsaved: Dict[Any, int] = {}
+        self.unsaved_lock = threading.Lock()
+        # Primer id de cada bloque de ``id_block`` ids reservado por adelantado
+        self.id_block = id_block
+        self.id_blocks: "queue.Queue" = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="persistence", daemon=True)
+        self.thread.start()
+        self.root.after(POLL_MS, self._poll)
+
+    def submit(self, *ops: Dict[str, Any]) -> None:
+        with self.unsaved_lock:
+            for op in ops:
+                expense_id = op_id(op)
+                self.unsaved[expense_id] = self.unsaved.get(expense_id, 0) + 1
+        for op in ops:
+            self.queue.put(op)
+
+    def pending(self) -> bool:
+        return not self.queue.empty() or bool(self.failed)
+
+    def reserve_ids(self, count: int) -> int:
+        """``Storage.reserve_ids`` para el hilo de Tk (el ``reserve`` del ``Ledger``).
+
+        Entrega el bloque ya reservado y pide otro al hilo de escritura; solo
+        reserva en el momento si todavía no llegó o si ``count`` no cabe en un bloque.
+        """
+        if count <= self.id_block:
+            try:
+                start = self.id_blocks.get_nowait()
+            except queue.Empty:
+                pass
+            else:
+                self.queue.put(_REFILL)
+                return start
+        return self.storage.reserve_ids(count)
+
+    def unsaved_ids(self) -> set:
+        with self.unsaved_lock:
+            return set(self.unsaved)
+
+    def _saved(self, ops: List[Dict[str, Any]]) -> None:
+        with self.unsaved_lock:
+            for op in ops:
+                expense_id = op_id(op)
+                self.unsaved[expense_id] -= 1
+                if not self.unsaved[expense_id]:
+                    del self.unsaved[expense_id]
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """Volcar lo pendiente y terminar el hilo; False si quedó algo sin guardar"""
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
+        self.dispatch()
+        return not self.thread.is_alive() and not self.failed
+
+    def dispatch(self) -> None:
+        """Ejecutar en el hilo de Tk los avisos pendientes del hilo de escritura"""
+        while True:
+            try:
+                callback, args = self.events.get_nowait()
+            except queue.Empty:
+                return
+            callback(*args)
+
+    def _poll(self) -> None:
+        self.dispatch()
+        if self.thread.is_alive():
+            self.root.after(POLL_MS, self._poll)
+
+    def _collect(self) -> List[Any]:
+        try:
+            batch = [self.queue.get(timeout=WATCH_INTERVAL)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.delay
+        while batch[-1] is not _STOP:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        self._refill_ids()
+        while True:
+            batch = self._collect()
+            self._refill_ids()
+            if not batch:
+                self._watch()
+                continue
+            stop = batch[-1] is _STOP
+            # Lo que falló antes se reintenta junto con el lote nuevo
+            raw = self.failed + [op for op in batch if op is not _STOP and op is not _REFILL]
+            self.failed = []
+            ops = coalesce_ops(raw)
+            if not ops:
+                # El lote se anuló (por ejemplo, agregar y borrar el mismo gasto) o solo pedía ids
+                if raw:
+                    self._notify(self._saved, raw)
+            else:
+                try:
+                    # Lo ajeno se lee bajo el mismo candado que la escritura: nada queda en medio
+                    with self.storage.locked():
+                        self._check_changes()
+                        with self.timings.phase('save'):
+                            self.storage.apply(ops)
+                        self.version = self.storage.version()
+                except Exception as e:
+                    # Pudo quedar escrito en parte: sin previous, el reintento relee el estado guardado
+                    self.failed = [{key: value for key, value in op.items() if key != 'previous'} for op in raw]
+                    self._notify(self.on_error, e)
+                else:
+                    # Por la cola de avisos, después de un posible on_reload: el registro releído
+                    # antes de esta escritura no la incluye, y sus ids deben seguir contando como locales
+                    self._notify(self._saved, raw)
+                    self._notify(self.on_saved, len(ops))
+            if stop:
+                return
+
+    def _refill_ids(self) -> None:
+        if not self.id_block or not self.id_blocks.empty():
+            return
+        try:
+            self.id_blocks.put(self.storage.reserve_ids(self.id_block))
+        except Exception:
+            # Se reintenta en la próxima vuelta; mientras tanto reserve_ids reserva en el momento
+            pass
+
+    def _watch(self) -> None:
+        try:
+            self._check_changes()
+        except Exception:
+            # Sin cambios propios no hay nada que perder: se reintenta en la próxima vuelta
+            pass
+
+    def _check_changes(self) -> None:
+        changes, self.version = self.storage.changes_since(self.version)
+        if changes is None:
+            self._notify(self.on_reload, self.storage.load())
+        elif changes:
+            self._notify(self.on_external, changes)
+
+    def _notify(self, callback, *args) -> None:
+        if callback is not None:
+            self.events.put((callback, args))
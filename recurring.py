@@ -0,0 +1,221 @@
+import calendar
+import contextlib
+import functools
+import heapq
+import json
+import os
+from datetime import date, timedelta
+from operator import itemgetter
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple
+
+from budgets import Alert, BudgetMonitor
+from locking import FileLock
+from storage import DATA_FILE, LOCK_SUFFIX, atomic_write_json
+from validation import validate_date
+
+RULES_SUFFIX = ".rules.json"
+
+EVERY = ('week', 'month', 'year')
+
+
+# Muchas reglas comparten fecha de inicio y cada una se consulta en cada ocurrencia
+_parse_date = functools.lru_cache(maxsize=4096)(date.fromisoformat)
+
+
+def occurrence(start: str, every: str, n: int) -> str:
+    """Fecha de la ocurrencia ``n`` (desde 0) de una regla.
+
+    Se calcula siempre desde ``start``: una regla del 31 cae el 28 o 29 en
+    febrero y vuelve al 31 en marzo.
+    """
+    first = _parse_date(start)
+    if every == 'week':
+        return (first + timedelta(weeks=n)).isoformat()
+    months = first.month - 1 + n * (12 if every == 'year' else 1)
+    year, month = first.year + months // 12, months % 12 + 1
+    return date(year, month, min(first.day, calendar.monthrange(year, month)[1])).isoformat()
+
+
+def advance(rule: Dict[str, Any]) -> None:
+    """Pasar a la ocurrencia siguiente; ``next`` queda en None cuando la regla terminó"""
+    rule['done'] += 1
+    upcoming = occurrence(rule['start'], rule['every'], rule['done'])
+    rule['next'] = upcoming if rule['until'] is None or upcoming <= rule['until'] else None
+
+
+class Scheduler:
+    """Reglas ordenadas por su próxima fecha en un heap.
+
+    Saber si vence algo es mirar el primero, y materializar solo toca las
+    reglas vencidas (una vez cada una, aunque estén años atrasadas), no las
+    que están al día. Las reglas (dicts) se avanzan en su lugar.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = {rule['id']: rule for rule in rules}
+        self.heap = [(rule['next'], rule['id']) for rule in rules if rule['next'] is not None]
+        heapq.heapify(self.heap)
+
+    def next_due(self) -> Optional[str]:
+        return self.heap[0][0] if self.heap else None
+
+    def due(self, today: str) -> List[Dict[str, Any]]:
+        """Gastos (sin id) de todas las ocurrencias hasta ``today`` inclusive, en orden de fecha"""
+        expenses = []
+        while self.heap and self.heap[0][0] <= today:
+            _, rule_id = heapq.heappop(self.heap)
+            rule = self.rules[rule_id]
+            # Todas las ocurrencias atrasadas de la regla de una vez: el heap se toca una vez por regla
+            while rule['next'] is not None and rule['next'] <= today:
+                expenses.append({
+                    'date': rule['next'],
+                    'description': rule['description'],
+                    'cents': rule['cents'],
+                    'category': rule['category'],
+                })
+                advance(rule)
+            if rule['next'] is not None:
+                heapq.heappush(self.heap, (rule['next'], rule_id))
+        expenses.sort(key=itemgetter('date'))
+        return expenses
+
+
+class RuleStore:
+    """Reglas recurrentes y presupuestos mensuales de un registro (``expenses.rules.json``).
+
+    Es independiente del backend: las ocurrencias se guardan como gastos
+    normales. ``exceeded`` recuerda qué celdas (año, mes, categoría) ya
+    avisaron que pasaron su presupuesto, para que cada comando del CLI no
+    repita el aviso. ``pending`` es el lote que se está escribiendo; si el proceso
+    se interrumpe a mitad, la próxima apertura lo vuelve a escribir entero (un
+    add de un id ya guardado lo reemplaza, así que no se duplica).
+    """
+
+    def __init__(self, path: str = DATA_FILE):
+        self.path = os.path.splitext(path)[0] + RULES_SUFFIX
+        self.file_lock = FileLock(self.path + LOCK_SUFFIX)
+
+    @contextlib.contextmanager
+    def locked(self):
+        with self.file_lock:
+            yield
+
+    def load(self) -> Dict[str, Any]:
+        data = {'next_id': 1, 'next_due': None, 'rules': [], 'budgets': {}, 'pending': [], 'exceeded': []}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                data.update(json.load(f))
+        return data
+
+    def save(self, data: Dict[str, Any]) -> None:
+        atomic_write_json(self.path, data)
+
+    def rules(self) -> List[Dict[str, Any]]:
+        return self.load()['rules']
+
+    def budgets(self) -> Dict[str, int]:
+        return self.load()['budgets']
+
+    def add_rule(self, description: str, cents: int, category: str, every: str, start: Optional[str] = None,
+                 until: Optional[str] = None) -> Dict[str, Any]:
+        if every not in EVERY:
+            raise ValueError(f"Frecuencia desconocida: {every}")
+        start = validate_date(start)
+        until = validate_date(until) if until else None
+        if until is not None and until < start:
+            raise ValueError("La fecha final es anterior a la de inicio")
+        with self.locked():
+            data = self.load()
+            rule = {
+                'id': data['next_id'],
+                'description': description,
+                'cents': cents,
+                'category': category,
+                'every': every,
+                'start': start,
+                'until': until,
+                'done': 0,
+                'next': start,
+            }
+            data['rules'].append(rule)
+            data['next_id'] += 1
+            data['next_due'] = start if data['next_due'] is None else min(data['next_due'], start)
+            self.save(data)
+        return rule
+
+    def delete_rule(self, rule_id: int) -> Optional[Dict[str, Any]]:
+        with self.locked():
+            data = self.load()
+            rule = next((rule for rule in data['rules'] if rule['id'] == rule_id), None)
+            if rule is not None:
+                data['rules'].remove(rule)
+                data['next_due'] = min((other['next'] for other in data['rules'] if other['next']), default=None)
+                self.save(data)
+        return rule
+
+    def set_budget(self, category: str, cents: Optional[int]) -> bool:
+        """Fijar (o con None quitar) el límite mensual de una categoría; False si no había qué quitar"""
+        with self.locked():
+            data = self.load()
+            if cents is None:
+                if data['budgets'].pop(category, None) is None:
+                    return False
+            else:
+                data['budgets'][category] = cents
+            # Con otro límite la categoría vuelve a avisar desde cero
+            data['exceeded'] = [cell for cell in data['exceeded'] if cell[2] != category]
+            self.save(data)
+        return True
+
+    def exceeded(self) -> Set[Tuple[int, int, str]]:
+        return {tuple(cell) for cell in self.load()['exceeded']}
+
+    def check_budgets(self, rollup, ops: Iterable[Dict[str, Any]]) -> List[Alert]:
+        """``BudgetMonitor.check`` con las celdas que ya avisaron guardadas entre procesos"""
+        with self.locked():
+            data = self.load()
+            if not data['budgets']:
+                return []
+            monitor = BudgetMonitor(data['budgets'], {tuple(cell) for cell in data['exceeded']})
+            alerts = monitor.check(rollup, ops)
+            exceeded = sorted(list(cell) for cell in monitor.exceeded)
+            # Solo se reescribe cuando una celda pasa o vuelve bajo su límite
+            if exceeded != sorted(data['exceeded']):
+                data['exceeded'] = exceeded
+                self.save(data)
+        return alerts
+
+
+def materialize_due(storage, store: RuleStore, today: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Guardar en una sola escritura todas las ocurrencias vencidas y devolverlas.
+
+    Sin nada vencido solo se lee el archivo de reglas: ``next_due`` (la fecha
+    más próxima de todas) responde sin mirar cada regla.
+    """
+    today = today or date.today().isoformat()
+    data = store.load()
+    if not data['pending'] and (data['next_due'] is None or data['next_due'] > today):
+        return []
+
+    # Siempre el registro primero y después las reglas: nadie toma los candados al revés
+    with storage.locked(), store.locked():
+        data = store.load()
+        expenses = data['pending']
+        if not expenses:
+            scheduler = Scheduler(data['rules'])
+            due = scheduler.due(today)
+            data['next_due'] = scheduler.next_due()
+            if due:
+                start = storage.reserve_ids(len(due))
+                expenses = [dict(id=start + offset, **expense) for offset, expense in enumerate(due)]
+                # Primero se anota el lote: una caída antes de terminar no pierde ni repite ocurrencias
+                data['pending'] = expenses
+            store.save(data)
+            if not expenses:
+                return []
+        # Retomar un lote interrumpido lo vuelve a escribir entero: un add de un id que ya
+        # llegó al registro lo reemplaza, así que no se duplica ni se cuenta dos veces
+        storage.add_many(expenses)
+        data['pending'] = []
+        store.save(data)
+    return expenses
@@ -0,0 +1,224 @@
+from datetime import date, timedelta
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Callable, Tuple
+
+PERIODS = ('week', 'month', 'year')
+
+# Periodos que entran en el promedio móvil (el actual y los anteriores)
+DEFAULT_WINDOW = 3
+
+# Reportes recordados por versión del registro
+REPORT_CACHE_SIZE = 32
+
+# (año, número de semana ISO o de mes; 0 para el año)
+PeriodKey = Tuple[int, int]
+DailyTotal = Tuple[str, str, int, int]
+
+
+def daily_totals(expenses: Iterable[Dict[str, Any]]) -> Iterator[DailyTotal]:
+    """(fecha, categoría, total en centavos, conteo) en una sola pasada por los gastos"""
+    cells: Dict[Tuple[str, str], List[int]] = {}
+    for expense in expenses:
+        key = (expense['date'], expense['category'])
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = [expense['cents'], 1]
+        else:
+            cell[0] += expense['cents']
+            cell[1] += 1
+    return ((day, category, total, count) for (day, category), (total, count) in cells.items())
+
+
+def period_of(day: str, period: str) -> PeriodKey:
+    if period == 'month':
+        return int(day[:4]), int(day[5:7])
+    if period == 'year':
+        return int(day[:4]), 0
+    iso = date.fromisoformat(day).isocalendar()
+    return iso[0], iso[1]
+
+
+def next_period(key: PeriodKey, period: str) -> PeriodKey:
+    year, number = key
+    if period == 'year':
+        return year + 1, 0
+    if period == 'month':
+        return (year + 1, 1) if number == 12 else (year, number + 1)
+    iso = (date.fromisocalendar(year, number, 1) + timedelta(days=7)).isocalendar()
+    return iso[0], iso[1]
+
+
+def period_label(key: PeriodKey, period: str) -> str:
+    year, number = key
+    if period == 'year':
+        return str(year)
+    return f"{year}-{number:02d}" if period == 'month' else f"{year}-S{number:02d}"
+
+
+class ReportRow:
+    """Un periodo de la serie; los montos van en centavos"""
+
+    __slots__ = ('key', 'label', 'total', 'count', 'average', 'previous', 'categories')
+
+    def __init__(self, key: PeriodKey, label: str, total: int, count: int, average: int,
+                 previous: Optional[int], categories: Dict[str, int]):
+        self.key = key
+        self.label = label
+        self.total = total
+        self.count = count
+        self.average = average
+        self.previous = previous
+        self.categories = categories
+
+    @property
+    def change(self) -> Optional[float]:
+        """Variación porcentual frente al mismo periodo del año anterior"""
+        if not self.previous:
+            return None
+        return (self.total - self.previous) * 100 / self.previous
+
+
+class Report:
+    """Serie temporal por periodo (los huecos van en cero) y totales por categoría"""
+
+    def __init__(self, period: str, window: int):
+        self.period = period
+        self.window = window
+        self.rows: List[ReportRow] = []
+        # (categoría, total, conteo), de mayor a menor total
+        self.categories: List[Tuple[str, int, int]] = []
+
+    @property
+    def total(self) -> int:
+        return sum(row.total for row in self.rows)
+
+    @property
+    def count(self) -> int:
+        return sum(row.count for row in self.rows)
+
+
+class ReportEngine:
+    """Reportes semanales, mensuales y anuales con caché por versión del registro.
+
+    La base son los totales por (fecha, categoría): hay muchas menos fechas
+    que gastos, así que cada reporte se arma sin volver a recorrer el
+    registro. Se leen de ``source`` (una pasada, o un GROUP BY en SQLite) la
+    primera vez y de nuevo cuando cambia ``version()``; quien mantiene el
+    registro en memoria puede actualizarlos con ``add``/``remove``.
+    """
+
+    def __init__(self, source: Callable[[], Iterable[DailyTotal]], version: Callable[[], Any]):
+        self.source = source
+        self.version = version
+        self.cells: Optional[Dict[Tuple[str, str], List[int]]] = None
+        self._version = None
+        self._reports: Dict[Tuple[Any, ...], Report] = {}
+        # fecha -> periodo, por tipo de periodo; no depende de los datos
+        self._periods: Dict[str, Dict[str, PeriodKey]] = {period: {} for period in PERIODS}
+
+    def _sync(self) -> None:
+        version = self.version()
+        if self.cells is not None and version == self._version:
+            return
+        cells = {}
+        for day, category, total, count in self.source():
+            cells[(day, category)] = [total, count]
+        self.cells = cells
+        self._version = version
+        self._reports.clear()
+
+    def _apply(self, expense: Dict[str, Any], sign: int) -> None:
+        if self.cells is None:
+            return
+        key = (expense['date'], expense['category'])
+        cell = self.cells.setdefault(key, [0, 0])
+        cell[0] += sign * expense['cents']
+        cell[1] += sign
+        if cell[1] <= 0:
+            del self.cells[key]
+        self._version = self.version()
+        self._reports.clear()
+
+    def add(self, expense: Dict[str, Any]) -> None:
+        self._apply(expense, 1)
+
+    def remove(self, expense: Dict[str, Any]) -> None:
+        self._apply(expense, -1)
+
+    def replace(self, previous: Dict[str, Any], expense: Dict[str, Any]) -> None:
+        self.remove(previous)
+        self.add(expense)
+
+    def is_cached(self, period: str = 'month', date_from: Optional[str] = None, date_to: Optional[str] = None,
+                  category: Optional[str] = None, window: int = DEFAULT_WINDOW) -> bool:
+        return self.cells is not None and self._version == self.version() and \
+            (period, date_from, date_to, category, window) in self._reports
+
+    def report(self, period: str = 'month', date_from: Optional[str] = None, date_to: Optional[str] = None,
+               category: Optional[str] = None, window: int = DEFAULT_WINDOW) -> Report:
+        """Serie de ``period`` entre dos fechas (AAAA-MM-DD, incluidas), opcionalmente de una categoría"""
+        if period not in PERIODS:
+            raise ValueError(f"Periodo desconocido: {period}")
+        if window < 1:
+            raise ValueError("El promedio móvil necesita al menos un periodo")
+        self._sync()
+        key = (period, date_from, date_to, category, window)
+        report = self._reports.get(key)
+        if report is None:
+            if len(self._reports) >= REPORT_CACHE_SIZE:
+                self._reports.clear()
+            report = self._reports[key] = self._build(period, date_from, date_to, category, window)
+        return report
+
+    def _build(self, period: str, date_from: Optional[str], date_to: Optional[str],
+               category: Optional[str], window: int) -> Report:
+        periods = self._periods[period]
+        # Todo el historial de la categoría, para comparar con el año anterior fuera del rango
+        history: Dict[PeriodKey, int] = {}
+        totals: Dict[PeriodKey, List[int]] = {}
+        by_category: Dict[PeriodKey, Dict[str, int]] = {}
+        category_totals: Dict[str, List[int]] = {}
+        for (day, cell_category), (total, count) in self.cells.items():
+            if category is not None and cell_category != category:
+                continue
+            key = periods.get(day)
+            if key is None:
+                key = periods[day] = period_of(day, period)
+            history[key] = history.get(key, 0) + total
+            if (date_from and day < date_from) or (date_to and day > date_to):
+                continue
+            entry = totals.setdefault(key, [0, 0])
+            entry[0] += total
+            entry[1] += count
+            breakdown = by_category.setdefault(key, {})
+            breakdown[cell_category] = breakdown.get(cell_category, 0) + total
+            entry = category_totals.setdefault(cell_category, [0, 0])
+            entry[0] += total
+            entry[1] += count
+
+        report = Report(period, window)
+        report.categories = sorted(((name, total, count) for name, (total, count) in category_totals.items()),
+                                   key=lambda row: (-row[1], row[0]))
+        if not totals:
+            return report
+
+        # Serie continua del primer al último periodo con gastos
+        key, last = min(totals), max(totals)
+        first_recorded = min(history)
+        recent: List[int] = []
+        while key <= last:
+            total, count = totals.get(key, (0, 0))
+            recent.append(total)
+            if len(recent) > window:
+                recent.pop(0)
+            # Sin datos tan atrás (o un año sin semana 53) no hay con qué comparar
+            previous_key = (key[0] - 1, key[1])
+            if previous_key < first_recorded or (period == 'week' and key[1] == 53 and
+                                                 date(previous_key[0], 12, 28).isocalendar()[1] != 53):
+                previous = None
+            else:
+                previous = history.get(previous_key, 0)
+            report.rows.append(ReportRow(key, period_label(key, period), total, count,
+                                         round(sum(recent) / len(recent)), previous,
+                                         by_category.get(key, {})))
+            key = next_period(key, period)
+        return report
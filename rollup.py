@@ -0,0 +1,175 @@
+import bisect
+import itertools
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+Key = Tuple[Optional[int], Optional[int], Optional[str]]
+
+
+def expense_cell(expense: Dict[str, Any]) -> Tuple[int, int, str]:
+    """(año, mes, categoría) de un gasto, sin pasar por strptime"""
+    date = expense['date']
+    return int(date[:4]), int(date[5:7]), expense['category']
+
+
+class RollupIndex:
+    """Totales y conteos por (año, mes, categoría), mantenidos incrementalmente.
+
+    Cada gasto actualiza también las combinaciones con comodín (``None``) de
+    esas tres claves, así que cualquier consulta de ``total``/``count`` es una
+    única búsqueda en un diccionario. Los totales son enteros en centavos:
+    exactos sin importar cuántos gastos se sumen o resten.
+    """
+
+    def __init__(self):
+        self.cells: Dict[Key, List[int]] = {}
+        self.years = set()
+        self.categories = set()
+
+    @classmethod
+    def from_expenses(cls, expenses: Iterable[Dict[str, Any]]) -> 'RollupIndex':
+        index = cls()
+        for expense in expenses:
+            index.add(expense)
+        return index
+
+    @classmethod
+    def from_cells(cls, cells: Iterable[Tuple[int, int, str, int, int]]) -> 'RollupIndex':
+        index = cls()
+        for year, month, category, total, count in cells:
+            index._apply((year, month, category), total, count)
+        return index
+
+    @staticmethod
+    def _keys(cell: Tuple[int, int, str]) -> Iterable[Key]:
+        return itertools.product(*((value, None) for value in cell))
+
+    def _apply(self, cell: Tuple[int, int, str], cents: int, count: int) -> None:
+        for key in self._keys(cell):
+            entry = self.cells.setdefault(key, [0, 0])
+            entry[0] += cents
+            entry[1] += count
+            if entry[1] <= 0:
+                del self.cells[key]
+        self.years.add(cell[0])
+        self.categories.add(cell[2])
+
+    def add(self, expense: Dict[str, Any]) -> None:
+        self._apply(expense_cell(expense), expense['cents'], 1)
+
+    def remove(self, expense: Dict[str, Any]) -> None:
+        self._apply(expense_cell(expense), -expense['cents'], -1)
+
+    def replace(self, previous: Dict[str, Any], expense: Dict[str, Any]) -> None:
+        self.remove(previous)
+        self.add(expense)
+
+    def total(self, year: Optional[int] = None, month: Optional[int] = None,
+              category: Optional[str] = None) -> int:
+        """Total en centavos"""
+        entry = self.cells.get((year, month, category))
+        return entry[0] if entry else 0
+
+    def count(self, year: Optional[int] = None, month: Optional[int] = None,
+              category: Optional[str] = None) -> int:
+        entry = self.cells.get((year, month, category))
+        return entry[1] if entry else 0
+
+    def breakdown(self, by: str, year: Optional[int] = None, month: Optional[int] = None,
+                  category: Optional[str] = None) -> List[Tuple[Any, int, int]]:
+        """Filas (clave, total en centavos, conteo) agrupadas por 'year', 'month' o 'category'"""
+        if by == 'year':
+            keys = [(value, month, category) for value in sorted(self.years)]
+        elif by == 'month':
+            keys = [(year, value, category) for value in range(1, 13)]
+        elif by == 'category':
+            keys = [(year, month, value) for value in sorted(self.categories)]
+        else:
+            raise ValueError(f"Agrupación desconocida: {by}")
+
+        position = ('year', 'month', 'category').index(by)
+        rows = []
+        for key in keys:
+            entry = self.cells.get(key)
+            if entry:
+                rows.append((key[position], entry[0], entry[1]))
+        return rows
+
+    def to_cells(self) -> List[List[Any]]:
+        return [
+            [year, month, category, total, count]
+            for (year, month, category), (total, count) in self.cells.items()
+            if None not in (year, month, category)
+        ]
+
+
+class IdRanges:
+    """Ids presentes en el registro, como rangos consecutivos ``[primero, último]``.
+
+    Un registro numerado por una secuencia tiene pocos huecos (borrados, ids
+    reservados que no se usaron), así que ocupa poco en el índice guardado y
+    responde si un id existe con una búsqueda binaria, sin leer los gastos.
+    """
+
+    def __init__(self, ranges: Iterable[Tuple[int, int]] = ()):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        for start, end in ranges:
+            self.starts.append(start)
+            self.ends.append(end)
+
+    @classmethod
+    def from_ids(cls, ids: Iterable[int]) -> 'IdRanges':
+        ranges: List[List[int]] = []
+        for expense_id in sorted(ids):
+            if ranges and expense_id <= ranges[-1][1] + 1:
+                ranges[-1][1] = max(ranges[-1][1], expense_id)
+            else:
+                ranges.append([expense_id, expense_id])
+        return cls(ranges)
+
+    def _find(self, expense_id: int) -> int:
+        """Posición del último rango que empieza en ``expense_id`` o antes (-1 si no hay)"""
+        return bisect.bisect_right(self.starts, expense_id) - 1
+
+    def __contains__(self, expense_id: int) -> bool:
+        index = self._find(expense_id)
+        return index >= 0 and expense_id <= self.ends[index]
+
+    def __len__(self) -> int:
+        return sum(end - start + 1 for start, end in zip(self.starts, self.ends))
+
+    def add(self, expense_id: int) -> None:
+        index = self._find(expense_id)
+        if index >= 0 and expense_id <= self.ends[index]:
+            return
+        joins_left = index >= 0 and self.ends[index] == expense_id - 1
+        joins_right = index + 1 < len(self.starts) and self.starts[index + 1] == expense_id + 1
+        if joins_left and joins_right:
+            self.ends[index] = self.ends[index + 1]
+            del self.starts[index + 1], self.ends[index + 1]
+        elif joins_left:
+            self.ends[index] = expense_id
+        elif joins_right:
+            self.starts[index + 1] = expense_id
+        else:
+            self.starts.insert(index + 1, expense_id)
+            self.ends.insert(index + 1, expense_id)
+
+    def remove(self, expense_id: int) -> None:
+        index = self._find(expense_id)
+        if index < 0 or expense_id > self.ends[index]:
+            return
+        start, end = self.starts[index], self.ends[index]
+        if start == end:
+            del self.starts[index], self.ends[index]
+        elif expense_id == start:
+            self.starts[index] += 1
+        elif expense_id == end:
+            self.ends[index] -= 1
+        else:
+            self.ends[index] = expense_id - 1
+            self.starts.insert(index + 1, expense_id + 1)
+            self.ends.insert(index + 1, end)
+
+    def to_list(self) -> List[List[int]]:
+        return [[start, end] for start, end in zip(self.starts, self.ends)]
@@ -0,0 +1,228 @@
+import bisect
+import re
+import unicodedata
+from operator import itemgetter
+from typing import List, Dict, Any, Optional, Iterable, Set, Tuple
+
+from validation import validate_date
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Si los candidatos superan esta fracción del registro, se recorre la lista en orden
+SCAN_FRACTION = 0.25
+
+# Palabras recordadas con los tokens que las contienen (búsqueda al teclear)
+MATCH_CACHE_SIZE = 256
+
+
+def normalize(text: str) -> str:
+    """Minúsculas y sin tildes, para que 'cafe' encuentre 'Café'"""
+    text = text.lower()
+    if text.isascii():
+        return text
+    return ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(normalize(text))
+
+
+class SearchQuery:
+    """Criterios de búsqueda; los que quedan en None no filtran.
+
+    El texto se parte en palabras y cada una debe aparecer (como subcadena,
+    sin distinguir mayúsculas ni tildes) en la descripción. Las fechas son
+    AAAA-MM-DD, los montos van en centavos y los rangos incluyen ambos extremos.
+    """
+
+    def __init__(self, text: Optional[str] = None, category: Optional[str] = None,
+                 date_from: Optional[str] = None, date_to: Optional[str] = None,
+                 min_amount: Optional[int] = None, max_amount: Optional[int] = None):
+        self.words = tokenize(text or '')
+        self.category = category or None
+        self.date_from = validate_date(date_from) if date_from else None
+        self.date_to = validate_date(date_to) if date_to else None
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+
+    def criteria(self) -> int:
+        """Cantidad de condiciones activas (cada palabra cuenta como una)"""
+        return len(self.words) + sum((
+            self.category is not None,
+            bool(self.date_from or self.date_to),
+            self.min_amount is not None or self.max_amount is not None,
+        ))
+
+    def is_empty(self) -> bool:
+        return self.criteria() == 0
+
+    def matches(self, expense: Dict[str, Any]) -> bool:
+        if self.category is not None and expense['category'] != self.category:
+            return False
+        date = expense['date']
+        if (self.date_from and date < self.date_from) or (self.date_to and date > self.date_to):
+            return False
+        amount = expense['cents']
+        if (self.min_amount is not None and amount < self.min_amount) or \
+                (self.max_amount is not None and amount > self.max_amount):
+            return False
+        if self.words:
+            description = normalize(expense['description'])
+            return all(word in description for word in self.words)
+        return True
+
+
+class SearchIndex:
+    """Índices para filtrar el registro sin recorrerlo entero.
+
+    - ``tokens``: palabra normalizada de la descripción -> ids (índice invertido)
+    - ``categories``: categoría -> ids
+    - fechas y montos: claves ordenadas con sus ids en listas paralelas, para
+      resolver rangos con búsqueda binaria
+
+    Cada consulta parte del criterio más selectivo y verifica el resto sobre
+    esos candidatos. Se mantiene incrementalmente con ``add``/``remove``.
+    """
+
+    def __init__(self):
+        self.tokens: Dict[str, Set[int]] = {}
+        self.categories: Dict[str, Set[int]] = {}
+        self.date_keys: List[str] = []
+        self.date_ids: List[int] = []
+        self.amount_keys: List[int] = []
+        self.amount_ids: List[int] = []
+        self._matches: Dict[str, List[str]] = {}
+
+    @classmethod
+    def from_expenses(cls, expenses: List[Dict[str, Any]]) -> 'SearchIndex':
+        index = cls()
+        # Las descripciones se repiten mucho: cada texto distinto se tokeniza una sola vez
+        descriptions: Dict[str, List[int]] = {}
+        categories: Dict[str, List[int]] = {}
+        for expense in expenses:
+            descriptions.setdefault(expense['description'], []).append(expense['id'])
+            categories.setdefault(expense['category'], []).append(expense['id'])
+        for description, ids in descriptions.items():
+            for token in set(tokenize(description)):
+                index.tokens.setdefault(token, set()).update(ids)
+        index.categories = {category: set(ids) for category, ids in categories.items()}
+        index.date_keys, index.date_ids = cls._sorted_column(expenses, 'date')
+        index.amount_keys, index.amount_ids = cls._sorted_column(expenses, 'cents')
+        return index
+
+    @staticmethod
+    def _sorted_column(expenses: List[Dict[str, Any]], column: str) -> Tuple[List[Any], List[int]]:
+        # sorted es estable: a igual clave, los ids quedan en el orden de la lista
+        key = itemgetter(column)
+        ordered = sorted(expenses, key=key)
+        return list(map(key, ordered)), list(map(itemgetter('id'), ordered))
+
+    def _add_terms(self, expense: Dict[str, Any]) -> None:
+        for token in set(tokenize(expense['description'])):
+            ids = self.tokens.get(token)
+            if ids is None:
+                ids = self.tokens[token] = set()
+                # Palabra nueva en el vocabulario: las coincidencias recordadas ya no valen
+                self._matches.clear()
+            ids.add(expense['id'])
+        self.categories.setdefault(expense['category'], set()).add(expense['id'])
+
+    def _remove_terms(self, expense: Dict[str, Any]) -> None:
+        for token in set(tokenize(expense['description'])):
+            ids = self.tokens.get(token)
+            if ids is not None:
+                ids.discard(expense['id'])
+                if not ids:
+                    del self.tokens[token]
+        ids = self.categories.get(expense['category'])
+        if ids is not None:
+            ids.discard(expense['id'])
+            if not ids:
+                del self.categories[expense['category']]
+
+    @staticmethod
+    def _insert_sorted(keys: List[Any], ids: List[int], key: Any, expense_id: int) -> None:
+        position = bisect.bisect_right(keys, key)
+        keys.insert(position, key)
+        ids.insert(position, expense_id)
+
+    @staticmethod
+    def _remove_sorted(keys: List[Any], ids: List[int], key: Any, expense_id: int) -> None:
+        low, high = bisect.bisect_left(keys, key), bisect.bisect_right(keys, key)
+        position = ids.index(expense_id, low, high)
+        del keys[position]
+        del ids[position]
+
+    def add(self, expense: Dict[str, Any]) -> None:
+        self._add_terms(expense)
+        self._insert_sorted(self.date_keys, self.date_ids, expense['date'], expense['id'])
+        self._insert_sorted(self.amount_keys, self.amount_ids, expense['cents'], expense['id'])
+
+    def remove(self, expense: Dict[str, Any]) -> None:
+        self._remove_terms(expense)
+        self._remove_sorted(self.date_keys, self.date_ids, expense['date'], expense['id'])
+        self._remove_sorted(self.amount_keys, self.amount_ids, expense['cents'], expense['id'])
+
+    def replace(self, previous: Dict[str, Any], expense: Dict[str, Any]) -> None:
+        self.remove(previous)
+        self.add(expense)
+
+    def tokens_containing(self, word: str) -> List[str]:
+        """Tokens del vocabulario que contienen ``word``"""
+        matches = self._matches.get(word)
+        if matches is not None:
+            return matches
+        # Al teclear cada palabra extiende la anterior: basta revisar los tokens que ya coincidían
+        vocabulary: Iterable[str] = self.tokens
+        for length in range(len(word) - 1, 0, -1):
+            previous = self._matches.get(word[:length])
+            if previous is not None:
+                vocabulary = previous
+                break
+        matches = [token for token in vocabulary if word in token]
+        if len(self._matches) >= MATCH_CACHE_SIZE:
+            self._matches.clear()
+        self._matches[word] = matches
+        return matches
+
+    def _range(self, keys: List[Any], low: Any, high: Any) -> Tuple[int, int]:
+        start = bisect.bisect_left(keys, low) if low is not None else 0
+        end = bisect.bisect_right(keys, high) if high is not None else len(keys)
+        return start, max(start, end)
+
+    def candidates(self, query: SearchQuery) -> Optional[Iterable[int]]:
+        """Ids del criterio más selectivo de ``query``; None si no hay criterios"""
+        options = []
+        if query.category is not None:
+            ids = self.categories.get(query.category, set())
+            options.append((len(ids), lambda: ids))
+        if query.date_from or query.date_to:
+            start, end = self._range(self.date_keys, query.date_from, query.date_to)
+            options.append((end - start, lambda: self.date_ids[start:end]))
+        if query.min_amount is not None or query.max_amount is not None:
+            low, high = self._range(self.amount_keys, query.min_amount, query.max_amount)
+            options.append((high - low, lambda: self.amount_ids[low:high]))
+        for word in query.words:
+            token_ids = [self.tokens[token] for token in self.tokens_containing(word) if token in self.tokens]
+            # Cota superior: un gasto puede tener varios tokens que coinciden
+            options.append((sum(len(ids) for ids in token_ids), lambda token_ids=token_ids: set().union(*token_ids)))
+        if not options:
+            return None
+        return min(options, key=itemgetter(0))[1]()
+
+    def search(self, query: SearchQuery, expenses: List[Dict[str, Any]],
+               by_id: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Gastos que cumplen ``query``, en el orden de ``expenses``"""
+        candidates = self.candidates(query)
+        if candidates is None:
+            return expenses
+        # Con un único criterio los candidatos ya son el resultado exacto
+        exact = query.criteria() == 1
+        if len(candidates) > len(expenses) * SCAN_FRACTION:
+            wanted = candidates if isinstance(candidates, set) else set(candidates)
+            rows: Iterable[Dict[str, Any]] = (expense for expense in expenses if expense['id'] in wanted)
+        else:
+            rows = (by_id[expense_id] for expense_id in sorted(candidates))
+        if exact:
+            return list(rows)
+        return [expense for expense in rows if query.matches(expense)]
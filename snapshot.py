@@ -0,0 +1,172 @@
+"""Snapshot binario del registro: registros de ancho fijo más un heap de texto.
+
+Disposición del archivo (little-endian):
+
+- cabecera: ``EXPSNAP1``, banderas, cantidad de categorías, cantidad de
+  gastos y posición de la tabla de categorías
+- un registro de 36 bytes por gasto: id (int64), días desde 1970-01-01
+  (int32), centavos (int64), código de categoría (uint32) y posición (uint64)
+  y largo (uint32) de la descripción dentro del heap
+- el heap: las descripciones en UTF-8, una tras otra
+- la tabla de categorías: largo (uint16) y nombre en UTF-8 de cada una
+
+Se lee con ``mmap``, así que solo se cargan las páginas que se tocan: los
+primeros gastos de ``list --limit`` o, si los ids están en orden, los pocos
+registros de una búsqueda binaria por id.
+"""
+import mmap
+import struct
+from datetime import date, timedelta
+from typing import List, Dict, Any, Iterator, Optional
+
+SNAPSHOT_MAGIC = b'EXPSNAP1'
+
+# magic, banderas, categorías, gastos, posición de la tabla de categorías
+HEADER = struct.Struct('<8sIIQQ')
+# id, día, centavos, categoría, posición y largo de la descripción
+RECORD = struct.Struct('<qiqIQI')
+
+# Los registros están ordenados por id: get() puede hacer búsqueda binaria
+FLAG_SORTED = 1
+
+EPOCH = date(1970, 1, 1)
+
+# Registros que se codifican juntos en cada escritura
+WRITE_CHUNK_SIZE = 10000
+
+# Registros que se decodifican juntos al recorrer el snapshot (unas pocas páginas)
+READ_CHUNK_SIZE = 256
+
+
+def write_snapshot(f, expenses: List[Dict[str, Any]]) -> None:
+    """Escribir los gastos en ``f`` (abierto en binario), en el orden dado"""
+    categories: Dict[str, int] = {}
+    descriptions = [expense['description'].encode('utf-8') for expense in expenses]
+    ordered = all(expenses[i]['id'] < expenses[i + 1]['id'] for i in range(len(expenses) - 1))
+
+    # La tabla de categorías va al final: se conoce después de recorrer los gastos
+    f.write(b'\0' * HEADER.size)
+    offset = 0
+    for start in range(0, len(expenses), WRITE_CHUNK_SIZE):
+        records = []
+        for expense, description in zip(expenses[start:start + WRITE_CHUNK_SIZE],
+                                        descriptions[start:start + WRITE_CHUNK_SIZE]):
+            code = categories.get(expense['category'])
+            if code is None:
+                code = categories[expense['category']] = len(categories)
+            records.append(RECORD.pack(expense['id'], (date.fromisoformat(expense['date']) - EPOCH).days,
+                                       expense['cents'], code, offset, len(description)))
+            offset += len(description)
+        f.write(b''.join(records))
+    for start in range(0, len(descriptions), WRITE_CHUNK_SIZE):
+        f.write(b''.join(descriptions[start:start + WRITE_CHUNK_SIZE]))
+
+    table_offset = HEADER.size + RECORD.size * len(expenses) + offset
+    for category in categories:
+        encoded = category.encode('utf-8')
+        f.write(struct.pack('<H', len(encoded)) + encoded)
+    f.seek(0)
+    f.write(HEADER.pack(SNAPSHOT_MAGIC, FLAG_SORTED if ordered else 0, len(categories), len(expenses),
+                        table_offset))
+
+
+class Snapshot:
+    """Snapshot abierto con mmap; cada gasto se decodifica recién cuando se pide"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header()
+        except BaseException:
+            self.close()
+            raise
+
+    def _read_header(self) -> None:
+        if len(self._mmap) < HEADER.size:
+            raise ValueError(f"Snapshot binario truncado: {self.path}")
+        magic, self.flags, category_count, self.count, table_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"No es un snapshot binario de gastos: {self.path}")
+        self._heap = HEADER.size + RECORD.size * self.count
+        if table_offset < self._heap or table_offset > len(self._mmap):
+            raise ValueError(f"Snapshot binario truncado: {self.path}")
+
+        self.categories: List[str] = []
+        position = table_offset
+        for _ in range(category_count):
+            length, = struct.unpack_from('<H', self._mmap, position)
+            position += 2
+            self.categories.append(self._mmap[position:position + length].decode('utf-8'))
+            position += length
+        # Hay muchas menos fechas distintas que gastos
+        self._dates: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def _id(self, index: int) -> int:
+        return struct.unpack_from('<q', self._mmap, HEADER.size + RECORD.size * index)[0]
+
+    def expense(self, index: int) -> Dict[str, Any]:
+        record = RECORD.unpack_from(self._mmap, HEADER.size + RECORD.size * index)
+        expense_id, day, cents, code, offset, length = record
+        iso = self._dates.get(day)
+        if iso is None:
+            iso = self._dates[day] = (EPOCH + timedelta(days=day)).isoformat()
+        start = self._heap + offset
+        return {
+            'id': expense_id,
+            'date': iso,
+            'description': self._mmap[start:start + length].decode('utf-8'),
+            'cents': cents,
+            'category': self.categories[code],
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        # Por bloques de registros: una pasada completa no paga unpack_from por gasto,
+        # y quien corta el recorrido (list --limit) solo toca las primeras páginas
+        data, heap, categories, dates = self._mmap, self._heap, self.categories, self._dates
+        for start in range(0, self.count, READ_CHUNK_SIZE):
+            end = min(start + READ_CHUNK_SIZE, self.count)
+            block = data[HEADER.size + RECORD.size * start:HEADER.size + RECORD.size * end]
+            for expense_id, day, cents, code, offset, length in RECORD.iter_unpack(block):
+                iso = dates.get(day)
+                if iso is None:
+                    iso = dates[day] = (EPOCH + timedelta(days=day)).isoformat()
+                offset += heap
+                yield {
+                    'id': expense_id,
+                    'date': iso,
+                    'description': data[offset:offset + length].decode('utf-8'),
+                    'cents': cents,
+                    'category': categories[code],
+                }
+
+    def find(self, expense_id: int) -> Optional[Dict[str, Any]]:
+        """Gasto con ese id: búsqueda binaria si los registros están ordenados, si no, una pasada"""
+        if not self.flags & FLAG_SORTED:
+            for index in range(self.count):
+                if self._id(index) == expense_id:
+                    return self.expense(index)
+            return None
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._id(middle) < expense_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._id(low) == expense_id:
+            return self.expense(low)
+        return None
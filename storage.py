@@ -0,0 +1,1171 @@
+import contextlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Callable
+
+from locking import FileLock
+from money import SCALE, from_legacy
+from reports import DailyTotal, ReportEngine, daily_totals
+from rollup import IdRanges, RollupIndex
+from snapshot import Snapshot, write_snapshot
+
+DATA_FILE = "expenses.json"
+LOG_SUFFIX = ".log"
+INDEX_SUFFIX = ".index"
+LOCK_SUFFIX = ".lock"
+
+# El diario se compacta cuando supera este tamaño o la mitad del snapshot;
+# así cada escritura cuesta O(1) amortizado
+COMPACT_MIN_BYTES = 1024 * 1024
+
+# Tamaño de cada lectura del parser incremental
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def fsync_dir(path: str) -> None:
+    """Sincronizar el directorio para que un rename sea durable (solo POSIX)"""
+    if os.name != 'posix':
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: str, write: Callable[[Any], None], mode: str = 'w') -> None:
+    """Escribir a un temporal, fsync y rename: nunca queda un archivo a medias.
+
+    Cada escritura usa su propio temporal: varios lectores pueden regenerar
+    el mismo índice a la vez sin candado y sin pisarse el archivo.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=name + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, mode) as f:
+            if os.path.exists(path):
+                os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+    fsync_dir(path)
+
+
+def atomic_write_json(path: str, data: Any) -> None:
+    atomic_write(path, lambda f: json.dump(data, f, indent=2))
+
+
+def iter_json_array(path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Leer un arreglo JSON de objetos elemento a elemento.
+
+    Solo mantiene en memoria el bloque actual, así que el primer gasto está
+    disponible sin parsear el resto del archivo.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        # El espacio inicial puede ocupar más de un bloque: vacío solo si llega al final sin nada más
+        buffer = ''
+        while not buffer:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            buffer = chunk.lstrip()
+        if not buffer.startswith('['):
+            raise json.JSONDecodeError("Se esperaba un arreglo JSON", buffer, 0)
+        pos = 1
+        eof = False
+        while True:
+            pos = _SEPARATORS.match(buffer, pos).end()
+            if pos < len(buffer):
+                if buffer[pos] == ']':
+                    return
+                try:
+                    expense, pos = decoder.raw_decode(buffer, pos)
+                    yield expense
+                    continue
+                except json.JSONDecodeError:
+                    # Objeto partido entre dos bloques: leer más y reintentar
+                    if eof:
+                        raise
+            elif eof:
+                raise json.JSONDecodeError("Arreglo JSON incompleto", buffer, pos)
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+
+def sql_statements(script: str) -> Iterator[str]:
+    """Partir un script SQL en sentencias completas (los triggers llevan ';' dentro)"""
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement.strip()
+            statement = ''
+
+
+def apply_ops(expenses: List[Dict[str, Any]], ops: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Aplicar operaciones del diario sobre un snapshot.
+
+    Las operaciones son idempotentes (add/update reemplazan por id, delete
+    ignora ids inexistentes), por lo que reaplicar un diario ya compactado
+    tras una caída no duplica gastos.
+    """
+    by_id = {expense['id']: expense for expense in expenses}
+    for op in ops:
+        if op['op'] == 'delete':
+            by_id.pop(op['id'], None)
+        else:
+            by_id[op['expense']['id']] = op['expense']
+    return list(by_id.values())
+
+
+def log_record(op: Dict[str, Any]) -> Dict[str, Any]:
+    """Operación tal como se guarda en el diario (sin el registro anterior)"""
+    return {key: value for key, value in op.items() if key != 'previous'}
+
+
+class Storage:
+    """Operaciones comunes: cada cambio se expresa como una lista de operaciones.
+
+    Una operación es ``{'op': 'add', 'expense': ...}``,
+    ``{'op': 'update', 'expense': ..., 'previous': ...}`` o
+    ``{'op': 'delete', 'id': ..., 'previous': ...}``. ``previous`` (el gasto
+    antes del cambio) es opcional y sirve para actualizar índices sin releerlo.
+    Un ``add`` de un id que ya existe lo reemplaza, así que volver a aplicar
+    un lote (al reintentarlo o al reanudar uno pendiente) no duplica nada.
+    Los backends implementan ``apply`` para guardar un lote en una sola escritura.
+
+    ``locked`` delimita una lectura-modificación-escritura exclusiva frente a
+    otros hilos y procesos; ``version``/``changes_since`` permiten detectar
+    lo que escribieron los demás.
+    """
+
+    def __init__(self):
+        self._thread_lock = threading.RLock()
+        self._lock_depth = 0
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Sección exclusiva y reentrante entre hilos y procesos"""
+        with self._thread_lock:
+            if self._lock_depth == 0:
+                self._acquire()
+            self._lock_depth += 1
+            failed = False
+            try:
+                yield
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    self._release(failed)
+
+    def _acquire(self) -> None:
+        pass
+
+    def _release(self, failed: bool) -> None:
+        pass
+
+    def migrate(self) -> None:
+        """Poner al día un registro de una versión anterior (bajo el candado).
+
+        Es un paso aparte: construir el almacenamiento no lee ni escribe nada.
+        Sin efecto si ya está al día.
+        """
+
+    def version(self) -> Any:
+        """Marca del estado guardado; cambia cuando alguien escribe"""
+        raise NotImplementedError
+
+    def changes_since(self, version: Any) -> Tuple[Optional[List[Dict[str, Any]]], Any]:
+        """(operaciones desde ``version``, versión actual); None si hay que recargar todo"""
+        current = self.version()
+        return ([] if current == version else None), current
+
+    def reserve_ids(self, count: int) -> int:
+        """Reservar ``count`` ids consecutivos de la secuencia y devolver el primero"""
+        raise NotImplementedError
+
+    def apply(self, ops: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def iter_expenses(self) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def is_empty(self) -> bool:
+        return next(self.iter_expenses(), None) is None
+
+    def search(self, query) -> Iterator[Dict[str, Any]]:
+        """Gastos que cumplen ``query`` (un ``search.SearchQuery``), en el orden del registro.
+
+        Para una sola consulta recorrer el registro cuesta menos que construir
+        el índice; el modo servidor sí lo mantiene en memoria (``LedgerStorage``).
+        """
+        return (expense for expense in self.iter_expenses() if query.matches(expense))
+
+    def daily_totals(self) -> Iterator[DailyTotal]:
+        """(fecha, categoría, centavos, conteo): la base de los reportes"""
+        return daily_totals(self.iter_expenses())
+
+    def report_engine(self) -> ReportEngine:
+        return ReportEngine(self.daily_totals, self.version)
+
+    def add(self, expense: Dict[str, Any]) -> None:
+        self.add_many([expense])
+
+    def add_many(self, expenses: List[Dict[str, Any]]) -> None:
+        self.apply([{'op': 'add', 'expense': expense} for expense in expenses])
+
+    def update(self, expense: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> None:
+        self.apply([{'op': 'update', 'expense': expense, 'previous': previous}])
+
+    def delete(self, expense_id: int, previous: Optional[Dict[str, Any]] = None) -> None:
+        self.apply([{'op': 'delete', 'id': expense_id, 'previous': previous}])
+
+
+class JsonStorage(Storage):
+    """Formato clásico: el snapshot JSON se reescribe completo en cada cambio.
+
+    Los montos se guardan en centavos (``cents``). Un registro con el formato
+    anterior (``amount`` en float) se convierte y reescribe en ``migrate``,
+    que ``get_storage`` llama al abrirlo.
+    """
+
+    name = 'json'
+
+    def __init__(self, path: str = DATA_FILE):
+        super().__init__()
+        self.path = path
+        self.log_path = path + LOG_SUFFIX
+        self.index_path = path + INDEX_SUFFIX
+        self.file_lock = FileLock(path + LOCK_SUFFIX)
+        self._rollup = None
+        self._ids = None
+        self._next_id = None
+        self._indexes_stamp = None
+        self._index_file = None
+
+    def _is_legacy(self) -> bool:
+        """¿El registro tiene montos en float? Basta con mirar el primer gasto"""
+        if os.path.exists(self.path):
+            try:
+                first = next(iter_json_array(self.path), None)
+            except json.JSONDecodeError:
+                first = None
+            if first is not None:
+                return 'cents' not in first
+        # Sin snapshot (o vacío) los gastos están solo en el diario
+        for op in self._read_log():
+            if op['op'] != 'delete':
+                return 'cents' not in op['expense']
+        return False
+
+    def migrate(self) -> None:
+        if not self._is_legacy():
+            return
+        with self.locked():
+            # Otro proceso pudo migrarlo mientras se esperaba el candado
+            if self._is_legacy():
+                self.save_all([from_legacy(expense) for expense in self.load()])
+
+    def _acquire(self) -> None:
+        self.file_lock.acquire()
+
+    def _release(self, failed: bool) -> None:
+        self.file_lock.release()
+
+    def _read_snapshot(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return []
+
+    def _write_snapshot(self, expenses: List[Dict[str, Any]]) -> None:
+        atomic_write_json(self.path, expenses)
+
+    def _read_log(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.log_path):
+            return []
+        ops = []
+        with open(self.log_path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    ops.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Línea truncada por una caída a mitad de escritura
+                    continue
+        return ops
+
+    def _iter_snapshot(self) -> Iterator[Dict[str, Any]]:
+        if os.path.exists(self.path):
+            yield from iter_json_array(self.path)
+
+    def load(self) -> List[Dict[str, Any]]:
+        # El diario se lee antes que el snapshot: si otro proceso compacta en
+        # medio, el snapshot nuevo ya incluye esas operaciones
+        ops = self._read_log()
+        expenses = self._read_snapshot()
+        if ops:
+            expenses = apply_ops(expenses, ops)
+        return expenses
+
+    def iter_expenses(self) -> Iterator[Dict[str, Any]]:
+        """Recorrer los gastos sin cargar el snapshot completo en memoria"""
+        # El diario es pequeño comparado con el snapshot: se resuelve primero
+        pending = {}
+        for op in self._read_log():
+            if op['op'] == 'delete':
+                pending[op['id']] = None
+            else:
+                pending[op['expense']['id']] = op['expense']
+
+        for expense in self._iter_snapshot():
+            if expense['id'] in pending:
+                expense = pending.pop(expense['id'])
+                if expense is None:
+                    continue
+            yield expense
+
+        for expense in pending.values():
+            if expense is not None:
+                yield expense
+
+    def get(self, expense_id: int) -> Optional[Dict[str, Any]]:
+        return next((expense for expense in self.iter_expenses() if expense['id'] == expense_id), None)
+
+    def save_all(self, expenses: List[Dict[str, Any]]) -> None:
+        with self.locked():
+            # La secuencia de ids nunca retrocede, aunque se hayan borrado los últimos
+            self._read_indexes(self._stamp())
+            self._write_snapshot(expenses)
+            # El snapshot ya contiene todo lo que había en el diario
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+                fsync_dir(self.log_path)
+            last_id = max((expense['id'] for expense in expenses), default=0)
+            self._next_id = max(self._next_id or 1, last_id + 1)
+            self._rollup = RollupIndex.from_expenses(expenses)
+            self._ids = IdRanges.from_ids(expense['id'] for expense in expenses)
+            self._write_indexes()
+
+    def compact(self) -> None:
+        with self.locked():
+            self.save_all(self.load())
+
+    def _stamp(self) -> List[int]:
+        """Tamaño y mtime del snapshot y del diario, para validar el índice guardado"""
+        stamp = []
+        for path in (self.path, self.log_path):
+            if os.path.exists(path):
+                stat = os.stat(path)
+                stamp += [stat.st_size, stat.st_mtime_ns]
+            else:
+                stamp += [0, 0]
+        return stamp
+
+    def _load_indexes(self) -> None:
+        """Índice de totales y secuencia de ids; se reconstruyen solo si el guardado está desactualizado"""
+        stamp = self._stamp()
+        # Otro proceso pudo escribir desde la última vez: la caché vale solo con la misma huella.
+        # Reservar ids solo reescribe el índice, así que también se mira el archivo del índice
+        if (self._rollup is not None and self._indexes_stamp == stamp
+                and self._index_file == file_stamp(self.index_path)):
+            return
+        if self._read_indexes(stamp):
+            return
+        # Reconstruir bajo el candado: sin escritores en medio, los totales corresponden a la
+        # huella que se guarda, y la secuencia no pisa ids que otro proceso acaba de reservar
+        with self.locked():
+            if self._read_indexes(self._stamp()):
+                return
+            self._rollup = RollupIndex()
+            ids = []
+            for expense in self.iter_expenses():
+                self._rollup.add(expense)
+                ids.append(expense['id'])
+            self._ids = IdRanges.from_ids(ids)
+            self._next_id = max(self._next_id or 1, max(ids, default=0) + 1)
+            self._write_indexes()
+
+    def _read_indexes(self, stamp: List[int]) -> bool:
+        if not os.path.exists(self.index_path):
+            return False
+        index_file = file_stamp(self.index_path)
+        try:
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return False
+        # La secuencia guardada es un mínimo válido aunque los totales estén desactualizados:
+        # puede haber ids reservados que todavía no aparecen en el registro
+        self._next_id = max(self._next_id or 1, data.get('next_id', 1))
+        # Un índice sin 'ids' es de una versión anterior: se reconstruye
+        if data.get('stamp') != stamp or 'ids' not in data:
+            return False
+        self._rollup = RollupIndex.from_cells(data['cells'])
+        self._ids = IdRanges(data['ids'])
+        self._indexes_stamp = stamp
+        self._index_file = index_file
+        return True
+
+    def _write_indexes(self) -> None:
+        stamp = self._stamp()
+        atomic_write_json(self.index_path, {
+            'stamp': stamp,
+            'next_id': self._next_id,
+            'cells': self._rollup.to_cells(),
+            'ids': self._ids.to_list(),
+        })
+        self._indexes_stamp = stamp
+        self._index_file = file_stamp(self.index_path)
+
+    def rollup(self) -> RollupIndex:
+        self._load_indexes()
+        return self._rollup
+
+    def next_id(self) -> int:
+        """Siguiente id de la secuencia guardada, sin recorrer los gastos"""
+        self._load_indexes()
+        return self._next_id
+
+    def reserve_ids(self, count: int) -> int:
+        with self.locked():
+            self._load_indexes()
+            start = self._next_id
+            self._next_id += count
+            self._write_indexes()
+            return start
+
+    def version(self) -> List[int]:
+        return self._stamp()
+
+    def apply(self, ops: List[Dict[str, Any]]) -> None:
+        # Leer y reescribir bajo el candado: ningún otro proceso escribe en medio
+        with self.locked():
+            self.save_all(apply_ops(self.load(), ops))
+
+
+def load_json_ledger(path: str) -> List[Dict[str, Any]]:
+    """Gastos de un ``expenses.json`` (con su diario) en centavos, sin reescribir el archivo"""
+    return [from_legacy(expense) for expense in JsonStorage(path).load()]
+
+
+class JournalStorage(JsonStorage):
+    """Snapshot JSON más un diario de operaciones de solo anexado.
+
+    Cada cambio agrega una línea a ``expenses.json.log`` (con fsync) en lugar
+    de reescribir todo el archivo. La compactación periódica vuelca el diario
+    al snapshot con escritura atómica. Un ``expenses.json`` existente es un
+    snapshot válido, así que no necesita migración para leerse.
+    """
+
+    name = 'journal'
+
+    def _append(self, *ops: Dict[str, Any]) -> None:
+        # Todas las operaciones van en una sola escritura con un único fsync
+        data = ''.join(json.dumps(op) + '\n' for op in ops).encode('utf-8')
+        with open(self.log_path, 'a+b') as f:
+            # Si una caída dejó una línea a medias, empezar en una línea nueva
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    data = b'\n' + data
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _maybe_compact(self) -> None:
+        log_size = os.path.getsize(self.log_path)
+        snapshot_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if log_size >= max(COMPACT_MIN_BYTES, snapshot_size // 2):
+            self.compact()
+
+    def apply(self, ops: List[Dict[str, Any]]) -> None:
+        with self.locked():
+            # Los índices se obtienen antes de escribir: su huella es la del estado previo
+            index = self.rollup()
+            ids = self._ids
+            # Cómo queda cada id dentro del lote, para las operaciones que lo vuelven a tocar
+            batch: Dict[int, Optional[Dict[str, Any]]] = {}
+            for op in ops:
+                expense_id = op['id'] if op['op'] == 'delete' else op['expense']['id']
+                if op.get('previous') is None:
+                    if expense_id in batch:
+                        op['previous'] = batch[expense_id]
+                    elif expense_id in ids:
+                        # También un add de un id que ya está (un lote que se reintenta): reemplaza,
+                        # así que los totales no lo cuentan dos veces
+                        op['previous'] = self.get(expense_id)
+                batch[expense_id] = None if op['op'] == 'delete' else op['expense']
+
+            self._append(*(log_record(op) for op in ops))
+
+            for op in ops:
+                if op.get('previous') is not None:
+                    index.remove(op['previous'])
+                if op['op'] == 'delete':
+                    ids.remove(op['id'])
+                else:
+                    index.add(op['expense'])
+                    ids.add(op['expense']['id'])
+                    self._next_id = max(self._next_id, op['expense']['id'] + 1)
+            self._after_write()
+
+    def version(self) -> List[int]:
+        # Huella del snapshot más la posición hasta la que se leyó el diario
+        stamp = self._stamp()
+        return stamp[:2] + [stamp[2]]
+
+    def changes_since(self, version: List[int]) -> Tuple[Optional[List[Dict[str, Any]]], List[int]]:
+        """Leer solo la cola del diario escrita desde ``version``.
+
+        Si el snapshot cambió (otro proceso compactó) hay que recargar todo.
+        Una línea a medias de una escritura en curso se deja para la próxima vez.
+        """
+        snapshot = self._stamp()[:2]
+        if version is None or snapshot != version[:2]:
+            return None, self.version()
+        offset = version[2]
+        if not os.path.exists(self.log_path):
+            return ([] if offset == 0 else None), snapshot + [0]
+        with open(self.log_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < offset:
+                return None, self.version()
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        ops = []
+        for line in data[:end].splitlines():
+            if line.strip():
+                try:
+                    ops.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return ops, snapshot + [offset + end]
+
+    def _after_write(self) -> None:
+        self._write_indexes()
+        self._maybe_compact()
+
+
+class BinaryStorage(JournalStorage):
+    """Como ``journal``, pero con el snapshot en binario (``expenses.snap``, ver ``snapshot.py``).
+
+    Ocupa una fracción del JSON con sangría y se lee con mmap sin parsear
+    el archivo entero: ``list --limit`` decodifica solo los primeros gastos y
+    ``get`` hace una búsqueda binaria por id. El diario sigue siendo JSON Lines.
+    La primera vez se convierte el ``expenses.json`` existente (con su diario).
+    """
+
+    name = 'binary'
+
+    SNAPSHOT_EXTENSION = '.snap'
+
+    def __init__(self, path: str = DATA_FILE):
+        self.json_path = path
+        super().__init__(os.path.splitext(path)[0] + self.SNAPSHOT_EXTENSION)
+
+    def migrate(self) -> None:
+        if os.path.exists(self.path) or os.path.exists(self.log_path) or not os.path.exists(self.json_path):
+            return
+        with self.locked():
+            if not (os.path.exists(self.path) or os.path.exists(self.log_path)):
+                self.save_all(load_json_ledger(self.json_path))
+
+    def _read_snapshot(self) -> List[Dict[str, Any]]:
+        return list(self._iter_snapshot())
+
+    def _write_snapshot(self, expenses: List[Dict[str, Any]]) -> None:
+        atomic_write(self.path, lambda f: write_snapshot(f, expenses), 'wb')
+
+    def _iter_snapshot(self) -> Iterator[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return
+        # El mapeo se suelta al terminar (o al descartar el iterador, como hace list --limit)
+        with Snapshot(self.path) as snapshot:
+            yield from snapshot
+
+    def get(self, expense_id: int) -> Optional[Dict[str, Any]]:
+        # El diario se lee primero y manda sobre el snapshot, igual que en load()
+        found, expense = False, None
+        for op in self._read_log():
+            if op['op'] == 'delete' and op['id'] == expense_id:
+                found, expense = True, None
+            elif op['op'] != 'delete' and op['expense']['id'] == expense_id:
+                found, expense = True, op['expense']
+        if found or not os.path.exists(self.path):
+            return expense
+        with Snapshot(self.path) as snapshot:
+            return snapshot.find(expense_id)
+
+
+class SqliteStorage(Storage):
+    """Gastos en un archivo SQLite con índices sobre id, fecha y categoría.
+
+    La primera vez que se abre una base vacía se importa el ``expenses.json``
+    existente (incluido su diario), de modo que cambiar de backend no pierde datos.
+    """
+
+    name = 'sqlite'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY,
+            date TEXT NOT NULL,
+            description TEXT NOT NULL,
+            cents INTEGER NOT NULL,
+            category TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date, cents);
+        CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses (category);
+
+        CREATE TABLE IF NOT EXISTS expense_rollup (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (year, month, category)
+        );
+        CREATE TRIGGER IF NOT EXISTS expenses_rollup_insert AFTER INSERT ON expenses BEGIN
+            INSERT INTO expense_rollup (year, month, category, total, count)
+            VALUES (CAST(substr(NEW.date, 1, 4) AS INTEGER), CAST(substr(NEW.date, 6, 2) AS INTEGER),
+                    NEW.category, NEW.cents, 1)
+            ON CONFLICT (year, month, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS expenses_rollup_delete AFTER DELETE ON expenses BEGIN
+            UPDATE expense_rollup SET total = total - OLD.cents, count = count - 1
+            WHERE year = CAST(substr(OLD.date, 1, 4) AS INTEGER)
+              AND month = CAST(substr(OLD.date, 6, 2) AS INTEGER)
+              AND category = OLD.category;
+            DELETE FROM expense_rollup WHERE count <= 0;
+        END;
+        CREATE TRIGGER IF NOT EXISTS expenses_rollup_update AFTER UPDATE ON expenses BEGIN
+            UPDATE expense_rollup SET total = total - OLD.cents, count = count - 1
+            WHERE year = CAST(substr(OLD.date, 1, 4) AS INTEGER)
+              AND month = CAST(substr(OLD.date, 6, 2) AS INTEGER)
+              AND category = OLD.category;
+            DELETE FROM expense_rollup WHERE count <= 0;
+            INSERT INTO expense_rollup (year, month, category, total, count)
+            VALUES (CAST(substr(NEW.date, 1, 4) AS INTEGER), CAST(substr(NEW.date, 6, 2) AS INTEGER),
+                    NEW.category, NEW.cents, 1)
+            ON CONFLICT (year, month, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+        END;
+
+        CREATE TABLE IF NOT EXISTS expense_sequence (
+            name TEXT PRIMARY KEY,
+            next_id INTEGER NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS expenses_sequence_insert AFTER INSERT ON expenses BEGIN
+            INSERT INTO expense_sequence (name, next_id) VALUES ('expenses', NEW.id + 1)
+            ON CONFLICT (name) DO UPDATE SET next_id = MAX(next_id, excluded.next_id);
+        END;
+    """
+    SCHEMA_VERSION = 4
+
+    # Hasta la versión 3 el monto era REAL: se apartan las tablas viejas y se copian en centavos
+    LEGACY_CLEANUP = """
+        DROP TRIGGER IF EXISTS expenses_rollup_insert;
+        DROP TRIGGER IF EXISTS expenses_rollup_delete;
+        DROP TRIGGER IF EXISTS expenses_rollup_update;
+        DROP TRIGGER IF EXISTS expenses_sequence_insert;
+        DROP INDEX IF EXISTS idx_expenses_date;
+        DROP INDEX IF EXISTS idx_expenses_category;
+        DROP TABLE IF EXISTS expense_rollup;
+        ALTER TABLE expenses RENAME TO expenses_legacy;
+    """
+
+    def __init__(self, path: str = DATA_FILE):
+        super().__init__()
+        self.json_path = path
+        self.path = os.path.splitext(path)[0] + '.db'
+        # La GUI escribe desde un hilo de fondo; locked() serializa el uso de la conexión
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        # INSERT OR REPLACE solo dispara el trigger de borrado con esta opción
+        self.conn.execute("PRAGMA recursive_triggers = ON")
+
+    def _user_version(self) -> int:
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self) -> None:
+        # PRAGMA user_version: 0 = base nueva, 1 = sin tabla de totales, 2 = sin secuencia de ids,
+        # 3 = montos REAL en lugar de centavos
+        if self._user_version() >= self.SCHEMA_VERSION:
+            return
+        # Una sola transacción (BEGIN IMMEDIATE): si se interrumpe, la base queda como estaba
+        with self.locked():
+            version = self._user_version()
+            if version >= self.SCHEMA_VERSION:
+                return
+            script = self.SCHEMA if version == 0 else self.LEGACY_CLEANUP + self.SCHEMA
+            for statement in sql_statements(script):
+                self.conn.execute(statement)
+            if version == 0:
+                if os.path.exists(self.json_path):
+                    self._insert_many(load_json_ledger(self.json_path))
+            else:
+                # Los triggers reconstruyen los totales y la secuencia al copiar
+                self.conn.execute(
+                    "INSERT INTO expenses (id, date, description, cents, category) "
+                    f"SELECT id, date, description, CAST(ROUND(amount * {SCALE}) AS INTEGER), category "
+                    "FROM expenses_legacy"
+                )
+                self.conn.execute("DROP TABLE expenses_legacy")
+            self.conn.execute(
+                "INSERT INTO expense_sequence (name, next_id) "
+                "SELECT 'expenses', COALESCE(MAX(id), 0) + 1 FROM expenses WHERE 1 "
+                "ON CONFLICT (name) DO UPDATE SET next_id = MAX(next_id, excluded.next_id)"
+            )
+            self.conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def _acquire(self) -> None:
+        # Toma el candado de escritura de SQLite al empezar, no en el primer INSERT
+        self.conn.execute("BEGIN IMMEDIATE")
+
+    def _release(self, failed: bool) -> None:
+        if failed:
+            self.conn.rollback()
+        else:
+            self.conn.commit()
+
+    def _insert_many(self, expenses: List[Dict[str, Any]]) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO expenses (id, date, description, cents, category) "
+            "VALUES (:id, :date, :description, :cents, :category)",
+            expenses
+        )
+
+    def load(self) -> List[Dict[str, Any]]:
+        with self._thread_lock:
+            rows = self.conn.execute("SELECT id, date, description, cents, category FROM expenses ORDER BY id")
+            return [dict(row) for row in rows]
+
+    def iter_expenses(self) -> Iterator[Dict[str, Any]]:
+        rows = self.conn.execute("SELECT id, date, description, cents, category FROM expenses ORDER BY id")
+        for row in rows:
+            yield dict(row)
+
+    def is_empty(self) -> bool:
+        return self.conn.execute("SELECT 1 FROM expenses LIMIT 1").fetchone() is None
+
+    def search(self, query) -> Iterator[Dict[str, Any]]:
+        # Categoría, fechas y montos los resuelven los índices de la tabla; el texto, matches()
+        conditions, params = [], []
+        for column, operator, value in (('category', '=', query.category), ('date', '>=', query.date_from),
+                                        ('date', '<=', query.date_to), ('cents', '>=', query.min_amount),
+                                        ('cents', '<=', query.max_amount)):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        rows = self.conn.execute(
+            f"SELECT id, date, description, cents, category FROM expenses {where}ORDER BY id", params)
+        for row in rows:
+            expense = dict(row)
+            if not query.words or query.matches(expense):
+                yield expense
+
+    def daily_totals(self) -> Iterator[DailyTotal]:
+        # SQLite agrupa: a Python solo llega una fila por fecha y categoría
+        return iter(self.conn.execute(
+            "SELECT date, category, SUM(cents), COUNT(*) FROM expenses GROUP BY date, category").fetchall())
+
+    def get(self, expense_id: int) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT id, date, description, cents, category FROM expenses WHERE id = ?", (expense_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def save_all(self, expenses: List[Dict[str, Any]]) -> None:
+        with self.locked():
+            self.conn.execute("DELETE FROM expenses")
+            self._insert_many(expenses)
+
+    def compact(self) -> None:
+        self.conn.execute("VACUUM")
+
+    def rollup(self) -> RollupIndex:
+        # La tabla expense_rollup la mantienen los triggers; aquí solo se lee
+        rows = self.conn.execute("SELECT year, month, category, total, count FROM expense_rollup")
+        return RollupIndex.from_cells(rows)
+
+    def next_id(self) -> int:
+        # El trigger de inserción mantiene la secuencia; los borrados no la hacen retroceder
+        with self._thread_lock:
+            row = self.conn.execute("SELECT next_id FROM expense_sequence WHERE name = 'expenses'").fetchone()
+        return row[0] if row else 1
+
+    def reserve_ids(self, count: int) -> int:
+        with self.locked():
+            start = self.next_id()
+            self.conn.execute(
+                "INSERT INTO expense_sequence (name, next_id) VALUES ('expenses', ?) "
+                "ON CONFLICT (name) DO UPDATE SET next_id = excluded.next_id",
+                (start + count,)
+            )
+            return start
+
+    def version(self) -> int:
+        # Cambia solo cuando otra conexión confirma una escritura
+        with self._thread_lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def apply(self, ops: List[Dict[str, Any]]) -> None:
+        with self.locked():
+            for op in ops:
+                if op['op'] == 'add':
+                    self._insert_many([op['expense']])
+                elif op['op'] == 'update':
+                    self.conn.execute(
+                        "UPDATE expenses SET date = :date, description = :description, cents = :cents, "
+                        "category = :category WHERE id = :id",
+                        op['expense']
+                    )
+                else:
+                    self.conn.execute("DELETE FROM expenses WHERE id = ?", (op['id'],))
+
+    def add_many(self, expenses: List[Dict[str, Any]]) -> None:
+        with self.locked():
+            self._insert_many(expenses)
+
+
+def file_stamp(path: str) -> List[int]:
+    """Tamaño y mtime de un archivo ([0, 0] si no existe)"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return [0, 0]
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def shard_key(expense: Dict[str, Any]) -> str:
+    """Mes (AAAA-MM) del archivo al que pertenece un gasto"""
+    return expense['date'][:7]
+
+
+class ShardedStorage(Storage):
+    """Un archivo JSON por mes (``expenses.shards/2024-05.json``) más un manifiesto.
+
+    El manifiesto guarda por mes el conteo, los totales por categoría y el
+    rango de ids: el resumen no abre ningún mes, un filtro por fechas abre
+    solo los meses del rango y buscar un id, solo los meses cuyo rango lo
+    contiene. Cada escritura reescribe únicamente los meses que toca (agregar
+    un gasto de hoy, solo el mes en curso) y después el manifiesto.
+
+    La primera vez se reparte el ``expenses.json`` existente (``split``).
+    Los gastos se recorren mes a mes y, dentro de cada mes, por id.
+    """
+
+    name = 'sharded'
+
+    SHARDS_SUFFIX = '.shards'
+    MANIFEST = 'manifest.json'
+    SHARD_NAME = re.compile(r'^(\d{4}-\d{2})\.json$')
+
+    def __init__(self, path: str = DATA_FILE):
+        super().__init__()
+        self.json_path = path
+        self.path = os.path.splitext(path)[0] + self.SHARDS_SUFFIX
+        self.manifest_path = os.path.join(self.path, self.MANIFEST)
+        self.file_lock = FileLock(self.path + LOCK_SUFFIX)
+        self._manifest = None
+        self._manifest_stamp = None
+
+    def migrate(self) -> None:
+        if os.path.exists(self.manifest_path) or not os.path.exists(self.json_path):
+            return
+        with self.locked():
+            if not os.path.exists(self.manifest_path):
+                self.split(self.json_path)
+
+    def _acquire(self) -> None:
+        self.file_lock.acquire()
+
+    def _release(self, failed: bool) -> None:
+        if failed:
+            # El manifiesto en caché pudo quedar modificado a medias
+            self._manifest = None
+        self.file_lock.release()
+
+    def split(self, source: str) -> int:
+        """Reemplazar el contenido por el de un registro JSON (con su diario) y devolver cuántos gastos tenía"""
+        expenses = load_json_ledger(source)
+        self.save_all(expenses)
+        return len(expenses)
+
+    def _shard_path(self, key: str) -> str:
+        return os.path.join(self.path, key + '.json')
+
+    def _read_shard(self, key: str) -> List[Dict[str, Any]]:
+        try:
+            with open(self._shard_path(key), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _write_shard(self, key: str, expenses: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Reescribir un mes y devolver su entrada del manifiesto (None si quedó vacío)"""
+        path = self._shard_path(key)
+        if not expenses:
+            if os.path.exists(path):
+                os.remove(path)
+                fsync_dir(path)
+            return None
+        os.makedirs(self.path, exist_ok=True)
+        expenses.sort(key=lambda expense: expense['id'])
+        atomic_write_json(path, expenses)
+        return self._summarize(expenses, file_stamp(path))
+
+    @staticmethod
+    def _summarize(expenses: List[Dict[str, Any]], stamp: List[int]) -> Dict[str, Any]:
+        categories: Dict[str, List[int]] = {}
+        for expense in expenses:
+            cell = categories.setdefault(expense['category'], [0, 0])
+            cell[0] += expense['cents']
+            cell[1] += 1
+        return {
+            'count': len(expenses),
+            'total': sum(total for total, _ in categories.values()),
+            'min_id': min(expense['id'] for expense in expenses),
+            'max_id': max(expense['id'] for expense in expenses),
+            'categories': categories,
+            'stamp': stamp,
+        }
+
+    def _scan(self) -> Dict[str, List[int]]:
+        """Mes -> huella de cada archivo mensual en disco"""
+        try:
+            entries = list(os.scandir(self.path))
+        except FileNotFoundError:
+            return {}
+        stamps = {}
+        for entry in entries:
+            match = self.SHARD_NAME.match(entry.name)
+            if match and entry.is_file():
+                stat = entry.stat()
+                stamps[match.group(1)] = [stat.st_size, stat.st_mtime_ns]
+        return stamps
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return {'next_id': 1, 'shards': {}}
+
+    @staticmethod
+    def _is_stale(manifest: Dict[str, Any], on_disk: Dict[str, List[int]]) -> bool:
+        shards = manifest['shards']
+        return shards.keys() != on_disk.keys() or any(shards[key]['stamp'] != on_disk[key] for key in on_disk)
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        atomic_write_json(self.manifest_path, manifest)
+        self._manifest = manifest
+        self._manifest_stamp = file_stamp(self.manifest_path)
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        """Manifiesto en caché mientras no cambie en disco; se corrige si no coincide con los meses"""
+        # La huella se toma antes de leer: si otro proceso escribe en medio, la próxima lectura lo nota
+        stamp = file_stamp(self.manifest_path)
+        if self._manifest is not None and stamp == self._manifest_stamp:
+            return self._manifest
+        manifest = self._read_manifest()
+        if self._is_stale(manifest, self._scan()):
+            # Una escritura en curso (se espera el candado) o interrumpida entre un mes y el manifiesto
+            with self.locked():
+                stamp = file_stamp(self.manifest_path)
+                manifest = self._read_manifest()
+                on_disk = self._scan()
+                if self._is_stale(manifest, on_disk):
+                    self._repair(manifest, on_disk)
+                    return manifest
+        self._manifest = manifest
+        self._manifest_stamp = stamp
+        return manifest
+
+    def _repair(self, manifest: Dict[str, Any], on_disk: Dict[str, List[int]]) -> None:
+        shards = manifest['shards']
+        for key in list(shards):
+            if key not in on_disk:
+                del shards[key]
+        for key, stamp in on_disk.items():
+            if key not in shards or shards[key]['stamp'] != stamp:
+                expenses = self._read_shard(key)
+                if expenses:
+                    shards[key] = self._summarize(expenses, stamp)
+                else:
+                    shards.pop(key, None)
+        last_id = max((entry['max_id'] for entry in shards.values()), default=0)
+        manifest['next_id'] = max(manifest['next_id'], last_id + 1)
+        self._write_manifest(manifest)
+
+    def shards(self, date_from: Optional[str] = None, date_to: Optional[str] = None,
+               category: Optional[str] = None) -> List[str]:
+        """Meses (AAAA-MM, en orden) que pueden tener gastos entre dos fechas y de una categoría"""
+        keys = []
+        for key, entry in self._load_manifest()['shards'].items():
+            if (date_from and key < date_from[:7]) or (date_to and key > date_to[:7]):
+                continue
+            if category is not None and category not in entry['categories']:
+                continue
+            keys.append(key)
+        return sorted(keys)
+
+    def load(self) -> List[Dict[str, Any]]:
+        return list(self.iter_expenses())
+
+    def iter_expenses(self) -> Iterator[Dict[str, Any]]:
+        for key in self.shards():
+            yield from self._read_shard(key)
+
+    def is_empty(self) -> bool:
+        return not self._load_manifest()['shards']
+
+    def search(self, query) -> Iterator[Dict[str, Any]]:
+        # Fechas y categoría descartan meses enteros con el manifiesto; el resto, matches()
+        for key in self.shards(query.date_from, query.date_to, query.category):
+            for expense in self._read_shard(key):
+                if query.matches(expense):
+                    yield expense
+
+    def _candidates(self, expense_id: int) -> List[str]:
+        """Meses cuyo rango de ids contiene ``expense_id``"""
+        return [key for key, entry in self._load_manifest()['shards'].items()
+                if entry['min_id'] <= expense_id <= entry['max_id']]
+
+    def get(self, expense_id: int) -> Optional[Dict[str, Any]]:
+        for key in self._candidates(expense_id):
+            for expense in self._read_shard(key):
+                if expense['id'] == expense_id:
+                    return expense
+        return None
+
+    def save_all(self, expenses: List[Dict[str, Any]]) -> None:
+        with self.locked():
+            manifest = self._load_manifest()
+            by_shard: Dict[str, List[Dict[str, Any]]] = {}
+            for expense in expenses:
+                by_shard.setdefault(shard_key(expense), []).append(expense)
+            shards = {}
+            for key in set(manifest['shards']) | set(by_shard):
+                entry = self._write_shard(key, by_shard.get(key, []))
+                if entry is not None:
+                    shards[key] = entry
+            # La secuencia de ids nunca retrocede, aunque se hayan borrado los últimos
+            last_id = max((expense['id'] for expense in expenses), default=0)
+            self._write_manifest({'next_id': max(manifest['next_id'], last_id + 1), 'shards': shards})
+
+    def compact(self) -> None:
+        # No hay diario que volcar: se rehace el manifiesto leyendo cada mes
+        with self.locked():
+            manifest = self._read_manifest()
+            manifest['shards'] = {}
+            self._repair(manifest, self._scan())
+
+    def rollup(self) -> RollupIndex:
+        # Los totales por mes y categoría del manifiesto bastan: no se abre ningún mes
+        return RollupIndex.from_cells(
+            (int(key[:4]), int(key[5:7]), category, total, count)
+            for key, entry in self._load_manifest()['shards'].items()
+            for category, (total, count) in entry['categories'].items()
+        )
+
+    def next_id(self) -> int:
+        return self._load_manifest()['next_id']
+
+    def reserve_ids(self, count: int) -> int:
+        with self.locked():
+            manifest = self._load_manifest()
+            start = manifest['next_id']
+            manifest['next_id'] += count
+            self._write_manifest(manifest)
+            return start
+
+    def version(self) -> List[int]:
+        # Toda escritura termina reescribiendo el manifiesto
+        return file_stamp(self.manifest_path)
+
+    def apply(self, ops: List[Dict[str, Any]]) -> None:
+        with self.locked():
+            manifest = self._load_manifest()
+            loaded: Dict[str, Dict[int, Dict[str, Any]]] = {}
+            changed = set()
+
+            def shard(key: str) -> Dict[int, Dict[str, Any]]:
+                if key not in loaded:
+                    loaded[key] = {expense['id']: expense for expense in self._read_shard(key)}
+                return loaded[key]
+
+            def locate(expense_id: int, previous: Optional[Dict[str, Any]]) -> Optional[str]:
+                # La fecha anterior indica el mes; si no, los ya abiertos y luego los rangos de ids
+                keys = [shard_key(previous)] if previous is not None else []
+                keys += list(loaded) + self._candidates(expense_id)
+                return next((key for key in keys if expense_id in shard(key)), None)
+
+            next_id = manifest['next_id']
+            for op in ops:
+                # Un add de un id que ya existe lo reemplaza, aunque esté en otro mes
+                expense_id = op['id'] if op['op'] == 'delete' else op['expense']['id']
+                key = locate(expense_id, op.get('previous'))
+                if key is not None:
+                    del shard(key)[expense_id]
+                    changed.add(key)
+                if op['op'] != 'delete':
+                    expense = op['expense']
+                    key = shard_key(expense)
+                    shard(key)[expense['id']] = expense
+                    changed.add(key)
+                    next_id = max(next_id, expense['id'] + 1)
+
+            for key in changed:
+                entry = self._write_shard(key, list(loaded[key].values()))
+                if entry is not None:
+                    manifest['shards'][key] = entry
+                else:
+                    manifest['shards'].pop(key, None)
+            manifest['next_id'] = next_id
+            self._write_manifest(manifest)
+
+
+BACKENDS = {
+    JsonStorage.name: JsonStorage,
+    JournalStorage.name: JournalStorage,
+    SqliteStorage.name: SqliteStorage,
+    BinaryStorage.name: BinaryStorage,
+    ShardedStorage.name: ShardedStorage,
+}
+DEFAULT_BACKEND = JournalStorage.name
+
+
+def get_storage(backend: str = DEFAULT_BACKEND, path: str = DATA_FILE):
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconocido: {backend}")
+    storage = BACKENDS[backend](path)
+    # Abrir un backend deja el registro listo para usar, convirtiendo el formato anterior si hace falta
+    storage.migrate()
+    return storage
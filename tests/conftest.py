@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Los módulos están en la raíz del repositorio, como los importan main.py y benchmarks/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
@@ -0,0 +1,73 @@
+import pytest
+
+from ledger import Ledger
+from storage import BACKENDS, get_storage
+
+
+def expense(expense_id, cents=100, date='2024-01-10', category='Comida'):
+    return {'id': expense_id, 'date': date, 'description': f"gasto {expense_id}", 'cents': cents,
+            'category': category}
+
+
+def test_apply_skips_unsaved_ids():
+    ledger = Ledger([expense(1), expense(2), expense(3)])
+    # Cambio local de 2 todavía sin guardar
+    ledger.update(2, cents=999)
+    ledger.apply([
+        {'op': 'update', 'expense': expense(1, 500)},
+        {'op': 'update', 'expense': expense(2, 700)},
+        {'op': 'delete', 'id': 3},
+        {'op': 'add', 'expense': expense(4, 50)},
+    ], skip={2})
+    assert ledger.expenses == [expense(1, 500), expense(2, 999), expense(4, 50)]
+    assert (ledger.rollup.count(), ledger.rollup.total()) == (3, 500 + 999 + 50)
+
+
+def test_apply_is_idempotent():
+    ledger = Ledger([expense(1)])
+    ops = [{'op': 'add', 'expense': expense(2, 300)}, {'op': 'update', 'expense': expense(1, 200)},
+           {'op': 'delete', 'id': 7}]
+    ledger.apply(ops)
+    ledger.apply(ops)
+    assert ledger.expenses == [expense(1, 200), expense(2, 300)]
+    assert ledger.rollup.total() == 500
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_changes_since_reports_other_writers(backend, tmp_path):
+    path = str(tmp_path / 'expenses.json')
+    mine = get_storage(backend, path)
+    mine.add(expense(1))
+    version = mine.version()
+    ledger = Ledger(mine.load())
+
+    other = get_storage(backend, path)
+    other.add(expense(2, 300))
+    other.update(expense(1, 200))
+
+    changes, version = mine.changes_since(version)
+    # Unos backends dan las operaciones y otros piden recargar todo: el resultado es el mismo
+    if changes is None:
+        ledger = Ledger(mine.load())
+    else:
+        ledger.apply(changes)
+    assert ledger.expenses == [expense(1, 200), expense(2, 300)]
+    assert mine.changes_since(version) == ([], version)
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_reserved_ids_are_not_reused(backend, tmp_path):
+    path = str(tmp_path / 'expenses.json')
+    first, second = get_storage(backend, path), get_storage(backend, path)
+    start = first.reserve_ids(10)
+    assert second.reserve_ids(5) >= start + 10
+    assert second.next_id() >= start + 15
+
+
+def test_locked_is_reentrant(tmp_path):
+    storage = get_storage('journal', str(tmp_path / 'expenses.json'))
+    with storage.locked():
+        with storage.locked():
+            storage.add(expense(1))
+        storage.add(expense(2))
+    assert [e['id'] for e in storage.load()] == [1, 2]
@@ -0,0 +1,72 @@
+import json
+import os
+import threading
+
+import pytest
+
+from exporters import ExportCancelled, FORMATS, export_expenses, format_for_path, iter_columnar
+from importer import iter_rows, parse_row
+
+EXPENSES = [
+    {'id': n, 'date': f"2024-{n % 12 + 1:02d}-{n % 28 + 1:02d}", 'description': description,
+     'cents': cents, 'category': category}
+    for n, (description, cents, category) in enumerate([
+        ('Café', 350, 'Comida'),
+        ('Coma, "comillas" y\nsalto', 1, 'Otros'),
+        ('Alquiler', 5000000, 'Hogar'),
+        ('Ñandú', 10, 'Comida'),
+        ('Consulta', 999999999, 'Salud'),
+    ] * 3, start=1)
+]
+
+
+def without_id(expense):
+    return {key: value for key, value in expense.items() if key != 'id'}
+
+
+# El importador no lee JSON comprimido
+@pytest.mark.parametrize('fmt, compress', [
+    (fmt, compress) for fmt in sorted(FORMATS) for compress in (False, True) if not (fmt == 'json' and compress)
+])
+def test_export_import_round_trip(fmt, compress, tmp_path):
+    path = str(tmp_path / ('gastos' + FORMATS[fmt] + ('.gz' if compress else '')))
+    assert format_for_path(path) == (fmt, compress)
+    # Bloques chicos para que el archivo se escriba en varias partes
+    assert export_expenses(iter(EXPENSES), path, fmt, compress, chunk_size=4) == len(EXPENSES)
+    assert not os.path.exists(path + '.part')
+
+    imported = [parse_row(row) for _, row in iter_rows(path)]
+    assert imported == [without_id(expense) for expense in EXPENSES]
+
+
+def test_columnar_keeps_ids(tmp_path):
+    path = str(tmp_path / 'gastos.expcol')
+    export_expenses(EXPENSES, path, 'columnar', chunk_size=2)
+    assert list(iter_columnar(path)) == EXPENSES
+
+
+def test_json_export_is_plain_json(tmp_path):
+    path = str(tmp_path / 'gastos.json')
+    export_expenses(EXPENSES[:2], path, 'json', chunk_size=1)
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    assert [row['amount'] for row in data] == [3.5, 0.01]
+
+    export_expenses([], path, 'json')
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f) == []
+
+
+def test_empty_csv_has_header(tmp_path):
+    path = str(tmp_path / 'gastos.csv')
+    assert export_expenses([], path, 'csv') == 0
+    with open(path, encoding='utf-8') as f:
+        assert f.read().strip() == 'id,date,description,amount,category'
+
+
+def test_cancel_leaves_no_file(tmp_path):
+    path = str(tmp_path / 'gastos.csv')
+    cancel = threading.Event()
+    with pytest.raises(ExportCancelled):
+        export_expenses(EXPENSES, path, 'csv', chunk_size=2, progress=lambda written: cancel.set(), cancel=cancel)
+    assert os.listdir(tmp_path) == []
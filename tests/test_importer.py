@@ -0,0 +1,76 @@
+import gzip
+import json
+
+import pytest
+
+from importer import import_expenses, iter_rows, parse_row
+from storage import BACKENDS, get_storage
+
+STATEMENT = (
+    "Fecha,Concepto,Importe,Categoría\n"
+    "2024-01-05,Supermercado,\"45,30\",Comida\n"
+    "2024-01-06,,10,Comida\n"
+    "2024-13-01,Fecha mala,10,Comida\n"
+    "2024-01-07,Sin categoría,0.1,\n"
+    "2024-01-08,Negativo,-5,Hogar\n"
+    "2024-01-09,Demasiados decimales,1.234,Hogar\n"
+)
+
+
+@pytest.fixture
+def statement(tmp_path):
+    path = tmp_path / 'extracto.csv'
+    # Con BOM, como los CSV que exportan las planillas
+    path.write_text('\ufeff' + STATEMENT, encoding='utf-8')
+    return str(path)
+
+
+def test_csv_aliases_and_rejections(statement, tmp_path):
+    storage = get_storage('json', str(tmp_path / 'expenses.json'))
+    result = import_expenses(storage, statement, dry_run=True)
+    assert result.expenses == [
+        {'id': 1, 'date': '2024-01-05', 'description': 'Supermercado', 'cents': 4530, 'category': 'Comida'},
+        {'id': 2, 'date': '2024-01-07', 'description': 'Sin categoría', 'cents': 10, 'category': 'General'},
+    ]
+    # Números de fila del archivo (la 1 es el encabezado)
+    assert [line for line, _ in result.rejected] == [3, 4, 6, 7]
+    assert storage.is_empty()
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_import_numbers_after_existing(backend, statement, tmp_path):
+    storage = get_storage(backend, str(tmp_path / 'expenses.json'))
+    storage.add({'id': 1, 'date': '2024-01-01', 'description': 'previo', 'cents': 100, 'category': 'Hogar'})
+    storage.reserve_ids(3)
+
+    result = import_expenses(storage, statement)
+    assert [expense['id'] for expense in result.expenses] == [5, 6]
+    stored = {expense['id']: expense for expense in storage.load()}
+    assert sorted(stored) == [1, 5, 6]
+    assert stored[5]['cents'] == 4530
+    assert storage.rollup().total() == 100 + 4530 + 10
+    assert storage.next_id() == 7
+
+
+def test_json_and_jsonl_rows(tmp_path):
+    rows = [{'fecha': '2024-02-01', 'descripcion': 'Cine', 'monto': 12.5, 'categoria': 'Ocio'},
+            {'date': '2024-02-02', 'description': 'Bus', 'amount': '1,20'}]
+    json_path = tmp_path / 'extracto.json'
+    json_path.write_text(json.dumps(rows))
+    jsonl_path = tmp_path / 'extracto.jsonl.gz'
+    with gzip.open(jsonl_path, 'wt', encoding='utf-8') as f:
+        f.write(''.join(json.dumps(row) + '\n\n' for row in rows))
+
+    expected = [
+        {'date': '2024-02-01', 'description': 'Cine', 'cents': 1250, 'category': 'Ocio'},
+        {'date': '2024-02-02', 'description': 'Bus', 'cents': 120, 'category': 'General'},
+    ]
+    for path in (json_path, jsonl_path):
+        assert [parse_row(row) for _, row in iter_rows(str(path))] == expected
+
+
+def test_unsupported_format(tmp_path):
+    path = tmp_path / 'extracto.xlsx'
+    path.write_text('')
+    with pytest.raises(ValueError, match="Formato no soportado"):
+        list(iter_rows(str(path)))
@@ -0,0 +1,47 @@
+import pytest
+
+from ledger import LedgerStorage
+from rollup import RollupIndex
+from storage import BACKENDS, get_storage
+
+
+def expense(expense_id, date, cents, category='Comida'):
+    return {'id': expense_id, 'date': date, 'description': f"gasto {expense_id}",
+            'cents': cents, 'category': category}
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def stores(request, tmp_path):
+    path = str(tmp_path / 'expenses.json')
+    return LedgerStorage(get_storage(request.param, path)), path, request.param
+
+
+def test_writes_reach_disk_and_memory(stores):
+    server, path, backend = stores
+    server.add(expense(1, '2024-01-10', 1000))
+    server.apply([
+        {'op': 'update', 'expense': expense(1, '2024-02-10', 500)},
+        {'op': 'update', 'expense': expense(1, '2024-03-10', 700)},
+        {'op': 'add', 'expense': expense(2, '2024-03-11', 50)},
+    ])
+    on_disk = get_storage(backend, path)
+    assert server.load() == sorted(on_disk.load(), key=lambda e: e['id'])
+    index = on_disk.rollup()
+    assert index.cells == RollupIndex.from_expenses(on_disk.load()).cells
+    assert index.total(2024, 1) == 0 and index.total(2024, 3) == 750
+    assert server.rollup().cells == index.cells
+
+
+def test_sees_other_process_writes(stores):
+    server, path, backend = stores
+    server.add(expense(1, '2024-01-10', 1000))
+    other = get_storage(backend, path)
+    other.add(expense(2, '2024-01-11', 300))
+    other.delete(1)
+    with server.locked():
+        pass
+    assert [e['id'] for e in server.load()] == [2]
+    assert server.rollup().total() == 300
+    assert server.next_id() == 3
+    # version() sigue siendo el método del Storage, no el cursor interno
+    assert server.version() == server.storage.version()
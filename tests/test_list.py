@@ -0,0 +1,51 @@
+import argparse
+import itertools
+import random
+
+import pytest
+
+import main as cli
+
+SORTS = [None, 'id', 'date', 'amount', 'category']
+
+
+def make_expenses(count=40):
+    rng = random.Random(7)
+    return [{'id': n, 'date': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+             'description': f"gasto {n}", 'cents': rng.choice([100, 250, 999]),
+             'category': rng.choice(['Comida', 'Hogar', 'Salud'])} for n in range(1, count + 1)]
+
+
+def reference(expenses, sort, desc, limit, offset):
+    if sort is None:
+        rows = list(reversed(expenses)) if desc else list(expenses)
+    else:
+        column = cli.SORT_KEYS[sort]
+        rows = sorted(expenses, key=lambda e: (e[column], e['id']), reverse=desc)
+    end = None if limit is None else offset + limit
+    return rows[offset:end]
+
+
+@pytest.mark.parametrize('sort, desc, limit, offset', [
+    (sort, desc, limit, offset)
+    for sort, desc, (limit, offset) in itertools.product(SORTS, [False, True], [(None, 0), (5, 0), (5, 10), (None, 35), (10, 38)])
+])
+def test_select_rows_matches_full_sort(sort, desc, limit, offset):
+    expenses = make_expenses()
+    rows = list(cli.select_rows(iter(expenses), sort, desc, limit, offset))
+    assert rows == reference(expenses, sort, desc, limit, offset)
+
+
+def test_pages_do_not_overlap():
+    expenses = make_expenses()
+    pages = [list(cli.select_rows(iter(expenses), 'amount', False, 7, offset)) for offset in range(0, 40, 7)]
+    ids = [expense['id'] for page in pages for expense in page]
+    assert sorted(ids) == list(range(1, 41))
+
+
+def test_limit_must_be_positive():
+    assert cli.positive('3') == 3
+    for value in ('0', '-1'):
+        with pytest.raises(argparse.ArgumentTypeError):
+            cli.positive(value)
+    assert cli.non_negative('0') == 0
@@ -0,0 +1,38 @@
+import pytest
+
+from money import format_amount, parse_amount
+
+
+@pytest.mark.parametrize('value, cents', [
+    ('0.1', 10),
+    ('25,5', 2550),
+    ('1.500', 150),
+    ('1.50000', 150),
+    ('-3', -300),
+    ('+2.', 200),
+    ('.5', 50),
+    (' 7 ', 700),
+    (12.5, 1250),
+    (0.1, 10),
+    (3, 300),
+])
+def test_parse_amount(value, cents):
+    assert parse_amount(value) == cents
+
+
+@pytest.mark.parametrize('value', [
+    '', '.', 'abc', '1e3', '1,2,3', '--1', None, True, float('nan'), float('inf'),
+])
+def test_parse_amount_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_amount(value)
+
+
+def test_parse_amount_rejects_extra_decimals():
+    with pytest.raises(ValueError, match="decimales"):
+        parse_amount('1.505')
+
+
+def test_format_amount_round_trip():
+    for cents in (0, 5, -5, 1250, -300, 123456789):
+        assert parse_amount(format_amount(cents)) == cents
@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pytest
+
+from ledger import ID_BLOCK, Ledger
+from persistence import PersistenceWorker, coalesce_ops
+from storage import get_storage
+
+
+def expense(expense_id, cents=100, date='2024-01-10'):
+    return {'id': expense_id, 'date': date, 'description': f"gasto {expense_id}", 'cents': cents,
+            'category': 'Comida'}
+
+
+def add(expense_id, cents=100):
+    return {'op': 'add', 'expense': expense(expense_id, cents)}
+
+
+def update(expense_id, cents, previous):
+    return {'op': 'update', 'expense': expense(expense_id, cents), 'previous': expense(expense_id, previous)}
+
+
+def delete(expense_id, previous):
+    return {'op': 'delete', 'id': expense_id, 'previous': expense(expense_id, previous)}
+
+
+def test_coalesce_add_then_update():
+    assert coalesce_ops([add(1), update(1, 200, 100), update(1, 300, 200)]) == [add(1, 300)]
+
+
+def test_coalesce_updates_keep_first_previous():
+    assert coalesce_ops([update(1, 200, 100), update(1, 300, 200)]) == [update(1, 300, 100)]
+
+
+def test_coalesce_add_then_delete_cancels():
+    assert coalesce_ops([add(1), update(1, 200, 100), delete(1, 200), add(2)]) == [add(2)]
+
+
+def test_coalesce_update_then_delete():
+    assert coalesce_ops([update(1, 200, 100), delete(1, 200)]) == [delete(1, 100)]
+
+
+def test_coalesce_delete_then_add():
+    assert coalesce_ops([delete(1, 100), add(1, 500)]) == [update(1, 500, 100)]
+
+
+class StubRoot:
+    """Sustituto de Tk: los avisos se despachan a mano con ``dispatch``"""
+
+    def after(self, ms, callback):
+        pass
+
+
+class FlakyStorage:
+    """Envuelve un almacenamiento y hace fallar las escrituras mientras ``broken`` esté activo"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.broken = threading.Event()
+
+    def apply(self, ops):
+        if self.broken.is_set():
+            raise OSError("disco lleno")
+        self.storage.apply(ops)
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return FlakyStorage(get_storage('journal', str(tmp_path / 'expenses.json')))
+
+
+def make_worker(storage, **options):
+    events = {'saved': [], 'errors': []}
+    worker = PersistenceWorker(StubRoot(), storage, delay=0.01, on_saved=events['saved'].append,
+                               on_error=events['errors'].append, **options)
+    return worker, events
+
+
+def test_unsaved_ids_until_saved(storage):
+    worker, events = make_worker(storage)
+    worker.submit(add(1), add(2))
+    worker.submit(update(1, 200, 100), delete(2, 100))
+    assert worker.unsaved_ids() == {1, 2}
+    assert worker.close(timeout=5)
+    assert worker.unsaved_ids() == set()
+    assert storage.load() == [expense(1, 200)]
+    assert sum(events['saved']) == 1 and events['errors'] == []
+
+
+def test_failed_batch_is_retried(storage):
+    storage.broken.set()
+    worker, events = make_worker(storage)
+    worker.submit(add(1), add(2, 300))
+    while not events['errors']:
+        time.sleep(0.01)
+        worker.dispatch()
+    # El lote fallido sigue pendiente y sus ids siguen siendo locales
+    assert worker.pending()
+    assert worker.unsaved_ids() == {1, 2}
+
+    storage.broken.clear()
+    worker.submit(update(2, 400, 300))
+    assert worker.close(timeout=5)
+    assert worker.unsaved_ids() == set()
+    assert storage.load() == [expense(1), expense(2, 400)]
+    assert storage.rollup().total() == 500
+
+
+def test_reserved_blocks_do_not_overlap(storage):
+    worker, _ = make_worker(storage, id_block=ID_BLOCK)
+    ledger = Ledger([], reserve=worker.reserve_ids)
+    other = Ledger([], reserve=storage.reserve_ids)
+    ids = [ledger.add("gui", 100, "Comida")['expense']['id'] for _ in range(ID_BLOCK * 3)]
+    ids += [other.add("cli", 100, "Comida")['expense']['id'] for _ in range(ID_BLOCK)]
+    assert worker.close(timeout=5)
+    assert len(set(ids)) == len(ids)
+
+
+def test_ledger_allocates_from_reserved_blocks():
+    calls = []
+
+    def reserve(count):
+        calls.append(count)
+        return 1000 * len(calls)
+
+    ledger = Ledger([], reserve=reserve)
+    assert [ledger.allocate_id() for _ in range(ID_BLOCK)] == list(range(1000, 1000 + ID_BLOCK))
+    assert ledger.allocate_id() == 2000
+    assert ledger.allocate_ids(ID_BLOCK * 2) == 3000
+    assert calls == [ID_BLOCK, ID_BLOCK, ID_BLOCK * 2]
+
+
+def test_ledger_lookup_by_id():
+    ledger = Ledger([expense(5), expense(2), expense(9)])
+    assert [e['id'] for e in ledger.expenses] == [2, 5, 9]
+    assert ledger.get(5) == expense(5) and ledger.get(3) is None
+    assert ledger.position(9) == 2
+    with pytest.raises(KeyError):
+        ledger.position(3)
+    assert ledger.next_id == 10
+    ledger.insert(expense(3))
+    assert [e['id'] for e in ledger.expenses] == [2, 3, 5, 9]
+    with pytest.raises(ValueError):
+        ledger.insert(expense(3))
@@ -0,0 +1,127 @@
+from datetime import date
+
+import pytest
+
+import main as cli
+from budgets import BudgetMonitor
+from recurring import RuleStore, Scheduler, materialize_due, occurrence
+from rollup import RollupIndex
+from storage import get_storage
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    path = str(tmp_path / 'expenses.json')
+    return get_storage('journal', path), RuleStore(path)
+
+
+def test_occurrence_clamps_to_month_end():
+    assert [occurrence('2024-01-31', 'month', n) for n in range(4)] == [
+        '2024-01-31', '2024-02-29', '2024-03-31', '2024-04-30']
+    assert occurrence('2024-02-29', 'year', 1) == '2025-02-28'
+    assert occurrence('2024-02-29', 'year', 4) == '2028-02-29'
+    assert occurrence('2024-01-01', 'week', 2) == '2024-01-15'
+
+
+def test_scheduler_catches_up_each_rule_once():
+    rules = [
+        {'id': 1, 'description': 'Alquiler', 'cents': 50000, 'category': 'Hogar', 'every': 'month',
+         'start': '2024-01-31', 'until': None, 'done': 0, 'next': '2024-01-31'},
+        {'id': 2, 'description': 'Gimnasio', 'cents': 2000, 'category': 'Salud', 'every': 'week',
+         'start': '2024-03-01', 'until': '2024-03-15', 'done': 0, 'next': '2024-03-01'},
+    ]
+    scheduler = Scheduler(rules)
+    due = scheduler.due('2024-04-10')
+    assert [expense['date'] for expense in due] == [
+        '2024-01-31', '2024-02-29', '2024-03-01', '2024-03-08', '2024-03-15', '2024-03-31']
+    assert rules[1]['next'] is None
+    assert scheduler.next_due() == '2024-04-30'
+    assert scheduler.due('2024-04-10') == []
+
+
+def test_materialize_due_once(ledger):
+    storage, rules = ledger
+    rules.add_rule('Alquiler', 50000, 'Hogar', 'month', '2024-01-31', '2024-06-30')
+    added = materialize_due(storage, rules, today='2024-12-01')
+    assert len(added) == 6
+    assert materialize_due(storage, rules, today='2024-12-01') == []
+    assert sorted(expense['date'] for expense in storage.load()) == [
+        '2024-01-31', '2024-02-29', '2024-03-31', '2024-04-30', '2024-05-31', '2024-06-30']
+    assert rules.load()['next_due'] is None
+
+
+def test_materialize_due_resumes_interrupted_batch(ledger):
+    storage, rules = ledger
+    rules.add_rule('Alquiler', 50000, 'Hogar', 'month', '2024-01-01')
+    data = rules.load()
+    scheduler = Scheduler(data['rules'])
+    due = scheduler.due('2024-03-15')
+    start = storage.reserve_ids(len(due))
+    pending = [dict(id=start + offset, **expense) for offset, expense in enumerate(due)]
+    data['pending'], data['next_due'] = pending, scheduler.next_due()
+    rules.save(data)
+    # La caída ocurrió después de escribir parte del lote
+    storage.add_many(pending[:2])
+
+    assert materialize_due(storage, rules, today='2024-03-15') == pending
+    expenses = storage.load()
+    assert sorted(expense['id'] for expense in expenses) == [expense['id'] for expense in pending]
+    index = get_storage('journal', storage.path).rollup()
+    assert index.cells == RollupIndex.from_expenses(expenses).cells
+    assert index.total(2024, None, 'Hogar') == 3 * 50000
+    assert rules.load()['pending'] == []
+
+
+def test_budget_monitor_warns_once_per_crossing():
+    index = RollupIndex()
+    monitor = BudgetMonitor({'Hogar': 1000})
+    expense = {'id': 1, 'date': '2024-05-02', 'description': 'x', 'cents': 1500, 'category': 'Hogar'}
+    index.add(expense)
+    assert monitor.check(index, [{'op': 'add', 'expense': expense}]) == [(2024, 5, 'Hogar', 1500, 1000)]
+    second = dict(expense, id=2, cents=10)
+    index.add(second)
+    assert monitor.check(index, [{'op': 'add', 'expense': second}]) == []
+    index.remove(expense)
+    assert monitor.check(index, [{'op': 'delete', 'id': 1, 'previous': expense}]) == []
+    index.add(expense)
+    assert monitor.check(index, [{'op': 'add', 'expense': expense}]) == [(2024, 5, 'Hogar', 1510, 1000)]
+
+
+@pytest.fixture
+def cli_ledger(ledger, monkeypatch):
+    storage, rules = ledger
+    monkeypatch.setattr(cli, 'storage', storage)
+    monkeypatch.setattr(cli, 'rules', rules)
+    return storage, rules
+
+
+def test_cli_budget_warning_persists_between_commands(cli_ledger, capsys):
+    storage, rules = cli_ledger
+    rules.set_budget('Hogar', 1000)
+    cli.add_expense('Lámpara', '15', 'Hogar')
+    assert 'Aviso: Presupuesto de Hogar superado' in capsys.readouterr().out
+    cli.add_expense('Foco', '1', 'Hogar')
+    assert 'Aviso' not in capsys.readouterr().out
+
+
+def test_cli_delete_rearms_budget_warning(cli_ledger, capsys):
+    storage, rules = cli_ledger
+    rules.set_budget('Hogar', 1000)
+    cli.add_expense('Lámpara', '15', 'Hogar')
+    capsys.readouterr()
+    cli.delete_expense(1)
+    assert rules.exceeded() == set()
+    cli.add_expense('Lámpara', '15', 'Hogar')
+    assert 'Aviso: Presupuesto de Hogar superado' in capsys.readouterr().out
+
+
+def test_cli_import_warns_budget(cli_ledger, tmp_path, capsys):
+    storage, rules = cli_ledger
+    rules.set_budget('Comida', 1000)
+    statement = tmp_path / 'extracto.csv'
+    today = date.today().isoformat()
+    statement.write_text(f"date,description,amount,category\n{today},Cena,65,Comida\n")
+    cli.import_file(str(statement))
+    output = capsys.readouterr().out
+    assert '1 gastos importados' in output
+    assert 'Aviso: Presupuesto de Comida superado' in output
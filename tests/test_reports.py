@@ -0,0 +1,91 @@
+import pytest
+
+from ledger import Ledger
+from reports import ReportEngine, daily_totals
+from storage import BACKENDS, get_storage
+
+
+def make_ledger():
+    ledger = Ledger([])
+    ledger.add("Alquiler", 50000, "Hogar", "2023-01-05")
+    ledger.add("Mercado", 10000, "Comida", "2023-03-10")
+    ledger.add("Alquiler", 55000, "Hogar", "2024-01-05")
+    ledger.add("Mercado", 12000, "Comida", "2024-01-20")
+    ledger.add("Cine", 3000, "Ocio", "2024-03-02")
+    return ledger
+
+
+def rows(report):
+    return [(row.label, row.total, row.count, row.average, row.previous) for row in report.rows]
+
+
+def fresh(ledger, **criteria):
+    return ReportEngine(lambda: daily_totals(ledger.expenses), lambda: 0).report(**criteria)
+
+
+def test_monthly_series_fills_gaps():
+    ledger = make_ledger()
+    report = ledger.reports.report('month', date_from='2024-01-01', window=2)
+    assert rows(report) == [
+        ('2024-01', 67000, 2, 67000, 50000),
+        ('2024-02', 0, 0, 33500, 0),
+        ('2024-03', 3000, 1, 1500, 10000),
+    ]
+    assert report.rows[0].change == pytest.approx(34.0)
+    assert report.categories == [('Hogar', 55000, 1), ('Comida', 12000, 1), ('Ocio', 3000, 1)]
+
+
+def test_ledger_changes_invalidate_cache():
+    ledger = make_ledger()
+    engine = ledger.reports
+    criteria = {'period': 'year', 'category': 'Hogar'}
+    first = engine.report(**criteria)
+    assert engine.is_cached(**criteria)
+    assert engine.report(**criteria) is first
+
+    ledger.update(3, cents=60000)
+    assert not engine.is_cached(**criteria)
+    assert rows(engine.report(**criteria)) == [('2023', 50000, 1, 50000, None), ('2024', 60000, 1, 55000, 50000)]
+
+    ledger.delete(1)
+    ledger.add("Luz", 2000, "Hogar", "2025-06-01")
+    for criteria in ({'period': 'year'}, {'period': 'month'}, {'period': 'week', 'category': 'Hogar'}):
+        assert rows(engine.report(**criteria)) == rows(fresh(ledger, **criteria))
+
+
+def test_apply_from_another_process_invalidates_cache():
+    ledger = make_ledger()
+    engine = ledger.reports
+    engine.report('month')
+    ledger.apply([{'op': 'delete', 'id': 5}])
+    assert not engine.is_cached('month')
+    assert engine.report('month').rows[-1].label == '2024-01'
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_storage_engine_rereads_after_writes(backend, tmp_path):
+    path = str(tmp_path / 'expenses.json')
+    storage = get_storage(backend, path)
+    storage.add_many(make_ledger().expenses)
+    engine = storage.report_engine()
+    reads = []
+    source = engine.source
+    engine.source = lambda: reads.append(1) or source()
+
+    assert engine.report('year').total == 130000
+    assert engine.report('month').total == 130000
+    assert len(reads) == 1
+
+    other = get_storage(backend, path)
+    other.add({'id': 6, 'date': '2024-04-01', 'description': 'Luz', 'cents': 2000, 'category': 'Hogar'})
+    assert not engine.is_cached('year')
+    assert engine.report('year').total == 132000
+    assert len(reads) == 2
+
+
+def test_invalid_arguments():
+    engine = make_ledger().reports
+    with pytest.raises(ValueError):
+        engine.report('day')
+    with pytest.raises(ValueError):
+        engine.report('month', window=0)
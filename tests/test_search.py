@@ -0,0 +1,54 @@
+from ledger import Ledger
+from search import SearchQuery
+
+
+def make_ledger():
+    ledger = Ledger([])
+    ledger.add("Café con leche", 350, "Comida", "2024-01-10")
+    ledger.add("Supermercado", 4530, "Comida", "2024-01-15")
+    ledger.add("Gasolina", 2500, "Transporte", "2024-02-01")
+    # Construir el índice antes de modificar: desde aquí se mantiene incrementalmente
+    assert ledger.search_index is not None
+    return ledger
+
+
+def ids(ledger, **criteria):
+    return [expense['id'] for expense in ledger.search(SearchQuery(**criteria))]
+
+
+def test_search_after_update():
+    ledger = make_ledger()
+    ledger.update(1, description="Té verde", cents=9000, category="Bebidas", date="2024-03-05")
+
+    assert ids(ledger, text="cafe") == []
+    assert ids(ledger, text="te verde") == [1]
+    assert ids(ledger, category="Comida") == [2]
+    assert ids(ledger, category="Bebidas") == [1]
+    assert ids(ledger, date_from="2024-03-01") == [1]
+    assert ids(ledger, date_to="2024-01-31") == [2]
+    assert ids(ledger, min_amount=5000) == [1]
+    assert ids(ledger, max_amount=400) == []
+
+
+def test_search_after_delete():
+    ledger = make_ledger()
+    ledger.delete(2)
+
+    assert ids(ledger, text="supermercado") == []
+    assert ids(ledger, category="Comida") == [1]
+    assert ids(ledger, date_from="2024-01-01", date_to="2024-01-31") == [1]
+    assert ids(ledger, min_amount=1000) == [3]
+
+    ledger.add("Supermercado", 100, "Comida", "2024-01-20")
+    assert ids(ledger, text="super") == [4]
+
+
+def test_search_matches_full_scan():
+    ledger = make_ledger()
+    ledger.update(3, cents=10)
+    ledger.delete(1)
+    for criteria in ({'text': 'o'}, {'category': 'Comida'}, {'max_amount': 100},
+                     {'date_from': '2024-01-12', 'date_to': '2024-02-28'}):
+        query = SearchQuery(**criteria)
+        expected = [expense['id'] for expense in ledger.expenses if query.matches(expense)]
+        assert ids(ledger, **criteria) == expected
@@ -0,0 +1,100 @@
+import copy
+import json
+
+import pytest
+
+from rollup import RollupIndex
+from storage import BACKENDS, get_storage, iter_json_array
+
+
+def expense(expense_id, date, cents, category='Comida', description=None):
+    return {'id': expense_id, 'date': date, 'description': description or f"gasto {expense_id}",
+            'cents': cents, 'category': category}
+
+
+# Como quedan en el diario o en un lote pendiente: sin 'previous'
+LOG_OPS = [
+    {'op': 'add', 'expense': expense(1, '2024-01-10', 1000)},
+    {'op': 'add', 'expense': expense(2, '2024-01-15', 250, 'Transporte')},
+    {'op': 'add', 'expense': expense(3, '2024-02-01', 4530)},
+    {'op': 'update', 'expense': expense(2, '2024-03-02', 300, 'Transporte')},
+    {'op': 'delete', 'id': 3},
+    {'op': 'add', 'expense': expense(4, '2024-02-20', 75, 'Hogar')},
+]
+
+
+def snapshot(storage):
+    expenses = sorted(storage.load(), key=lambda e: e['id'])
+    return expenses, storage.rollup().cells
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_apply_replay_is_idempotent(backend, tmp_path):
+    path = str(tmp_path / 'expenses.json')
+    storage = get_storage(backend, path)
+    storage.apply(copy.deepcopy(LOG_OPS))
+    expenses, cells = snapshot(storage)
+    assert [e['id'] for e in expenses] == [1, 2, 4]
+    assert cells == RollupIndex.from_expenses(expenses).cells
+
+    # Reaplicar el mismo lote (un reintento o un pendiente que se reanuda) no cambia nada
+    storage.apply(copy.deepcopy(LOG_OPS))
+    assert snapshot(storage) == (expenses, cells)
+    assert snapshot(get_storage(backend, path)) == (expenses, cells)
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_apply_add_of_existing_id_replaces(backend, tmp_path):
+    path = str(tmp_path / 'expenses.json')
+    storage = get_storage(backend, path)
+    storage.apply([{'op': 'add', 'expense': expense(1, '2024-01-10', 1000)}])
+    storage.apply([{'op': 'add', 'expense': expense(1, '2024-05-10', 200, 'Hogar')}])
+
+    reopened = get_storage(backend, path)
+    assert reopened.load() == [expense(1, '2024-05-10', 200, 'Hogar')]
+    index = reopened.rollup()
+    assert (index.count(), index.total()) == (1, 200)
+    assert index.total(2024, 1) == 0
+
+
+def write_array(path, expenses):
+    with open(path, 'w') as f:
+        json.dump(expenses, f, indent=4, ensure_ascii=False)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 16, 64])
+def test_iter_json_array_across_chunks(chunk_size, tmp_path):
+    # Escapes, no ASCII y números largos para que cada token quede partido en algún bloque
+    expenses = [
+        expense(1, '2024-01-10', 1000, description='Café "del centro"'),
+        expense(2, '2024-01-15', 123456789, 'Transporte', 'línea\\nueva ñandú'),
+        expense(3, '2024-02-01', -5, 'Hogar', '[{,}]'),
+    ]
+    path = str(tmp_path / 'expenses.json')
+    write_array(path, expenses)
+    assert list(iter_json_array(path, chunk_size)) == expenses
+
+
+def test_iter_json_array_empty(tmp_path):
+    path = tmp_path / 'expenses.json'
+    path.write_text(' [ \n ] ')
+    assert list(iter_json_array(str(path), 1)) == []
+    path.write_text('')
+    assert list(iter_json_array(str(path), 1)) == []
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 64])
+def test_iter_json_array_leading_whitespace(chunk_size, tmp_path):
+    # Más espacio inicial que un bloque: no es un archivo vacío
+    path = tmp_path / 'expenses.json'
+    path.write_text(' \n\t' * 30 + '[{"id": 1}, {"id": 2}]')
+    assert list(iter_json_array(str(path), chunk_size)) == [{'id': 1}, {'id': 2}]
+    path.write_text(' [{"id": 1}]')
+    assert list(iter_json_array(str(path), chunk_size)) == [{'id': 1}]
+
+
+def test_iter_json_array_truncated(tmp_path):
+    path = tmp_path / 'expenses.json'
+    path.write_text(json.dumps([expense(1, '2024-01-10', 1000)])[:-5])
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(str(path), 4))
@@ -0,0 +1,150 @@
+from ledger import Ledger
+from virtual_tree import VirtualTreeview
+
+
+class StubTree:
+    """Treeview en memoria con las operaciones que usa VirtualTreeview"""
+
+    def __init__(self, height=5):
+        self.height = height
+        self.items = {}
+        self.order = []
+        self.selected = []
+        self.focused = ''
+
+    def cget(self, option):
+        return self.height
+
+    def configure(self, **options):
+        pass
+
+    def bind(self, sequence, callback):
+        pass
+
+    def get_children(self):
+        return tuple(self.order)
+
+    def insert(self, parent, index, iid, values):
+        self.items[iid] = values
+        self.order.insert(index, iid)
+
+    def move(self, iid, parent, index):
+        self.order.remove(iid)
+        self.order.insert(index, iid)
+
+    def delete(self, iid):
+        del self.items[iid]
+        self.order.remove(iid)
+        if iid in self.selected:
+            self.selected.remove(iid)
+        if iid == self.focused:
+            self.focused = ''
+
+    def selection(self):
+        return tuple(self.selected)
+
+    def selection_set(self, items):
+        self.selected = list(items)
+
+    def focus(self, iid=None):
+        if iid is None:
+            return self.focused
+        self.focused = iid
+
+    def exists(self, iid):
+        return iid in self.items
+
+    def item(self, iid, values=None):
+        if values is not None:
+            self.items[iid] = values
+        return {'values': self.items[iid]}
+
+    def bbox(self, iid):
+        return (0, 0, 100, 20)
+
+    def yview_moveto(self, fraction):
+        pass
+
+
+class StubScrollbar:
+    def configure(self, **options):
+        pass
+
+    def set(self, first, last):
+        pass
+
+
+def format_row(expense):
+    return (expense['id'], expense['description'], expense['cents'])
+
+
+def make_table(count=30):
+    ledger = Ledger([])
+    for n in range(count):
+        ledger.add(f"gasto {n}", 100, "Comida", "2024-01-10")
+    table = VirtualTreeview(StubTree(), StubScrollbar(), format_row, buffer=2)
+    table.set_rows(ledger.expenses)
+    return ledger, table
+
+
+def shown(table):
+    return [table.tree.items[iid] for iid in table.tree.get_children()]
+
+
+def test_window_only():
+    ledger, table = make_table()
+    assert table.tree.get_children() == tuple(str(n) for n in range(1, 8))
+    table.scroll(10)
+    assert table.tree.get_children() == tuple(str(n) for n in range(11, 18))
+
+
+def test_render_repaints_rows_changed_elsewhere():
+    ledger, table = make_table()
+    # Como un cambio de otro proceso: el Ledger cambia sin avisar a la tabla
+    ledger.apply([{'op': 'update', 'expense': dict(ledger.get(2), cents=999)}])
+    table.render()
+    assert table.tree.items['2'] == (2, "gasto 1", 999)
+
+    ledger.apply([{'op': 'update', 'expense': dict(ledger.get(3), description="nuevo")}])
+    table.set_rows(ledger.expenses)
+    assert table.tree.items['3'] == (3, "nuevo", 100)
+    assert shown(table) == [format_row(row) for row in ledger.expenses[:7]]
+
+
+def test_render_repaints_moved_rows():
+    ledger, table = make_table()
+    rows = list(ledger.expenses[2:])
+    ledger.update(5, description="movido")
+    table.set_rows(rows)
+    assert shown(table) == [format_row(row) for row in rows[:7]]
+
+
+def test_selection_survives_scrolling():
+    ledger, table = make_table()
+    table.select('2')
+    table.scroll(10)
+    assert table.tree.selection() == ()
+    assert table.selection() == ('2',)
+    table.scroll(-10)
+    assert table.tree.selection() == ('2',)
+    assert table.tree.focus() == '2'
+
+
+def test_row_deleted_drops_selection():
+    ledger, table = make_table()
+    table.select('3')
+    ledger.delete(3)
+    table.row_deleted(3)
+    assert table.selection() == ()
+    assert '3' not in table.tree.get_children()
+    assert len(table.tree.get_children()) == 7
+
+
+def test_arrow_at_edge_scrolls_window():
+    ledger, table = make_table()
+    table.select('3')
+    assert table._on_arrow(1) is None
+    table.select(table.tree.get_children()[table.visible_rows - 1])
+    assert table._on_arrow(1) == 'break'
+    assert table.offset == 1
+    assert table.selection() == (str(table.visible_rows + 1),)
@@ -0,0 +1,36 @@
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from money import parse_amount
+
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def validate_expense(description: Any, amount: Any) -> Tuple[str, int]:
+    """Reglas comunes a la CLI, la GUI y la importación: descripción obligatoria y monto positivo.
+
+    Devuelve el monto en centavos (entero).
+    """
+    description = str(description or '').strip()
+    if not description:
+        raise ValueError("La descripción es obligatoria")
+    return description, validate_amount(amount)
+
+
+def validate_amount(amount: Any) -> int:
+    cents = parse_amount(amount)
+    if cents <= 0:
+        raise ValueError("El monto debe ser positivo")
+    return cents
+
+
+def validate_date(value: Optional[str]) -> str:
+    """Fecha en formato AAAA-MM-DD; sin valor se usa la fecha de hoy"""
+    if not value:
+        return datetime.now().strftime(DATE_FORMAT)
+    value = str(value).strip()
+    try:
+        datetime.strptime(value, DATE_FORMAT)
+    except ValueError:
+        raise ValueError(f"Fecha inválida (se espera AAAA-MM-DD): {value}")
+    return value
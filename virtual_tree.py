@@ -0,0 +1,204 @@
+from typing import List, Dict, Any, Callable, Optional, Sequence, Set, Tuple
+
+# Filas extra que se insertan por debajo de las visibles
+VIRTUAL_BUFFER = 10
+
+
+class VirtualTreeview:
+    """Muestra en un Treeview solo la ventana visible de filas (más un margen).
+
+    Las filas viven en una lista de Python; el Treeview contiene como mucho
+    ``altura + VIRTUAL_BUFFER`` items, cuyo iid es el id del gasto. La barra
+    de desplazamiento mueve la ventana y cada redibujado aplica solo la
+    diferencia (items que salen, items que entran) y vuelve a escribir los
+    valores de la ventana, por lo que el costo no depende del tamaño del
+    registro y una fila que cambió fuera de la tabla se ve actualizada.
+
+    La selección y el foco se recuerdan por iid: una fila seleccionada que
+    sale de la ventana sigue seleccionada (``selection``) y vuelve a
+    marcarse al reaparecer. Las flechas mueven la ventana al llegar al borde.
+    """
+
+    def __init__(self, tree, scrollbar, format_row: Callable[[Dict[str, Any]], Sequence[Any]],
+                 buffer: int = VIRTUAL_BUFFER):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.format_row = format_row
+        self.buffer = buffer
+        self.rows: List[Dict[str, Any]] = []
+        self.offset = 0
+        self.visible_rows = int(tree.cget('height'))
+        # Selección y foco por iid, incluidas las filas que quedaron fuera de la ventana
+        self.selected: Set[str] = set()
+        self.focused: Optional[str] = None
+        # Selección que dejó el último redibujado, para distinguir la que cambió el usuario
+        self.shown_selection: Set[str] = set()
+
+        self.scrollbar.configure(command=self.yview)
+        self.tree.configure(yscrollcommand=lambda first, last: None)
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda event: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda event: self.scroll(3))
+        self.tree.bind('<Prior>', lambda event: self.scroll(-self.visible_rows))
+        self.tree.bind('<Next>', lambda event: self.scroll(self.visible_rows))
+        self.tree.bind('<Up>', lambda event: self._on_arrow(-1))
+        self.tree.bind('<Down>', lambda event: self._on_arrow(1))
+
+    @property
+    def window(self) -> int:
+        return self.visible_rows + self.buffer
+
+    def set_rows(self, rows: List[Dict[str, Any]]) -> None:
+        """Reemplazar la fuente de datos (se comparte la lista, no se copia)"""
+        self.rows = rows
+        self.render()
+        # Con otras filas no se arrastra la selección de las que ya no están a la vista
+        self.selected &= set(self.tree.get_children())
+
+    def selection(self) -> Tuple[str, ...]:
+        """iids seleccionados, estén o no en la ventana (el foco primero)"""
+        self._remember_selection()
+        rest = sorted(self.selected - {self.focused}, key=int)
+        return tuple(([self.focused] if self.focused in self.selected else []) + rest)
+
+    def select(self, iid: str) -> None:
+        """Seleccionar solo esa fila y darle el foco"""
+        self.selected, self.focused = {iid}, iid
+        self._restore_selection()
+
+    def render(self) -> None:
+        """Sincronizar los items del Treeview con la ventana actual"""
+        # Lo que se borra del Treeview pierde su selección: se anota antes
+        self._remember_selection()
+        self.offset = max(0, min(self.offset, len(self.rows) - self.visible_rows))
+        visible = self.rows[self.offset:self.offset + self.window]
+        wanted = [str(row['id']) for row in visible]
+        wanted_set = set(wanted)
+
+        children = []
+        for iid in self.tree.get_children():
+            if iid in wanted_set:
+                children.append(iid)
+            else:
+                self.tree.delete(iid)
+        present = set(children)
+
+        for index, row in enumerate(visible):
+            iid = wanted[index]
+            if iid in present:
+                # La fila pudo cambiar (edición, otro proceso, recarga): se repintan sus valores
+                self.tree.item(iid, values=self.format_row(row))
+                if index < len(children) and children[index] == iid:
+                    continue
+                self.tree.move(iid, '', index)
+                children.remove(iid)
+            else:
+                self.tree.insert('', index, iid=iid, values=self.format_row(row))
+                present.add(iid)
+            children.insert(index, iid)
+
+        self.tree.yview_moveto(0)
+        self._restore_selection()
+        self._update_scrollbar()
+
+    def _remember_selection(self) -> None:
+        shown = set(self.tree.selection())
+        if shown != self.shown_selection:
+            # El usuario cambió la selección desde el último redibujado: manda la del Treeview
+            self.selected = shown
+            self.shown_selection = shown
+        focus = self.tree.focus()
+        if focus:
+            self.focused = focus
+
+    def _restore_selection(self) -> None:
+        shown = [iid for iid in self.tree.get_children() if iid in self.selected]
+        self.tree.selection_set(shown)
+        self.shown_selection = set(shown)
+        if self.focused is not None and self.tree.exists(self.focused):
+            self.tree.focus(self.focused)
+
+    def row_updated(self, row: Dict[str, Any]) -> None:
+        iid = str(row['id'])
+        if self.tree.exists(iid):
+            self.tree.item(iid, values=self.format_row(row))
+
+    def row_inserted(self, index: int) -> None:
+        if index < self.offset + self.window:
+            self.render()
+        else:
+            self._update_scrollbar()
+
+    def row_deleted(self, row_id: int) -> None:
+        iid = str(row_id)
+        self._remember_selection()
+        self.selected.discard(iid)
+        if self.tree.exists(iid):
+            self.tree.delete(iid)
+            self.render()
+        else:
+            self._update_scrollbar()
+
+    def see(self, index: int) -> None:
+        if not self.offset <= index < self.offset + self.visible_rows:
+            self.offset = index - self.visible_rows + 1 if index >= self.offset else index
+            self.render()
+
+    def scroll(self, amount: int) -> str:
+        self.offset += amount
+        self.render()
+        return 'break'
+
+    def _on_arrow(self, step: int) -> Optional[str]:
+        """Flecha arriba/abajo: en el borde de las filas visibles se desplaza la ventana"""
+        focus = self.tree.focus()
+        children = self.tree.get_children()
+        if focus not in children:
+            return None
+        index = children.index(focus) + step
+        if 0 <= index < self.visible_rows:
+            # Dentro de la ventana el Treeview mueve el foco solo
+            return None
+        position = self.offset + index
+        if 0 <= position < len(self.rows):
+            self.offset += step
+            self.render()
+            self.select(str(self.rows[position]['id']))
+        return 'break'
+
+    def yview(self, *args) -> None:
+        """Comando de la barra de desplazamiento ('moveto' o 'scroll')"""
+        if args[0] == 'moveto':
+            self.offset = int(float(args[1]) * len(self.rows))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            self.offset += step * self.visible_rows if args[2] == 'pages' else step
+        self.render()
+
+    def _update_scrollbar(self) -> None:
+        total = len(self.rows)
+        if total <= self.visible_rows:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.offset / total, (self.offset + self.visible_rows) / total)
+
+    def _on_configure(self, event) -> None:
+        row_height = max(1, self._row_height())
+        # Descontar aproximadamente la fila de encabezados
+        visible_rows = max(1, (event.height - row_height) // row_height)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.render()
+
+    def _row_height(self) -> int:
+        bbox = None
+        children = self.tree.get_children()
+        if children:
+            bbox = self.tree.bbox(children[0])
+        return bbox[3] if bbox else 20
+
+    def _on_mousewheel(self, event) -> str:
+        # Windows entrega múltiplos de 120; macOS valores pequeños
+        step = event.delta // 120 if abs(event.delta) >= 120 else (1 if event.delta > 0 else -1)
+        return self.scroll(-step * 3)